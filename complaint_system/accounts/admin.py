@@ -7,3 +7,4 @@ class UserProfileAdmin(admin.ModelAdmin):
     list_display = ['user', 'phone', 'created_at']
     search_fields = ['user__username', 'user__email', 'phone']
     list_filter = ['created_at']
+    list_select_related = ['user']
@@ -0,0 +1,67 @@
+"""
+Cached auth payloads for the session-checking endpoints.
+
+The frontend calls /api/auth/check/ on every page load. Answering it normally
+costs a session read, a User lookup, a profile lookup and a serializer run.
+Instead the serialized user is cached per user, next to the session auth hash
+it was built for. A request whose session carries the same user id and hash
+is answered from the cache without loading the user; the hash changes with
+the password, so sessions that were logged out that way still miss.
+
+Entries are dropped when the user or the profile is saved or deleted (see
+the receivers in models.py) and expire after AUTH_PAYLOAD_CACHE_TIMEOUT,
+which bounds staleness when the cache is per process.
+"""
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.core.cache import caches
+from django.utils.crypto import constant_time_compare
+
+from monitoring import metrics
+
+
+PAYLOAD_KEY = 'auth-payload:{}'
+
+
+def get_cache():
+    return caches[settings.AUTH_PAYLOAD_CACHE_ALIAS]
+
+
+def session_payload(session):
+    """Cached payload for the user logged in to this session, or None"""
+    user_id = session.get(SESSION_KEY)
+    session_hash = session.get(HASH_SESSION_KEY)
+    if user_id is None or not session_hash or session.get(BACKEND_SESSION_KEY) not in settings.AUTHENTICATION_BACKENDS:
+        return None
+    entry = get_cache().get(PAYLOAD_KEY.format(user_id))
+    if entry is None or not constant_time_compare(entry['hash'], session_hash):
+        metrics.inc('cache_requests_total', {'cache': 'auth_payload', 'result': 'miss'})
+        return None
+    metrics.inc('cache_requests_total', {'cache': 'auth_payload', 'result': 'hit'})
+    return entry['payload']
+
+
+def store_payload(user, payload):
+    get_cache().set(
+        PAYLOAD_KEY.format(user.pk),
+        {'hash': user.get_session_auth_hash(), 'payload': payload},
+        settings.AUTH_PAYLOAD_CACHE_TIMEOUT,
+    )
+    return payload
+
+
+def user_payload(user):
+    """Serialized user for the auth endpoints, from the cache when possible"""
+    from .serializers import UserSerializer
+
+    entry = get_cache().get(PAYLOAD_KEY.format(user.pk))
+    if entry is not None and constant_time_compare(entry['hash'], user.get_session_auth_hash()):
+        metrics.inc('cache_requests_total', {'cache': 'auth_payload', 'result': 'hit'})
+        return entry['payload']
+    metrics.inc('cache_requests_total', {'cache': 'auth_payload', 'result': 'miss'})
+    return store_payload(user, UserSerializer(user).data)
+
+
+def forget_payload(user_id):
+    get_cache().delete(PAYLOAD_KEY.format(user_id))
+
@@ -0,0 +1,72 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+class Command(BaseCommand):
+    help = 'Login and auth-check throughput and queries per request for each session backend'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--engines', nargs='+', choices=list(SESSION_ENGINES), default=list(SESSION_ENGINES))
+        parser.add_argument('--logins', type=int, default=50)
+        parser.add_argument('--checks', type=int, default=1000)
+        parser.add_argument(
+            '--fast-hasher', action='store_true',
+            help='Hash the benchmark password with MD5 so logins measure the request path, not PBKDF2',
+        )
+
+    def handle(self, *args, **options):
+        hashers = FAST_HASHERS if options['fast_hasher'] else settings.PASSWORD_HASHERS
+        host = next((host for host in settings.ALLOWED_HOSTS if host not in ('*', '')), 'localhost').lstrip('.')
+        username, password = 'benchmark-auth-user', 'benchmark-auth-password'
+
+        with override_settings(PASSWORD_HASHERS=hashers):
+            User.objects.filter(username=username).delete()
+            User.objects.create_user(username, password=password, first_name='Benchmark', last_name='User')
+            try:
+                for name in options['engines']:
+                    with override_settings(SESSION_ENGINE=SESSION_ENGINES[name]):
+                        self.run_engine(name, Client(HTTP_HOST=host), username, password, options)
+            finally:
+                User.objects.filter(username=username).delete()
+
+    def run_engine(self, name, client, username, password, options):
+        credentials = {'username': username, 'password': password}
+
+        def login():
+            client.logout()
+            response = client.post('/api/auth/login/', credentials, content_type='application/json')
+            assert response.status_code == 200, response.content
+
+        def check():
+            response = client.get('/api/auth/check/')
+            assert response.json()['authenticated'], response.content
+
+        login_rate, login_queries = self.measure(login, options['logins'])
+        check_rate, check_queries = self.measure(check, options['checks'])
+        self.stdout.write(
+            f'{name:>15}  login {login_rate:8.1f} req/s {login_queries:5.1f} queries  '
+            f'check {check_rate:8.1f} req/s {check_queries:5.1f} queries'
+        )
+
+    def measure(self, request, count):
+        request()  # warm up
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            for _ in range(count):
+                request()
+            elapsed = time.perf_counter() - start
+        return count / elapsed, len(queries) / count
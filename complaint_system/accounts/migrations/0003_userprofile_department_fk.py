@@ -0,0 +1,61 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def normalized(name):
+    return ' '.join(name.split())
+
+
+def link_departments(apps, schema_editor):
+    """Point profiles at the departments complaints.0009 created from the old names"""
+    Department = apps.get_model('complaints', 'Department')
+    UserProfile = apps.get_model('accounts', 'UserProfile')
+    by_key = {department.name.casefold(): department.pk for department in Department.objects.all()}
+    names = UserProfile.objects.exclude(department='').values_list('department', flat=True).distinct()
+    for name in names.order_by():
+        if not normalized(name):
+            continue
+        key = normalized(name).casefold()
+        if key not in by_key:
+            by_key[key] = Department.objects.create(name=normalized(name)).pk
+        UserProfile.objects.filter(department=name).update(department_ref=by_key[key])
+
+
+def restore_department_names(apps, schema_editor):
+    Department = apps.get_model('complaints', 'Department')
+    UserProfile = apps.get_model('accounts', 'UserProfile')
+    for department in Department.objects.all():
+        UserProfile.objects.filter(department_ref=department.pk).update(department=department.name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_userprofile_department_and_more'),
+        ('complaints', '0009_departments'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='department_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='complaints.department'),
+        ),
+        migrations.RunPython(link_departments, restore_department_names),
+        migrations.RemoveField(
+            model_name='userprofile',
+            name='department',
+        ),
+        migrations.RenameField(
+            model_name='userprofile',
+            old_name='department_ref',
+            new_name='department',
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='department',
+            field=models.ForeignKey(blank=True, help_text='Department for department staff', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='profiles', to='complaints.department'),
+        ),
+    ]
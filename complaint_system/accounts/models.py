@@ -1,6 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
 
@@ -10,13 +10,42 @@ class UserProfile(models.Model):
     phone = models.CharField(max_length=15, blank=True)
     address = models.TextField(blank=True)
     profile_picture = models.ImageField(upload_to='profiles/', blank=True, null=True)
-    department = models.CharField(max_length=100, blank=True, help_text="Department for department staff")
+    department = models.ForeignKey(
+        'complaints.Department',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='profiles',
+        help_text="Department for department staff"
+    )
     is_department_user = models.BooleanField(default=False, help_text="Whether this user is a department staff member")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Fields compared by has_changes(); the timestamps follow the others
+    TRACKED_FIELDS = ['phone', 'address', 'profile_picture', 'department_id', 'is_department_user']
+    
     def __str__(self):
         return f"{self.user.username}'s Profile"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_state = instance.tracked_state()
+        return instance
+    
+    def tracked_state(self):
+        # Deferred fields are left out rather than loaded
+        return {name: getattr(self, name) for name in self.TRACKED_FIELDS if name in self.__dict__}
+    
+    def has_changes(self):
+        """Whether the profile differs from what was loaded (unsaved profiles always do)"""
+        loaded = getattr(self, '_loaded_state', None)
+        return loaded is None or self._state.adding or loaded != self.tracked_state()
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_state = self.tracked_state()
 
 
 @receiver(post_save, sender=User)
@@ -27,7 +56,53 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    """Save profile when user is saved"""
-    UserProfile.objects.get_or_create(user=instance)
-    instance.profile.save()
+def save_user_profile(sender, instance, created, update_fields=None, **kwargs):
+    """Save profile changes made through user.profile along with the user"""
+    # login() only touches last_login; nothing to do with the profile
+    if created or (update_fields is not None and set(update_fields) <= {'last_login'}):
+        return
+    profile = instance._state.fields_cache.get('profile')
+    if profile is None:
+        # Users created before profiles existed get one on their next save
+        UserProfile.objects.get_or_create(user=instance)
+    elif profile.has_changes():
+        profile.save()
+
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user_payload(sender, instance, update_fields=None, **kwargs):
+    """Drop the cached auth payload (accounts/auth_cache.py)"""
+    # last_login is not part of the payload; logins should not empty the cache
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    from .auth_cache import forget_payload
+    forget_payload(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def invalidate_profile_payload(sender, instance, **kwargs):
+    """Drop the cached auth payload (accounts/auth_cache.py)"""
+    from .auth_cache import forget_payload
+    forget_payload(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=User)
+def revoke_user_tokens(sender, instance, update_fields=None, **kwargs):
+    """Reject access tokens carrying claims from before this change (accounts/tokens.py)"""
+    if kwargs.get('created') or (update_fields is not None and set(update_fields) <= {'last_login'}):
+        return
+    from .tokens import revoke_user
+    revoke_user(instance.pk)
+
+
+@receiver(post_save, sender=UserProfile)
+def revoke_profile_tokens(sender, instance, created, **kwargs):
+    """Department changes alter the role and department claims (accounts/tokens.py)"""
+    loaded = getattr(instance, '_loaded_state', None)
+    if created or loaded is None:
+        return
+    current = instance.tracked_state()
+    if any(loaded.get(name) != current.get(name) for name in ('department_id', 'is_department_user')):
+        from .tokens import revoke_user
+        revoke_user(instance.user_id)
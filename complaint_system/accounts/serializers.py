@@ -1,11 +1,33 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
+from complaints.departments import department_name
+from complaints.serializers import DepartmentField
 from .models import UserProfile
 
 
+def user_profile(user):
+    """The user's profile, or None; no query when it was loaded with select_related('profile')"""
+    try:
+        return user.profile
+    except UserProfile.DoesNotExist:
+        return None
+
+
+def user_role(user, profile):
+    if user.is_staff:
+        return 'admin'
+    if profile is not None and profile.is_department_user:
+        return 'department'
+    if profile is not None and profile.department_id:
+        return 'pending'
+    return 'citizen'
+
+
 class UserProfileSerializer(serializers.ModelSerializer):
     """Serializer for user profile"""
+    department = DepartmentField()
+    
     class Meta:
         model = UserProfile
         fields = ['phone', 'address', 'profile_picture', 'department', 'is_department_user']
@@ -69,7 +91,8 @@ class DepartmentRegistrationSerializer(serializers.ModelSerializer):
     """Serializer for department staff registration"""
     password = serializers.CharField(write_only=True, required=True, validators=[validate_password])
     password2 = serializers.CharField(write_only=True, required=True)
-    department = serializers.CharField(required=True)
+    # Checked against the cached department table; "ADMIN STAFF" is one of them
+    department = DepartmentField(required=True, allow_null=False)
     
     class Meta:
         model = User
@@ -85,15 +108,6 @@ class DepartmentRegistrationSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError({"password": "Password fields didn't match."})
         return attrs
     
-    def validate_department(self, value):
-        if value == "ADMIN STAFF":
-            return value
-        from complaints.models import Category
-        valid_departments = Category.objects.values_list('department', flat=True).distinct()
-        if value not in valid_departments:
-            raise serializers.ValidationError("Invalid department. Please select from available departments.")
-        return value
-    
     def create(self, validated_data):
         validated_data.pop('password2')
         department = validated_data.pop('department')
@@ -118,12 +132,14 @@ class LoginSerializer(serializers.Serializer):
     """Serializer for user login"""
     username = serializers.CharField(required=True)
     password = serializers.CharField(required=True, write_only=True)
+    # Mobile and API clients ask for signed tokens instead of a session cookie
+    tokens = serializers.BooleanField(required=False, default=False)
 
 
 class AdminUserUpdateSerializer(serializers.ModelSerializer):
     """Serializer for admin to update user roles and department"""
     # Use write_only fields for input to avoid conflict with model lookup during reading
-    department = serializers.CharField(required=False, allow_blank=True, write_only=True)
+    department = DepartmentField(write_only=True)
     is_department_user = serializers.BooleanField(required=False, write_only=True)
     
     class Meta:
@@ -134,18 +150,15 @@ class AdminUserUpdateSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         """Manually add profile fields for output"""
         ret = super().to_representation(instance)
-        try:
-            from .models import UserProfile
-            profile, _ = UserProfile.objects.get_or_create(user=instance)
-            ret['department'] = profile.department
-            ret['is_department_user'] = profile.is_department_user
-        except Exception:
-            ret['department'] = ""
-            ret['is_department_user'] = False
+        # Read-only: a user without a profile is shown with the defaults
+        profile = user_profile(instance)
+        ret['department'] = department_name(profile.department_id) if profile else ""
+        ret['is_department_user'] = profile.is_department_user if profile else False
         return ret
             
     def update(self, instance, validated_data):
-        # Extract profile fields manually
+        # Extract profile fields manually; a blank department clears it
+        has_department = 'department' in validated_data
         department = validated_data.pop('department', None)
         is_department_user = validated_data.pop('is_department_user', None)
 
@@ -160,7 +173,7 @@ class AdminUserUpdateSerializer(serializers.ModelSerializer):
             from .models import UserProfile
             profile, created = UserProfile.objects.get_or_create(user=instance)
             
-            if department is not None:
+            if has_department:
                 profile.department = department
             
             if is_department_user is not None:
@@ -172,3 +185,20 @@ class AdminUserUpdateSerializer(serializers.ModelSerializer):
             pass
             
         return instance
+
+
+class UserDirectorySerializer(serializers.ModelSerializer):
+    """Read-only row of the admin user directory; expects select_related('profile')"""
+    
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'email', 'first_name', 'last_name', 'is_staff', 'date_joined']
+        read_only_fields = fields
+    
+    def to_representation(self, instance):
+        ret = super().to_representation(instance)
+        profile = user_profile(instance)
+        ret['department'] = department_name(profile.department_id) if profile else ""
+        ret['is_department_user'] = profile.is_department_user if profile else False
+        ret['role'] = user_role(instance, profile)
+        return ret
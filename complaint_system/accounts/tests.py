@@ -1,3 +1,306 @@
-from django.test import TestCase
+import shutil
+import tempfile
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from complaints.models import Category, Complaint, Department
+from . import auth_cache, tokens
+
+
+def file_caches(directory):
+    """The deployed cache layout, in a scratch directory"""
+    return {
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-default'},
+        'throttle': {
+            'BACKEND': 'config.cache.PeriodicCullFileBasedCache',
+            'LOCATION': f'{directory}/throttle',
+            'OPTIONS': {'MAX_ENTRIES': 10, 'CULL_INTERVAL': 0},
+        },
+        'versions': {'BACKEND': 'config.cache.PeriodicCullFileBasedCache', 'LOCATION': f'{directory}/versions'},
+        'tokens': {
+            'BACKEND': 'config.cache.PeriodicCullFileBasedCache',
+            'LOCATION': f'{directory}/tokens',
+            'OPTIONS': {'MAX_ENTRIES': 10, 'CULL_INTERVAL': 0, 'EVICT_LIVE': False},
+        },
+    }
+
+
+class SignedTokenTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_override = override_settings(CACHES=file_caches(directory))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user('citizen', password='s3cret-pass')
+
+    def login(self, username='citizen', password='s3cret-pass'):
+        response = self.client.post(
+            '/api/auth/login/', {'username': username, 'password': password, 'tokens': True},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def me(self, access):
+        return self.client.get('/api/auth/me/', HTTP_AUTHORIZATION=f'Bearer {access}')
+
+    def refresh(self, refresh):
+        return self.client.post('/api/auth/token/refresh/', {'refresh': refresh}, content_type='application/json')
+
+    def test_login_issues_a_working_pair_without_a_session(self):
+        pair = self.login()
+        self.assertNotIn('sessionid', self.client.cookies)
+        response = self.me(pair['access'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['username'], 'citizen')
+
+    def test_refresh_token_works_once(self):
+        pair = self.login()
+        response = self.refresh(pair['refresh'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.me(response.json()['access']).status_code, 200)
+        self.assertEqual(self.refresh(pair['refresh']).status_code, 401)
+
+    def test_revoked_refresh_token_is_rejected(self):
+        pair = self.login()
+        response = self.client.post('/api/auth/token/revoke/', {'refresh': pair['refresh']}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.refresh(pair['refresh']).status_code, 401)
+
+    def test_logout_revokes_the_access_token(self):
+        pair = self.login()
+        self.client.post('/api/auth/logout/', {'refresh': pair['refresh']},
+                         content_type='application/json', HTTP_AUTHORIZATION=f"Bearer {pair['access']}")
+        self.assertEqual(self.me(pair['access']).status_code, 401)
+        self.assertEqual(self.refresh(pair['refresh']).status_code, 401)
+
+    def test_password_change_ends_refresh(self):
+        pair = self.login()
+        self.user.set_password('n3w-s3cret-pass')
+        self.user.save()
+        self.assertEqual(self.refresh(pair['refresh']).status_code, 401)
+
+    def test_role_change_revokes_access_tokens(self):
+        pair = self.login()
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.me(pair['access']).status_code, 401)
+
+    def test_tampered_token_is_rejected(self):
+        access = self.login()['access']
+        self.assertEqual(self.me(access[:-2] + ('aa' if access[-2:] != 'aa' else 'bb')).status_code, 401)
+
+    def test_revocations_survive_a_full_throttle_cache(self):
+        pair = self.login()
+        tokens.revoke(tokens.verify(pair['refresh'], tokens.REFRESH))
+        throttle = caches['throttle']
+        for n in range(100):
+            throttle.set(f'throttle:flood:{n}', (1, 0), 60)
+        self.assertEqual(self.refresh(pair['refresh']).status_code, 401)
+
+
+class DepartmentScopeTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_override = override_settings(CACHES=file_caches(directory))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        roads = Department.objects.create(name='Roads')
+        water = Department.objects.create(name='Water')
+        for number, department in enumerate((roads, roads, water)):
+            category, _ = Category.objects.get_or_create(name=department.name, department=department)
+            Complaint.objects.create(
+                title='Issue', description='Details', category=category, department=department,
+                citizen_name='Citizen', citizen_email='citizen@example.com', reference_number=f'SCOPE{number}',
+            )
+
+        self.staff = User.objects.create_user('roads-staff', password='s3cret-pass')
+        profile = self.staff.profile
+        profile.department = roads
+        profile.is_department_user = True
+        profile.save()
+        self.roads = roads
+
+    def access_token(self):
+        response = self.client.post(
+            '/api/auth/login/', {'username': 'roads-staff', 'password': 's3cret-pass', 'tokens': True},
+            content_type='application/json',
+        )
+        return response.json()['access']
+
+    def test_claims_carry_the_department(self):
+        claims = tokens.verify(self.access_token(), tokens.ACCESS)
+        self.assertEqual((claims['role'], claims['dept']), ('department', self.roads.pk))
+
+    def test_token_users_only_see_their_department(self):
+        response = self.client.get('/api/complaints/', HTTP_AUTHORIZATION=f'Bearer {self.access_token()}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 2)
+
+    def test_session_users_only_see_their_department(self):
+        self.client.login(username='roads-staff', password='s3cret-pass')
+        self.assertEqual(self.client.get('/api/complaints/').json()['count'], 2)
+
+    def test_anonymous_clients_see_every_department(self):
+        self.assertEqual(self.client.get('/api/complaints/').json()['count'], 3)
+
+    def test_user_directory_department_filter(self):
+        User.objects.create_user('admin', password='s3cret-pass', is_staff=True)
+        self.client.login(username='admin', password='s3cret-pass')
+
+        def usernames(department):
+            response = self.client.get('/api/auth/users/', {'department': department})
+            return [user['username'] for user in response.json()['results']]
+
+        self.assertEqual(usernames('Roads'), ['roads-staff'])
+        self.assertEqual(usernames('Typo'), [])
+
+
+class UserDirectoryTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_override = override_settings(CACHES=file_caches(directory))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.roads = Department.objects.create(name='Roads')
+        self.water = Department.objects.create(name='Water')
+        self.admin = User.objects.create_user('admin', is_staff=True)
+        self.roads_staff = self.member('roads-staff', self.roads, approved=True)
+        self.member('water-staff', self.water, approved=True)
+        self.member('water-applicant', self.water, approved=False)
+        User.objects.create_user('citizen', email='jo@example.com')
+
+    def member(self, username, department, approved):
+        user = User.objects.create_user(username)
+        user.profile.department = department
+        user.profile.is_department_user = approved
+        user.profile.save()
+        return user
+
+    def usernames(self, **params):
+        response = self.client.get('/api/auth/users/', params)
+        self.assertEqual(response.status_code, 200)
+        return sorted(user['username'] for user in response.json()['results'])
+
+    def test_filters(self):
+        self.client.force_login(self.admin)
+        self.assertEqual(self.usernames(role='admin'), ['admin'])
+        self.assertEqual(self.usernames(role='department'), ['roads-staff', 'water-staff'])
+        self.assertEqual(self.usernames(role='pending'), ['water-applicant'])
+        self.assertEqual(self.usernames(role='citizen'), ['citizen'])
+        self.assertEqual(
+            self.usernames(role='staff'), ['admin', 'roads-staff', 'water-applicant', 'water-staff']
+        )
+        self.assertEqual(self.usernames(department='Water'), ['water-applicant', 'water-staff'])
+        self.assertEqual(self.usernames(department='Water', pending='false'), ['water-staff'])
+        self.assertEqual(self.usernames(pending='true'), ['water-applicant'])
+        self.assertEqual(self.usernames(search='EXAMPLE.com'), ['citizen'])
+        self.assertEqual(self.client.get('/api/auth/users/', {'role': 'owner'}).status_code, 400)
+
+    def test_rows_show_department_and_role(self):
+        self.client.force_login(self.admin)
+        [row] = self.client.get('/api/auth/users/', {'role': 'pending'}).json()['results']
+        self.assertEqual((row['department'], row['is_department_user'], row['role']), ('Water', False, 'pending'))
+
+    def test_pages_cost_the_same_queries_however_many_users(self):
+        self.client.force_login(self.admin)
+        queries = ({}, {'role': 'staff'}, {'department': 'Roads', 'search': 'staff'}, {'page_size': 100})
+        # Warm the department table, which is loaded once per process
+        self.usernames(department='Roads')
+
+        def query_counts():
+            counts = []
+            for params in queries:
+                with CaptureQueriesContext(connection) as captured:
+                    self.usernames(**params)
+                counts.append(len(captured))
+            return counts
+
+        before = query_counts()
+        for number in range(30):
+            self.member(f'roads-{number}', self.roads, approved=number % 2 == 0)
+        # Session, user, COUNT and the page
+        self.assertEqual(before, [4] * len(queries))
+        self.assertEqual(query_counts(), before)
+
+    def test_only_admins_can_list_users(self):
+        self.client.force_login(self.roads_staff)
+        self.assertEqual(self.client.get('/api/auth/users/').status_code, 403)
+
+
+class AuthPayloadCacheTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_override = override_settings(CACHES=file_caches(directory))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.roads = Department.objects.create(name='Roads')
+        self.user = User.objects.create_user('citizen', password='s3cret-pass')
+        self.admin = User.objects.create_user('admin', is_staff=True)
+
+    def login(self):
+        response = self.client.post(
+            '/api/auth/login/', {'username': 'citizen', 'password': 's3cret-pass'}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def check(self):
+        response = self.client.get('/api/auth/check/')
+        self.assertTrue(response.json()['authenticated'])
+        return response.json()['user']
+
+    def test_login_does_not_write_the_profile(self):
+        updated_at = self.user.profile.updated_at
+        with CaptureQueriesContext(connection) as captured:
+            self.login()
+        profile_writes = [
+            query['sql'] for query in captured
+            if 'accounts_userprofile' in query['sql'] and not query['sql'].startswith('SELECT')
+        ]
+        self.assertEqual(profile_writes, [])
+        self.user.profile.refresh_from_db()
+        self.assertEqual(self.user.profile.updated_at, updated_at)
+
+    def test_check_is_answered_without_loading_the_user(self):
+        self.login()
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(self.check()['username'], 'citizen')
+        self.assertFalse([query['sql'] for query in captured if 'auth_user' in query['sql']])
+
+    def test_a_role_change_is_seen_by_the_next_check(self):
+        self.login()
+        self.assertFalse(self.check()['profile']['is_department_user'])
+
+        admin = self.client_class()
+        admin.force_login(self.admin)
+        response = admin.patch(
+            f'/api/auth/users/{self.user.pk}/', {'department': 'Roads', 'is_department_user': True},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+
+        profile = self.check()['profile']
+        self.assertEqual((profile['department'], profile['is_department_user']), ('Roads', True))
+
+    def test_only_last_login_saves_keep_the_cached_payload(self):
+        self.login()
+        key = auth_cache.PAYLOAD_KEY.format(self.user.pk)
+        self.user.save(update_fields=['last_login'])
+        self.assertIsNotNone(auth_cache.get_cache().get(key))
+        self.user.first_name = 'Jo'
+        self.user.save()
+        self.assertIsNone(auth_cache.get_cache().get(key))
+        self.assertEqual(self.check()['first_name'], 'Jo')
@@ -0,0 +1,170 @@
+"""
+Stateless signed access/refresh tokens for mobile and API clients.
+
+Tokens are django.core.signing payloads: compact JSON claims, HMAC-signed with
+SECRET_KEY and timestamped, so checking one is a signature and age check with
+no database round trip. Access tokens carry the user's id, username, role and
+department, enough for request.user and for department scoping without
+loading the user or the profile. They live for TOKEN_ACCESS_LIFETIME seconds;
+a role change reaches clients when they refresh.
+
+Refresh tokens live for TOKEN_REFRESH_LIFETIME and are exchanged, once, for a
+new pair. That exchange reloads the user, so a deactivated user or a changed
+password ends the session there.
+
+Revocation goes through a deny-list in the TOKEN_DENYLIST_CACHE_ALIAS cache,
+shared by all workers and kept apart from the throttle buckets: it never
+evicts an entry early. It holds one small entry per revoked token, kept only
+until that token would have expired anyway, plus a per-user cutoff that
+rejects every access token issued before a user's role or account changed.
+Both are read in a single cache lookup.
+"""
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.cache import caches
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+
+from .models import UserProfile
+
+
+ACCESS = 'access'
+REFRESH = 'refresh'
+TOKEN_SALT = 'accounts.tokens.{}'
+KEYWORD = b'bearer'
+DENIED_KEY = 'token-denied:{}'
+USER_CUTOFF_KEY = 'token-cutoff:{}'
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def get_cache():
+    return caches[settings.TOKEN_DENYLIST_CACHE_ALIAS]
+
+
+def lifetime(kind):
+    return settings.TOKEN_ACCESS_LIFETIME if kind == ACCESS else settings.TOKEN_REFRESH_LIFETIME
+
+
+def user_claims(user):
+    """Role and department claims, from the same rules as the user directory"""
+    from .serializers import user_profile, user_role
+
+    profile = user_profile(user)
+    return {
+        'uid': user.pk,
+        'pid': profile.pk if profile else None,
+        'usr': user.username,
+        'role': user_role(user, profile),
+        'dept': profile.department_id if profile else None,
+        'su': user.is_superuser,
+    }
+
+
+def issue(user, kind):
+    claims = {'typ': kind, 'jti': uuid.uuid4().hex, 'iat': round(time.time(), 3)}
+    if kind == ACCESS:
+        claims.update(user_claims(user))
+    else:
+        # Enough to find the user again and notice a password change
+        claims.update({'uid': user.pk, 'pwh': user.get_session_auth_hash()[:16]})
+    return signing.dumps(claims, salt=TOKEN_SALT.format(kind), compress=True)
+
+
+def issue_pair(user):
+    return {
+        'access': issue(user, ACCESS),
+        'refresh': issue(user, REFRESH),
+        'token_type': 'Bearer',
+        'expires_in': settings.TOKEN_ACCESS_LIFETIME,
+    }
+
+
+def verify(token, kind):
+    """Claims of a valid, unexpired, unrevoked token; raises InvalidToken otherwise"""
+    try:
+        claims = signing.loads(token, salt=TOKEN_SALT.format(kind), max_age=lifetime(kind))
+    except signing.SignatureExpired:
+        raise InvalidToken('Token has expired.')
+    except signing.BadSignature:
+        raise InvalidToken('Invalid token.')
+    if claims.get('typ') != kind:
+        raise InvalidToken('Invalid token.')
+
+    denied = DENIED_KEY.format(claims['jti'])
+    cutoff = USER_CUTOFF_KEY.format(claims['uid'])
+    entries = get_cache().get_many([denied, cutoff])
+    if denied in entries:
+        raise InvalidToken('Token has been revoked.')
+    if kind == ACCESS and claims['iat'] < entries.get(cutoff, 0):
+        raise InvalidToken('Token has been revoked.')
+    return claims
+
+
+def revoke(claims):
+    """Deny one token until it would have expired"""
+    remaining = claims['iat'] + lifetime(claims['typ']) - time.time()
+    if remaining > 0:
+        get_cache().set(DENIED_KEY.format(claims['jti']), 1, int(remaining) + 1)
+
+
+def revoke_user(user_id):
+    """Reject the user's current access tokens; clients refresh to get current claims"""
+    get_cache().set(USER_CUTOFF_KEY.format(user_id), time.time(), settings.TOKEN_ACCESS_LIFETIME + 1)
+
+
+def refresh(token):
+    """Exchange a refresh token for a new pair; the old refresh token is revoked"""
+    claims = verify(token, REFRESH)
+    user = User.objects.select_related('profile').filter(pk=claims['uid'], is_active=True).first()
+    if user is None or user.get_session_auth_hash()[:16] != claims['pwh']:
+        raise InvalidToken('Invalid token.')
+    revoke(claims)
+    return user, issue_pair(user)
+
+
+def claims_user(claims):
+    """
+    User for an access token, built from its claims without a query.
+    Other fields are deferred: reading one loads it, and save() only writes
+    the loaded ones.
+    """
+    user = User.from_db(
+        'default',
+        ['id', 'username', 'is_staff', 'is_superuser', 'is_active'],
+        [claims['uid'], claims['usr'], claims['role'] == 'admin', claims['su'], True],
+    )
+    if claims['pid'] is not None:
+        profile = UserProfile.from_db(
+            'default',
+            ['id', 'user_id', 'department_id', 'is_department_user'],
+            [claims['pid'], claims['uid'], claims['dept'], claims['role'] == 'department'],
+        )
+        UserProfile.user.field.set_cached_value(profile, user)
+        User.profile.related.set_cached_value(user, profile)
+    return user
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """Authorization: Bearer <access token>; request.auth is the claims dict"""
+
+    def authenticate(self, request):
+        header = get_authorization_header(request).split()
+        if not header or header[0].lower() != KEYWORD:
+            return None
+        if len(header) != 2:
+            raise exceptions.AuthenticationFailed('Invalid Authorization header.')
+        try:
+            claims = verify(header[1].decode(), ACCESS)
+        except (InvalidToken, UnicodeDecodeError) as exc:
+            raise exceptions.AuthenticationFailed(str(exc))
+        return claims_user(claims), claims
+
+    def authenticate_header(self, request):
+        return 'Bearer'
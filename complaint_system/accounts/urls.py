@@ -6,6 +6,8 @@ urlpatterns = [
     path('register-department/', views.register_department_user, name='register-department'),
     path('login/', views.login_user, name='login'),
     path('logout/', views.logout_user, name='logout'),
+    path('token/refresh/', views.refresh_token, name='token-refresh'),
+    path('token/revoke/', views.revoke_token, name='token-revoke'),
     path('me/', views.current_user, name='current-user'),
     path('check/', views.check_auth, name='check-auth'),
     path('departments/', views.departments_list, name='departments-list'),
@@ -1,17 +1,23 @@
 from rest_framework import status, generics
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from django.contrib.auth import authenticate, login, logout
+from django.contrib.auth import authenticate, get_user, login, logout, user_logged_in
 from django.contrib.auth.models import User
+from django.db.models import Q
 from .serializers import (
     UserRegistrationSerializer, 
     DepartmentRegistrationSerializer, 
     LoginSerializer, 
     UserSerializer,
-    AdminUserUpdateSerializer
+    AdminUserUpdateSerializer,
+    UserDirectorySerializer
 )
-from complaints.models import Category
+from .auth_cache import session_payload, store_payload, user_payload
+from . import tokens
+from complaints.departments import department_id, departments
 
 
 @api_view(['POST'])
@@ -23,7 +29,7 @@ def register_user(request):
         user = serializer.save()
         # Automatically log in the user after registration
         login(request, user)
-        user_data = UserSerializer(user).data
+        user_data = store_payload(user, UserSerializer(user).data)
         return Response({
             'message': 'User registered successfully',
             'user': user_data
@@ -39,7 +45,7 @@ def register_department_user(request):
     if serializer.is_valid():
         user = serializer.save()
         login(request, user)
-        user_data = UserSerializer(user).data
+        user_data = store_payload(user, UserSerializer(user).data)
         return Response({
             'message': 'Department user registered successfully',
             'user': user_data
@@ -57,9 +63,17 @@ def login_user(request):
         password = serializer.validated_data['password']
         
         user = authenticate(request, username=username, password=password)
+        if user is not None and serializer.validated_data['tokens']:
+            # No session: the client sends the access token as a Bearer header
+            user_logged_in.send(sender=user.__class__, request=request, user=user)
+            return Response({
+                'message': 'Login successful',
+                'user': user_payload(user),
+                **tokens.issue_pair(user),
+            }, status=status.HTTP_200_OK)
         if user is not None:
             login(request, user)
-            user_data = UserSerializer(user).data
+            user_data = user_payload(user)
             return Response({
                 'message': 'Login successful',
                 'user': user_data
@@ -75,29 +89,72 @@ def login_user(request):
 @permission_classes([IsAuthenticated])
 def logout_user(request):
     """Logout user"""
-    logout(request)
+    if isinstance(request.auth, dict):
+        # Token clients: deny the access token and, if sent, its refresh token
+        tokens.revoke(request.auth)
+        refresh = request.data.get('refresh')
+        if refresh:
+            try:
+                tokens.revoke(tokens.verify(refresh, tokens.REFRESH))
+            except tokens.InvalidToken:
+                pass
+    else:
+        logout(request)
     return Response({
         'message': 'Logout successful'
     }, status=status.HTTP_200_OK)
 
 
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def refresh_token(request):
+    """Exchange a refresh token for a new access/refresh pair"""
+    try:
+        user, pair = tokens.refresh(request.data.get('refresh') or '')
+    except tokens.InvalidToken as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_401_UNAUTHORIZED)
+    return Response(pair)
+
+
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def revoke_token(request):
+    """Revoke a refresh token, e.g. when a device is signed out"""
+    try:
+        tokens.revoke(tokens.verify(request.data.get('refresh') or '', tokens.REFRESH))
+    except tokens.InvalidToken as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'message': 'Token revoked'})
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def current_user(request):
     """Get current logged-in user details"""
-    serializer = UserSerializer(request.user)
-    return Response(serializer.data)
+    user = request.user
+    if isinstance(request.auth, dict):
+        # Token users are built from claims; the payload needs the full rows
+        user = User.objects.select_related('profile').get(pk=user.pk)
+    return Response(user_payload(user))
 
 
 @api_view(['GET'])
+@authentication_classes([])
 @permission_classes([AllowAny])
 def check_auth(request):
     """Check if user is authenticated"""
-    if request.user.is_authenticated:
-        serializer = UserSerializer(request.user)
+    # Sessions the payload cache can vouch for are answered without loading the user
+    payload = session_payload(request.session)
+    if payload is None:
+        user = get_user(request._request)
+        if user.is_authenticated:
+            payload = user_payload(user)
+    if payload is not None:
         return Response({
             'authenticated': True,
-            'user': serializer.data
+            'user': payload
         })
     return Response({
         'authenticated': False
@@ -107,35 +164,74 @@ def check_auth(request):
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def departments_list(request):
-    """Get list of available departments from categories and existing profiles"""
-    # Departments from Categories
-    cat_depts = Category.objects.exclude(
-        department=''
-    ).values_list('department', flat=True).distinct()
+    """Get list of available departments"""
+    # "ADMIN STAFF" is a department row too, used for admin access requests
+    return Response({'departments': sorted(departments().values())})
+
+
+class UserDirectoryPagination(PageNumberPagination):
+    page_size = 25
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+# ?role= values; a pending user asked for department access and awaits approval
+USER_ROLE_FILTERS = {
+    'admin': Q(is_staff=True),
+    'department': Q(is_staff=False, profile__is_department_user=True),
+    'pending': Q(is_staff=False, profile__is_department_user=False, profile__department__isnull=False),
+    'citizen': Q(is_staff=False) & (
+        Q(profile__isnull=True) | Q(profile__is_department_user=False, profile__department__isnull=True)
+    ),
+    # Everyone on the staff list: admins, department staff and pending requests
+    'staff': Q(is_staff=True) | Q(profile__is_department_user=True) | Q(profile__department__isnull=False),
+}
+
+
+def filter_users(queryset, params):
+    """Apply the user directory filters: ?role=, ?department=, ?pending= and ?search="""
+    role = params.get('role')
+    if role:
+        if role not in USER_ROLE_FILTERS:
+            raise ValidationError({'role': f'Must be one of: {", ".join(USER_ROLE_FILTERS)}'})
+        queryset = queryset.filter(USER_ROLE_FILTERS[role])
     
-    # Departments from User Profiles (to handle existing assignments)
-    from .models import UserProfile
-    profile_depts = UserProfile.objects.exclude(
-        department=''
-    ).values_list('department', flat=True).distinct()
+    department = params.get('department')
+    if department:
+        pk = department_id(department)
+        # Unknown names match nobody, not the users without a department
+        if pk is None:
+            return queryset.none()
+        queryset = queryset.filter(profile__department=pk)
     
-    # Combine and add ADMIN STAFF
-    departments = set(cat_depts) | set(profile_depts) | {"ADMIN STAFF"}
+    pending = params.get('pending', '').lower()
+    if pending in ('1', 'true', 'yes'):
+        queryset = queryset.filter(USER_ROLE_FILTERS['pending'])
+    elif pending in ('0', 'false', 'no'):
+        queryset = queryset.exclude(USER_ROLE_FILTERS['pending'])
     
-    # Sort and return
-    return Response({'departments': sorted(list(departments))})
+    search = params.get('search', '').strip()
+    if search:
+        queryset = queryset.filter(
+            Q(username__icontains=search) | Q(email__icontains=search)
+            | Q(first_name__icontains=search) | Q(last_name__icontains=search)
+        )
+    return queryset
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def list_users(request):
-    """List all users (Admin only)"""
+    """Paginated, filterable user directory (Admin only)"""
     if not request.user.is_staff:
         return Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
-        
-    users = User.objects.all().order_by('-date_joined')
-    serializer = AdminUserUpdateSerializer(users, many=True)
-    return Response(serializer.data)
+    
+    # Ids grow with date_joined, and unlike date_joined the primary key is indexed
+    users = filter_users(User.objects.select_related('profile'), request.query_params).order_by('-id')
+    paginator = UserDirectoryPagination()
+    page = paginator.paginate_queryset(users, request)
+    serializer = UserDirectorySerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
 
 
 @api_view(['PATCH'])
@@ -1,14 +1,87 @@
+from datetime import datetime
+
 from django.contrib import admin
+from django.db.models import Count, Max, Min, QuerySet
+from django.forms.models import BaseInlineFormSet
+from django.utils import timezone
 from django.utils.html import format_html
-from .models import Category, Complaint, StatusHistory, Feedback
+from .models import (
+    ArchivedStatusHistory, Category, ColdComplaint, Complaint, Department, StatusHistory, Feedback, SLAPolicy
+)
+from .departments import department_name
+from .paginators import EstimatedCountPaginator
+
+
+class DateRangeQuerySet(QuerySet):
+    """
+    datetimes() from the MIN/MAX of the field instead of a DISTINCT scan.
+    
+    The admin date hierarchy lists the years/months/days that have rows;
+    on a large table that is a full scan per page view. Both ends of the
+    range come straight off the field's index, and every period in between
+    is listed (empty ones included).
+    """
+    
+    def datetimes(self, field_name, kind, order='ASC', tzinfo=None, **kwargs):
+        bounds = self.aggregate(first=Min(field_name), last=Max(field_name))
+        if bounds['first'] is None:
+            return []
+        tzinfo = tzinfo or timezone.get_current_timezone()
+        first, last = (timezone.localtime(bounds[key], tzinfo) for key in ('first', 'last'))
+        
+        periods = []
+        year, month, day = first.year, first.month if kind != 'year' else 1, first.day if kind == 'day' else 1
+        current = datetime(year, month, day)
+        end = datetime(last.year, last.month if kind != 'year' else 1, last.day if kind == 'day' else 1)
+        while current <= end:
+            periods.append(timezone.make_aware(current, tzinfo))
+            if kind == 'year':
+                current = current.replace(year=current.year + 1)
+            elif kind == 'month':
+                current = current.replace(year=current.year + current.month // 12, month=current.month % 12 + 1)
+            else:
+                current = datetime.fromordinal(current.toordinal() + 1)
+        return periods if order == 'ASC' else periods[::-1]
+
+
+class DateRangeHierarchyMixin:
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return DateRangeQuerySet(model=queryset.model, query=queryset.query, using=queryset.db)
+
+
+@admin.register(Department)
+class DepartmentAdmin(admin.ModelAdmin):
+    list_display = ['name', 'category_count', 'staff_count', 'created_at']
+    search_fields = ['name']
+    readonly_fields = ['created_at']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            category_total=Count('categories', distinct=True),
+            staff_total=Count('profiles', distinct=True),
+        )
+    
+    def category_count(self, obj):
+        return obj.category_total
+    category_count.short_description = 'Categories'
+    category_count.admin_order_field = 'category_total'
+    
+    def staff_count(self, obj):
+        return obj.staff_total
+    staff_count.short_description = 'Staff'
+    staff_count.admin_order_field = 'staff_total'
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ['name', 'colored_badge', 'description', 'complaint_count', 'created_at']
+    list_display = ['name', 'colored_badge', 'department_label', 'description', 'complaint_count', 'created_at']
     search_fields = ['name', 'description']
     readonly_fields = ['created_at']
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(complaint_total=Count('complaints'))
+    
     def colored_badge(self, obj):
         return format_html(
             '<span style="background-color: {}; color: white; padding: 3px 10px; border-radius: 3px;">{}</span>',
@@ -17,13 +90,32 @@ class CategoryAdmin(admin.ModelAdmin):
         )
     colored_badge.short_description = 'Badge'
     
+    def department_label(self, obj):
+        # From the cached table: joining departments slows down the complaint count
+        return department_name(obj.department_id) or '-'
+    department_label.short_description = 'Department'
+    
     def complaint_count(self, obj):
-        return obj.complaints.count()
+        return obj.complaint_total
     complaint_count.short_description = 'Total Complaints'
+    complaint_count.admin_order_field = 'complaint_total'
+
+
+class RecentStatusHistoryFormSet(BaseInlineFormSet):
+    """Only the latest rows; the full history is in the Status Histories changelist"""
+    limit = 20
+    
+    def get_queryset(self):
+        # Evaluated once; every form reads its instance from this slice
+        if not hasattr(self, '_recent'):
+            self._recent = super().get_queryset().select_related('complaint', 'changed_by')[:self.limit]
+        return self._recent
 
 
 class StatusHistoryInline(admin.TabularInline):
     model = StatusHistory
+    formset = RecentStatusHistoryFormSet
+    verbose_name_plural = f'Status history (latest {RecentStatusHistoryFormSet.limit})'
     extra = 0
     readonly_fields = ['old_status', 'new_status', 'changed_by', 'notes', 'created_at']
     can_delete = False
@@ -43,14 +135,19 @@ class FeedbackInline(admin.StackedInline):
 
 
 @admin.register(Complaint)
-class ComplaintAdmin(admin.ModelAdmin):
+class ComplaintAdmin(DateRangeHierarchyMixin, admin.ModelAdmin):
     list_display = [
         'reference_number', 'title', 'category', 'status_badge', 
         'priority_badge', 'citizen_name', 'assigned_to', 'created_at'
     ]
-    list_filter = ['status', 'priority', 'category', 'created_at']
+    list_filter = ['status', 'priority', 'category', 'department', 'created_at']
+    list_select_related = ['category', 'assigned_to']
     search_fields = ['reference_number', 'title', 'description', 'citizen_name', 'citizen_email']
-    readonly_fields = ['reference_number', 'created_at', 'updated_at', 'resolved_at', 'photo_preview']
+    date_hierarchy = 'created_at'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    readonly_fields = ['reference_number', 'created_at', 'updated_at', 'resolved_at', 'due_at', 'photo_preview']
+    raw_id_fields = ['parent']
     
     fieldsets = (
         ('Complaint Information', {
@@ -66,10 +163,10 @@ class ComplaintAdmin(admin.ModelAdmin):
             'fields': ('photo', 'photo_preview')
         }),
         ('Status & Assignment', {
-            'fields': ('status', 'priority', 'assigned_to', 'department')
+            'fields': ('status', 'priority', 'assigned_to', 'department', 'parent')
         }),
         ('Timestamps', {
-            'fields': ('created_at', 'updated_at', 'resolved_at'),
+            'fields': ('created_at', 'updated_at', 'resolved_at', 'due_at'),
             'classes': ('collapse',)
         }),
     )
@@ -119,11 +216,11 @@ class ComplaintAdmin(admin.ModelAdmin):
     def save_model(self, request, obj, form, change):
         """Track status changes and create history"""
         if change:
-            old_obj = Complaint.objects.get(pk=obj.pk)
-            if old_obj.status != obj.status:
+            # The form already knows the status the complaint was loaded with
+            if 'status' in form.changed_data:
                 StatusHistory.objects.create(
                     complaint=obj,
-                    old_status=old_obj.status,
+                    old_status=form.initial['status'],
                     new_status=obj.status,
                     changed_by=request.user,
                     notes=f'Status changed via admin panel'
@@ -185,10 +282,21 @@ class ComplaintAdmin(admin.ModelAdmin):
     mark_as_resolved.short_description = 'Mark selected as Resolved'
 
 
+@admin.register(SLAPolicy)
+class SLAPolicyAdmin(admin.ModelAdmin):
+    list_display = ['status', 'category', 'priority', 'hours']
+    list_filter = ['status', 'priority', 'category']
+    list_select_related = ['category']
+
+
 @admin.register(StatusHistory)
-class StatusHistoryAdmin(admin.ModelAdmin):
+class StatusHistoryAdmin(DateRangeHierarchyMixin, admin.ModelAdmin):
     list_display = ['complaint', 'old_status', 'new_status', 'changed_by', 'created_at']
     list_filter = ['new_status', 'created_at']
+    list_select_related = ['complaint', 'changed_by']
+    date_hierarchy = 'created_at'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     search_fields = ['complaint__reference_number', 'notes']
     readonly_fields = ['complaint', 'old_status', 'new_status', 'changed_by', 'notes', 'created_at']
     
@@ -199,10 +307,33 @@ class StatusHistoryAdmin(admin.ModelAdmin):
         return False
 
 
+@admin.register(ArchivedStatusHistory)
+class ArchivedStatusHistoryAdmin(StatusHistoryAdmin):
+    # The archive is only indexed by complaint; look rows up by reference number
+    list_filter = ['new_status']
+    date_hierarchy = None
+
+
+@admin.register(ColdComplaint)
+class ColdComplaintAdmin(admin.ModelAdmin):
+    list_display = ['reference_number', 'status', 'department_label', 'segment', 'archived_at']
+    list_filter = ['status', 'department']
+    search_fields = ['reference_number']
+    readonly_fields = ['reference_number', 'complaint_id', 'status', 'department', 'segment', 'offset', 'length', 'archived_at']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def department_label(self, obj):
+        return department_name(obj.department_id) or '-'
+    department_label.short_description = 'Department'
+
+
 @admin.register(Feedback)
 class FeedbackAdmin(admin.ModelAdmin):
     list_display = ['complaint', 'rating_stars', 'would_recommend', 'created_at']
     list_filter = ['rating', 'would_recommend', 'created_at']
+    list_select_related = ['complaint']
     search_fields = ['complaint__reference_number', 'comments']
     readonly_fields = ['complaint', 'rating', 'comments', 'would_recommend', 'created_at']
     
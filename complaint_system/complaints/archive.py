@@ -0,0 +1,111 @@
+"""
+Archival of status history for complaints closed long ago.
+
+StatusHistory gains rows with every submission and every transition, while
+only the history of recent and open complaints is read regularly. Rows of
+complaints that have been closed or rejected for HISTORY_ARCHIVE_MONTHS are
+moved, in batches of one transaction each, into ArchivedStatusHistory, which
+has the same columns and keeps the original ids. The hot table (and its
+indexes) then only grows with the complaints that are still being worked on.
+
+Reads of the hot table are unchanged. Callers that need the full record ask
+for it explicitly: history() merges both tables, and the detail API does the
+same with ?include_archived=true.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .cache import bump_version
+from .models import ArchivedStatusHistory, StatusHistory
+
+
+# Complaints in these statuses are done with; their history is only read for the record
+ARCHIVE_STATUSES = ['closed', 'rejected']
+HISTORY_COLUMNS = ['id', 'complaint_id', 'old_status', 'new_status', 'changed_by_id', 'notes', 'created_at']
+
+
+def archive_cutoff(months=None):
+    months = settings.HISTORY_ARCHIVE_MONTHS if months is None else months
+    return timezone.now() - timedelta(days=30 * months)
+
+
+def archivable_history(cutoff):
+    """Hot history rows of complaints closed before the cutoff, in id order"""
+    return StatusHistory.objects.filter(
+        complaint__status__in=ARCHIVE_STATUSES, complaint__updated_at__lt=cutoff
+    ).order_by('pk')
+
+
+def delete_rows(model, values, field='id'):
+    """
+    DELETE the rows whose `field` is one of `values` with plain SQL, in chunks
+    the backend accepts; returns the number of rows deleted. QuerySet.delete()
+    would load every row to send post_delete, so callers bump the response
+    cache versions themselves.
+    """
+    table = connection.ops.quote_name(model._meta.db_table)
+    column = connection.ops.quote_name(model._meta.get_field(field).column)
+    values = list(values)
+    chunk = connection.ops.bulk_batch_size([field], values) or 1
+    deleted = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(values), chunk):
+            part = values[start:start + chunk]
+            cursor.execute(f'DELETE FROM {table} WHERE {column} IN ({", ".join(["%s"] * len(part))})', part)
+            deleted += cursor.rowcount
+    return deleted
+
+
+def archive_batch(cutoff, after=0, batch_size=None):
+    """Move one batch of rows with ids above `after`; returns the moved ids"""
+    batch_size = batch_size or settings.HISTORY_ARCHIVE_BATCH_SIZE
+    with transaction.atomic():
+        rows = list(archivable_history(cutoff).filter(pk__gt=after).values(*HISTORY_COLUMNS)[:batch_size])
+        if not rows:
+            return []
+        ids = [row['id'] for row in rows]
+        ArchivedStatusHistory.objects.bulk_create([ArchivedStatusHistory(**row) for row in rows])
+        delete_rows(StatusHistory, ids)
+    return ids
+
+
+def archive_history(months=None, batch_size=None, limit=None):
+    """Archive everything eligible, batch by batch; returns the number of rows moved"""
+    batch_size = batch_size or settings.HISTORY_ARCHIVE_BATCH_SIZE
+    cutoff = archive_cutoff(months)
+    moved, last_id = 0, 0
+    while limit is None or moved < limit:
+        size = batch_size if limit is None else min(batch_size, limit - moved)
+        ids = archive_batch(cutoff, last_id, size)
+        if not ids:
+            break
+        moved += len(ids)
+        last_id = ids[-1]
+        if len(ids) < size:
+            break
+    if moved:
+        # The plain DELETE skipped the post_delete receivers
+        bump_version('complaints')
+    return moved
+
+
+def merge_history(recent, archived, limit=None):
+    """Newest-first union of hot and archived rows"""
+    rows = sorted([*recent, *archived], key=lambda row: row.created_at, reverse=True)
+    return rows[:limit] if limit else rows
+
+
+def history(complaint, include_archived=False, limit=None):
+    """Status history of a complaint, newest first, optionally including archived rows"""
+    recent = complaint.status_history.select_related('changed_by').order_by('-created_at')
+    if limit:
+        recent = recent[:limit]
+    if not include_archived:
+        return list(recent)
+    archived = complaint.archived_status_history.select_related('changed_by').order_by('-created_at')
+    if limit:
+        archived = archived[:limit]
+    return merge_history(recent, archived, limit)
@@ -0,0 +1,184 @@
+"""
+Load-aware assignment of unassigned complaints to department staff.
+
+LoadIndex loads every eligible department user once, together with their
+current open load (weighted by priority) and the centroid of their recent
+work, using a handful of grouped queries. Each complaint then goes to the
+staff member of its department with the lowest cost:
+
+    open load + distance to their recent work (km) / ASSIGNMENT_KM_PER_LOAD
+
+and that member's load and centroid are updated in memory, so a batch of
+thousands of complaints costs a few UPDATE statements rather than queries
+per row. Higher priorities are assigned first.
+"""
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Case, Count, IntegerField, Value, When
+from django.utils import timezone
+
+from .cache import bump_version
+from .models import Complaint
+
+
+PRIORITY_RANK = {'critical': 4, 'high': 3, 'medium': 2, 'low': 1}
+
+
+def priority_rank():
+    """SQL expression ordering complaints from critical to low"""
+    return Case(
+        *[When(priority=priority, then=Value(rank)) for priority, rank in PRIORITY_RANK.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def distance_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * 6371 * math.asin(math.sqrt(a))
+
+
+class StaffLoad:
+    __slots__ = ('user_id', 'username', 'load', 'open_count', 'latitude', 'longitude', 'located')
+
+    def __init__(self, user_id, username):
+        self.user_id = user_id
+        self.username = username
+        self.load = 0
+        self.open_count = 0
+        self.latitude = self.longitude = None
+        self.located = 0
+
+    def cost(self, latitude, longitude):
+        cost = self.load
+        if latitude is not None and self.latitude is not None:
+            cost += distance_km(latitude, longitude, self.latitude, self.longitude) / settings.ASSIGNMENT_KM_PER_LOAD
+        return cost
+
+    def take(self, priority, latitude, longitude):
+        self.load += settings.ASSIGNMENT_PRIORITY_WEIGHTS.get(priority, 1)
+        self.open_count += 1
+        if latitude is not None:
+            # Running mean, so the centroid follows the work being handed out
+            self.located += 1
+            if self.latitude is None:
+                self.latitude, self.longitude = latitude, longitude
+            else:
+                self.latitude += (latitude - self.latitude) / self.located
+                self.longitude += (longitude - self.longitude) / self.located
+
+    def give_back(self, priority, latitude, longitude):
+        """Undo take() for a complaint that turned out not to be assignable"""
+        self.load -= settings.ASSIGNMENT_PRIORITY_WEIGHTS.get(priority, 1)
+        self.open_count -= 1
+        if latitude is not None:
+            self.located -= 1
+            if not self.located:
+                self.latitude = self.longitude = None
+            else:
+                self.latitude -= (latitude - self.latitude) / self.located
+                self.longitude -= (longitude - self.longitude) / self.located
+
+
+class LoadIndex:
+    """Eligible staff per department with their open load and recent work location"""
+
+    def __init__(self, departments=None):
+        """departments: ids to restrict the index to, or None for all"""
+        from accounts.models import UserProfile
+
+        profiles = UserProfile.objects.filter(
+            is_department_user=True, user__is_active=True, department__isnull=False
+        ).select_related('user').only('department', 'user__id', 'user__username')
+        if departments:
+            profiles = profiles.filter(department__in=departments)
+
+        self.staff = {}
+        self.by_department = defaultdict(list)
+        for profile in profiles:
+            member = StaffLoad(profile.user.id, profile.user.username)
+            self.staff[member.user_id] = member
+            self.by_department[profile.department_id].append(member)
+        if not self.staff:
+            return
+
+        weights = settings.ASSIGNMENT_PRIORITY_WEIGHTS
+        open_counts = Complaint.objects.filter(
+            assigned_to__in=list(self.staff), status__in=Complaint.OPEN_STATUSES
+        ).order_by().values_list('assigned_to', 'priority').annotate(count=Count('id'))
+        for user_id, priority, count in open_counts:
+            member = self.staff[user_id]
+            member.load += weights.get(priority, 1) * count
+            member.open_count += count
+
+        since = timezone.now() - timedelta(days=settings.ASSIGNMENT_RECENT_DAYS)
+        centroids = Complaint.objects.filter(
+            assigned_to__in=list(self.staff), updated_at__gte=since, latitude__isnull=False, longitude__isnull=False
+        ).order_by().values_list('assigned_to').annotate(
+            latitude=Avg('latitude'), longitude=Avg('longitude'), count=Count('id'),
+        )
+        for user_id, latitude, longitude, count in centroids:
+            member = self.staff[user_id]
+            member.latitude, member.longitude, member.located = float(latitude), float(longitude), count
+
+    def choose(self, department, priority, latitude, longitude):
+        """Cheapest staff member for a complaint, or None if nobody can take it"""
+        best, best_cost = None, None
+        for member in self.by_department.get(department, ()):
+            if member.open_count >= settings.ASSIGNMENT_MAX_OPEN:
+                continue
+            cost = member.cost(latitude, longitude)
+            if best is None or cost < best_cost:
+                best, best_cost = member, cost
+        if best is not None:
+            best.take(priority, latitude, longitude)
+        return best
+
+
+def unassigned_complaints(departments=None, limit=None):
+    """(id, department id, priority, latitude, longitude) of pending unassigned complaints, most urgent first"""
+    queryset = Complaint.objects.filter(status='pending', assigned_to__isnull=True, department__isnull=False)
+    if departments:
+        queryset = queryset.filter(department__in=departments)
+    queryset = queryset.annotate(rank=priority_rank()).order_by('-rank', 'created_at').values_list(
+        'id', 'department', 'priority', 'latitude', 'longitude'
+    )
+    return queryset[:limit] if limit else queryset
+
+
+def assign_batch(index, rows, dry_run=False):
+    """Assign one batch of complaint rows; returns {user_id: [complaint ids]}"""
+    plan = defaultdict(list)
+    taken = {}
+    for complaint_id, department, priority, latitude, longitude in rows:
+        if latitude is not None and longitude is not None:
+            latitude, longitude = float(latitude), float(longitude)
+        else:
+            latitude = longitude = None
+        member = index.choose(department, priority, latitude, longitude)
+        if member is not None:
+            plan[member.user_id].append(complaint_id)
+            taken[complaint_id] = (priority, latitude, longitude)
+
+    if plan and not dry_run:
+        now = timezone.now()
+        with transaction.atomic():
+            for user_id, ids in plan.items():
+                # Leave alone anything a supervisor assigned or closed in the meantime
+                still_open = set(Complaint.objects.select_for_update().filter(
+                    pk__in=ids, status='pending', assigned_to__isnull=True
+                ).values_list('pk', flat=True))
+                Complaint.objects.filter(pk__in=still_open).update(assigned_to_id=user_id, updated_at=now)
+                # Only the rows written count towards the member's load
+                for complaint_id in ids:
+                    if complaint_id not in still_open:
+                        index.staff[user_id].give_back(*taken[complaint_id])
+                plan[user_id] = [complaint_id for complaint_id in ids if complaint_id in still_open]
+        # update() skips the post_save receivers
+        bump_version('complaints')
+    return {user_id: ids for user_id, ids in plan.items() if ids}
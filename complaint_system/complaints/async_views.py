@@ -0,0 +1,165 @@
+"""
+Async variants of the read-heavy ComplaintViewSet actions for ASGI serving.
+
+Authentication, permissions, throttling, content negotiation and queryset
+construction all reuse ComplaintViewSet; only the database round trips run on
+Django's async ORM, so a slow client or a slow query no longer holds a worker
+thread. Writes, the browsable API and anything else fall through to the sync
+viewset (Django runs it in a thread under ASGI).
+
+Enabled by ASYNC_READ_VIEWS, which config/asgi.py switches on.
+"""
+from asgiref.sync import sync_to_async
+from django.core.paginator import InvalidPage
+from django.http import Http404
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.response import Response
+
+from .cache import cached_response, response_cache_key, store_when_rendered
+from .departments import departments
+from .fast_serializers import ComplaintListRows
+from .models import Complaint
+from .serializers import ComplaintDetailSerializer
+from .views import ComplaintViewSet
+
+
+collection_view = ComplaintViewSet.as_view({'get': 'list', 'post': 'create'})
+detail_view = ComplaintViewSet.as_view({
+    'get': 'retrieve',
+    'put': 'update',
+    'patch': 'partial_update',
+    'delete': 'destroy',
+})
+nearby_view = ComplaintViewSet.as_view({'get': 'nearby'})
+statistics_view = ComplaintViewSet.as_view({'get': 'statistics'})
+
+
+async def run_action(request, action, handler, fallback, **kwargs):
+    """Dispatch like ComplaintViewSet would, with an async handler for the action body"""
+    if request.method != 'GET':
+        return await sync_to_async(fallback)(request, **kwargs)
+
+    view = ComplaintViewSet(action_map={'get': action}, basename='complaint', detail='pk' in kwargs)
+    view.args, view.kwargs = (), kwargs
+    view.format_kwarg = None
+    view.headers = view.default_response_headers
+    drf_request = view.initialize_request(request, **kwargs)
+    view.request = drf_request
+
+    # Choose between the fast path and the sync view before initial(): the
+    # sync view authenticates, checks permissions and throttles on its own,
+    # and doing it twice would take two throttle tokens
+    try:
+        drf_request.accepted_renderer, drf_request.accepted_media_type = view.perform_content_negotiation(drf_request)
+    except (APIException, Http404):
+        return await sync_to_async(fallback)(request, **kwargs)
+    if not view.use_fast_path():
+        return await sync_to_async(fallback)(request, **kwargs)
+
+    try:
+        await sync_to_async(view.initial)(drf_request, **kwargs)
+
+        namespaces = getattr(getattr(ComplaintViewSet, action), 'cache_namespaces', None)
+        key = None
+        if namespaces:
+            key = await sync_to_async(response_cache_key)(view, drf_request, namespaces, kwargs)
+        if key is not None:
+            response = await sync_to_async(cached_response)(key)
+            if response is not None:
+                return view.finalize_response(drf_request, response, **kwargs)
+
+        # Serializers read department names from the cached table; a miss
+        # would query, so load it here rather than on the event loop
+        await sync_to_async(departments)()
+        response = await handler(view, drf_request, **kwargs)
+        if key is not None:
+            response = store_when_rendered(response, key)
+    except Exception as exc:
+        response = await sync_to_async(view.handle_exception)(exc)
+    return view.finalize_response(drf_request, response, **kwargs)
+
+
+async def paginate(view, request, queryset):
+    """PageNumberPagination with the COUNT and page fetch on the async ORM"""
+    paginator = view.paginator
+    page_size = paginator.get_page_size(request)
+    if not page_size:
+        return None, [row async for row in queryset]
+
+    django_paginator = paginator.django_paginator_class(queryset, page_size)
+    django_paginator.count = await queryset.acount()
+    page_number = paginator.get_page_number(request, django_paginator)
+    try:
+        page = django_paginator.page(page_number)
+    except InvalidPage as exc:
+        raise NotFound(paginator.invalid_page_message.format(page_number=page_number, message=str(exc)))
+
+    paginator.page = page
+    paginator.request = request
+    return paginator, [row async for row in page.object_list]
+
+
+async def list_complaints(view, request):
+    rows = ComplaintListRows(view.get_sparse_fields())
+    queryset = await sync_to_async(lambda: rows.values(view.filter_queryset(view.get_queryset())))()
+    paginator, values = await paginate(view, request, queryset)
+    if paginator is None:
+        return Response(rows.build(values))
+    return paginator.get_paginated_response(rows.build(values))
+
+
+async def retrieve_complaint(view, request, pk):
+    queryset = await sync_to_async(lambda: view.filter_queryset(view.get_queryset()))()
+    try:
+        complaint = await queryset.aget(pk=pk)
+    except (Complaint.DoesNotExist, ValueError, TypeError):
+        # Same message as get_object_or_404 in the sync view
+        raise Http404('No Complaint matches the given query.')
+    view.check_object_permissions(request, complaint)
+    # Everything the serializer reads was prefetched by with_detail_relations
+    return Response(ComplaintDetailSerializer(complaint, context={'request': request}).data)
+
+
+async def nearby_complaints(view, request):
+    params = view.nearby_params(request)
+    if isinstance(params, Response):
+        return params
+    lat, lng, radius = params
+
+    rows = ComplaintListRows(view.get_sparse_fields())
+    values = Complaint.objects.filter(latitude__isnull=False, longitude__isnull=False).values_list(
+        'latitude', 'longitude', *rows.columns
+    )
+    values = [row async for row in values]
+    return Response(rows.build(view.within_radius(values, lat, lng, radius)))
+
+
+async def complaint_statistics(view, request):
+    queryset = await sync_to_async(view.get_queryset)()
+    status_query, category_query, department_query = view.statistics_queries(queryset)
+    status_counts = [row async for row in status_query]
+    category_counts = [row async for row in category_query]
+    department_counts = [row async for row in department_query]
+    return Response(view.statistics_payload(status_counts, category_counts, department_counts))
+
+
+async def complaint_collection(request):
+    return await run_action(request, 'list', list_complaints, collection_view)
+
+
+async def complaint_detail(request, pk):
+    return await run_action(request, 'retrieve', retrieve_complaint, detail_view, pk=pk)
+
+
+async def complaint_nearby(request):
+    return await run_action(request, 'nearby', nearby_complaints, nearby_view)
+
+
+async def complaint_statistics_view(request):
+    return await run_action(request, 'statistics', complaint_statistics, statistics_view)
+
+
+# Writes fall through to the DRF views, which do their own CSRF checks
+# (csrf_exempt() only wraps sync views before Django 5.0)
+complaint_collection.csrf_exempt = True
+complaint_detail.csrf_exempt = True
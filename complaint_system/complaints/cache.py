@@ -0,0 +1,180 @@
+"""
+Server-side response cache for the public, read-heavy endpoints.
+
+Entries are keyed by view, action, user scope and normalized query params, and
+embed the current version of every namespace the response depends on. Saving
+or deleting a Complaint, Category or StatusHistory bumps the matching
+namespace version (see the receivers in models.py), so stale entries are never
+looked up again and simply age out; freshness does not depend on the TTL.
+
+The entries can live in a per-process cache (RESPONSE_CACHE_ALIAS), but the
+versions live in CACHE_VERSION_ALIAS, which every worker on the host shares,
+so a write handled by one worker invalidates the entries of all of them.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+
+from monitoring import metrics
+
+
+VERSION_KEY = 'response-cache:version:{}'
+# Seconds a process trusts its copy of a VersionedTable before checking the version
+TABLE_VERSION_CHECK_INTERVAL = 2
+
+
+def get_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def get_version_cache():
+    return caches[settings.CACHE_VERSION_ALIAS]
+
+
+def get_versions(namespaces):
+    """Current version of each namespace, creating missing ones"""
+    cache = get_version_cache()
+    keys = [VERSION_KEY.format(namespace) for namespace in namespaces]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Seed from the clock so a version evicted from the cache never
+            # restarts at a value that old entries were stored under
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_version(namespace):
+    """Invalidate every cached response that depends on this namespace"""
+    # A new value from the clock rather than incr(): incr() is a read and a
+    # write, and two workers bumping at once could both write the same value
+    get_version_cache().set(VERSION_KEY.format(namespace), time.time_ns(), None)
+
+
+class VersionedTable:
+    """
+    A small, rarely edited table held in each process and reloaded when its
+    namespace version changes. The shared version is read at most once every
+    TABLE_VERSION_CHECK_INTERVAL seconds, so a change saved in another worker
+    shows up within that interval; get(recheck=True) reads it right away, for
+    callers about to reject a value the table doesn't know.
+    """
+
+    def __init__(self, namespace, load):
+        self.namespace = namespace
+        self.load = load
+        # (version, checked at, table), replaced as a whole so threads never see a mix
+        self._state = None
+
+    def get(self, recheck=False):
+        state = self._state
+        now = time.monotonic()
+        if state is not None and not recheck and now - state[1] < TABLE_VERSION_CHECK_INTERVAL:
+            return state[2]
+        # Read the version before the rows: a change in between reloads on the next check
+        [version] = get_versions([self.namespace])
+        table = state[2] if state is not None and state[0] == version else self.load()
+        self._state = (version, now, table)
+        return table
+
+    def forget(self):
+        """Reload the table in this process now and in every other one at its next check"""
+        self._state = None
+        bump_version(self.namespace)
+
+
+def user_scope(user):
+    """Visibility scope; users in the same scope see the same data"""
+    if not user.is_authenticated:
+        return 'public'
+    if user.is_staff:
+        return 'staff'
+    profile = getattr(user, 'profile', None)
+    if profile is not None and profile.is_department_user and profile.department_id:
+        return f'dept:{profile.department_id}'
+    return 'public'
+
+
+def normalized_query(request, ignore=()):
+    return sorted(
+        (name, value)
+        for name, values in request.query_params.lists() if name not in ignore
+        for value in values if value != ''
+    )
+
+
+def response_cache_key(view, request, namespaces, kwargs):
+    """Cache key for this request, or None if the response should not be cached"""
+    if request.method != 'GET' or not isinstance(request.accepted_renderer, JSONRenderer):
+        return None
+
+    query = normalized_query(request)
+    parts = [
+        request.get_host(),
+        request.accepted_media_type,
+        user_scope(request.user),
+        repr(sorted(kwargs.items())),
+        repr(query),
+        repr(get_versions(namespaces)),
+    ]
+    digest = hashlib.md5('|'.join(parts).encode()).hexdigest()
+    return f'response-cache:{view.basename}:{view.action}:{digest}'
+
+
+def data_cache_key(view, request, namespaces, ignore=()):
+    """Key prefix for data a view derives from the user scope and query params, minus ignored params"""
+    parts = [
+        user_scope(request.user),
+        repr(normalized_query(request, ignore)),
+        repr(get_versions(namespaces)),
+    ]
+    digest = hashlib.md5('|'.join(parts).encode()).hexdigest()
+    return f'data-cache:{view.basename}:{view.action}:{digest}'
+
+
+def cached_response(key):
+    """Stored response for this key as an HttpResponse, or None"""
+    cached = get_cache().get(key)
+    metrics.inc('cache_requests_total', {'cache': 'response', 'result': 'miss' if cached is None else 'hit'})
+    if cached is None:
+        return None
+    content, content_type = cached
+    response = HttpResponse(content, content_type=content_type)
+    response['X-Cache'] = 'HIT'
+    return response
+
+
+def store_when_rendered(response, key):
+    """Cache the response body once DRF has rendered it"""
+    if response.status_code != 200:
+        return response
+
+    def store(rendered):
+        get_cache().set(key, (rendered.content, rendered['Content-Type']), settings.RESPONSE_CACHE_TIMEOUT)
+    response.add_post_render_callback(store)
+    response['X-Cache'] = 'MISS'
+    return response
+
+
+def cache_response(*namespaces):
+    """Cache a viewset action's rendered JSON until one of the namespaces changes"""
+    def decorator(method):
+        method.cache_namespaces = namespaces
+
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            key = response_cache_key(self, request, namespaces, kwargs)
+            if key is None:
+                return method(self, request, *args, **kwargs)
+            response = cached_response(key)
+            if response is not None:
+                return response
+            return store_when_rendered(method(self, request, *args, **kwargs), key)
+        return wrapper
+    return decorator
@@ -0,0 +1,112 @@
+"""
+Grid aggregation of complaint locations for map views.
+
+The map is cut into square tiles in degree space, 360 / 2**zoom degrees wide,
+and each tile into CLUSTER_GRID_SIZE x CLUSTER_GRID_SIZE cells. Complaints are
+counted per cell, status and category in one grouped SQL query, so a response
+is bounded by the number of cells in view rather than the number of
+complaints. Tiles are the unit of caching: panning the map only queries the
+tiles that were not seen before.
+"""
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Count, FloatField, Sum
+from django.db.models.functions import Cast, Floor
+
+
+class ClusterParamError(ValueError):
+    pass
+
+
+def parse_params(query_params):
+    """(zoom, bbox) from ?zoom= and ?bbox=min_lng,min_lat,max_lng,max_lat"""
+    try:
+        zoom = int(query_params.get('zoom', ''))
+    except ValueError:
+        raise ClusterParamError('zoom must be an integer')
+    if not 0 <= zoom <= settings.CLUSTER_MAX_ZOOM:
+        raise ClusterParamError(f'zoom must be between 0 and {settings.CLUSTER_MAX_ZOOM}')
+
+    try:
+        min_lng, min_lat, max_lng, max_lat = (float(value) for value in query_params.get('bbox', '').split(','))
+    except ValueError:
+        raise ClusterParamError('bbox must be min_lng,min_lat,max_lng,max_lat')
+    if not all(map(math.isfinite, (min_lng, min_lat, max_lng, max_lat))):
+        raise ClusterParamError('bbox must be min_lng,min_lat,max_lng,max_lat')
+    if min_lng > max_lng or min_lat > max_lat:
+        raise ClusterParamError('bbox minimums must not exceed maximums')
+
+    bbox = (max(min_lng, -180.0), max(min_lat, -90.0), min(max_lng, 180.0), min(max_lat, 90.0))
+    return zoom, bbox
+
+
+def tile_size(zoom):
+    return 360 / 2 ** zoom
+
+
+def cell_size(zoom):
+    return tile_size(zoom) / settings.CLUSTER_GRID_SIZE
+
+
+def tiles_for(zoom, bbox):
+    """Tile coordinates covering the bbox, or an error if there are too many"""
+    size = tile_size(zoom)
+    min_lng, min_lat, max_lng, max_lat = bbox
+    columns = range(math.floor(min_lng / size), max(math.ceil(max_lng / size), math.floor(min_lng / size) + 1))
+    rows = range(math.floor(min_lat / size), max(math.ceil(max_lat / size), math.floor(min_lat / size) + 1))
+    if len(columns) * len(rows) > settings.CLUSTER_MAX_TILES:
+        raise ClusterParamError('bbox is too large for this zoom level; zoom in or use a smaller bbox')
+    return [(x, y) for y in rows for x in columns]
+
+
+def tiles_bbox(zoom, tiles):
+    size = tile_size(zoom)
+    xs = [x for x, _ in tiles]
+    ys = [y for _, y in tiles]
+    return [min(xs) * size, min(ys) * size, (max(xs) + 1) * size, (max(ys) + 1) * size]
+
+
+def aggregate(queryset, zoom, tiles):
+    """Cell clusters for each of the tiles, as {tile: [cluster, ...]}"""
+    cell = cell_size(zoom)
+    grid = settings.CLUSTER_GRID_SIZE
+    min_lng, min_lat, max_lng, max_lat = tiles_bbox(zoom, tiles)
+
+    rows = queryset.filter(
+        latitude__gte=min_lat, latitude__lt=max_lat,
+        longitude__gte=min_lng, longitude__lt=max_lng,
+    ).order_by().annotate(
+        cell_x=Floor(Cast('longitude', FloatField()) / cell),
+        cell_y=Floor(Cast('latitude', FloatField()) / cell),
+    ).values_list('cell_x', 'cell_y', 'status', 'category_id').annotate(
+        count=Count('id'), latitude_sum=Sum('latitude'), longitude_sum=Sum('longitude'),
+    )
+
+    cells = defaultdict(lambda: {
+        'count': 0, 'latitude': 0.0, 'longitude': 0.0,
+        'by_status': defaultdict(int), 'by_category': defaultdict(int),
+    })
+    for x, y, status, category_id, count, latitude_sum, longitude_sum in rows:
+        entry = cells[int(x), int(y)]
+        entry['count'] += count
+        entry['latitude'] += float(latitude_sum)
+        entry['longitude'] += float(longitude_sum)
+        entry['by_status'][status] += count
+        entry['by_category'][str(category_id)] += count
+
+    by_tile = {tile: [] for tile in tiles}
+    for (x, y), entry in sorted(cells.items()):
+        tile = (x // grid, y // grid)
+        if tile not in by_tile:
+            continue
+        by_tile[tile].append({
+            'latitude': round(entry['latitude'] / entry['count'], 6),
+            'longitude': round(entry['longitude'] / entry['count'], 6),
+            'count': entry['count'],
+            'bounds': [x * cell, y * cell, (x + 1) * cell, (y + 1) * cell],
+            'by_status': dict(entry['by_status']),
+            'by_category': dict(entry['by_category']),
+        })
+    return by_tile
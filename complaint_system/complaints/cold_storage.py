@@ -0,0 +1,315 @@
+"""
+Cold storage for complaints closed long ago.
+
+Complaints closed or rejected more than COLD_STORAGE_MONTHS ago are exported,
+together with their status history (live and archived) and feedback, to
+gzip-compressed JSON Lines segment files under COLD_STORAGE_DIR, and then
+deleted from the hot tables. One segment is written per batch. Records are
+compressed in blocks of BLOCK_RECORDS lines, each block its own gzip member,
+so a segment is still an ordinary .jsonl.gz file while a single record can be
+read back by decompressing just its block.
+
+ColdComplaint keeps a small lookup row per exported complaint: reference
+number, segment and block position. Looking a complaint up by reference
+number falls back to that index and rehydrates the record into unsaved model
+instances, which serialize like live ones; restore() puts it back in the hot
+tables for good.
+"""
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .archive import ARCHIVE_STATUSES, HISTORY_COLUMNS, delete_rows
+from .cache import bump_version
+from .departments import department_id, department_name
+from .models import ArchivedStatusHistory, ColdComplaint, Complaint, DuplicateKey, Feedback, StatusHistory
+
+
+BLOCK_RECORDS = 100
+COMPLAINT_COLUMNS = [field.attname for field in Complaint._meta.concrete_fields]
+FEEDBACK_COLUMNS = [field.attname for field in Feedback._meta.concrete_fields]
+
+
+class ColdStorageError(Exception):
+    pass
+
+
+class RecordEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder without the millisecond rounding, so restored timestamps are exact"""
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def cold_cutoff(months=None):
+    months = settings.COLD_STORAGE_MONTHS if months is None else months
+    return timezone.now() - timedelta(days=30 * months)
+
+
+def exportable_complaints(cutoff):
+    """Complaints closed before the cutoff, minus any a live complaint is still linked to as a duplicate"""
+    eligible = Q(status__in=ARCHIVE_STATUSES, updated_at__lt=cutoff)
+    live_duplicates = Complaint.objects.filter(parent=OuterRef('pk')).exclude(eligible)
+    return Complaint.objects.filter(eligible).filter(~Exists(live_duplicates)).order_by('pk')
+
+
+def whole_groups(ids, cutoff):
+    """
+    The complaints to move with a batch: ids plus every complaint linked to
+    them as a duplicate, directly or through another duplicate, so a parent
+    never leaves the hot table while a row still points at it. A complaint
+    with a live (not yet eligible) complaint anywhere below it stays behind.
+    """
+    parents = dict(Complaint.objects.filter(pk__in=ids).values_list('pk', 'parent_id'))
+    live = set()
+    frontier = list(parents)
+    while frontier:
+        linked = Complaint.objects.filter(parent_id__in=frontier).exclude(pk__in=list(parents)).values_list(
+            'pk', 'parent_id', 'status', 'updated_at'
+        )
+        frontier = []
+        for pk, parent_id, status, updated_at in linked:
+            parents[pk] = parent_id
+            frontier.append(pk)
+            if status not in ARCHIVE_STATUSES or updated_at >= cutoff:
+                live.add(pk)
+
+    staying = set()
+    for pk in live:
+        while pk is not None and pk not in staying:
+            staying.add(pk)
+            pk = parents.get(pk)
+    return sorted(set(parents) - staying)
+
+
+def segment_path(segment):
+    return os.path.join(settings.COLD_STORAGE_DIR, segment)
+
+
+def build_records(ids):
+    """Export records for these complaint ids, in id order"""
+    complaints = Complaint.objects.filter(pk__in=ids).order_by('pk').values(*COMPLAINT_COLUMNS)
+    history = {complaint_id: [] for complaint_id in ids}
+    for model in (StatusHistory, ArchivedStatusHistory):
+        for row in model.objects.filter(complaint_id__in=ids).order_by('-created_at').values(*HISTORY_COLUMNS):
+            history[row['complaint_id']].append(row)
+    feedback = {row['complaint_id']: row for row in Feedback.objects.filter(complaint_id__in=ids).values(*FEEDBACK_COLUMNS)}
+
+    return [
+        {
+            'complaint': complaint,
+            'status_history': sorted(history[complaint['id']], key=lambda row: row['created_at'], reverse=True),
+            'feedback': feedback.get(complaint['id']),
+        }
+        for complaint in complaints
+    ]
+
+
+def write_segment(segment, records):
+    """Write records as gzip blocks; returns (reference_number, offset, length) per record"""
+    os.makedirs(settings.COLD_STORAGE_DIR, exist_ok=True)
+    positions = []
+    temporary = segment_path(segment) + '.tmp'
+    with open(temporary, 'wb') as segment_file:
+        for start in range(0, len(records), BLOCK_RECORDS):
+            block = records[start:start + BLOCK_RECORDS]
+            lines = ''.join(json.dumps(record, cls=RecordEncoder) + '\n' for record in block)
+            data = gzip.compress(lines.encode(), compresslevel=9)
+            offset = segment_file.tell()
+            segment_file.write(data)
+            positions.extend((record['complaint']['reference_number'], offset, len(data)) for record in block)
+        segment_file.flush()
+        os.fsync(segment_file.fileno())
+    os.replace(temporary, segment_path(segment))
+    return positions
+
+
+def delete_hot_rows(ids, cutoff):
+    """Delete the complaints and everything hanging off them; returns the number of complaints deleted"""
+    for model in (DuplicateKey, StatusHistory, ArchivedStatusHistory, Feedback):
+        delete_rows(model, ids, 'complaint')
+    # Locks the rows where the backend can, so none is reopened before the DELETE
+    still_closed = list(
+        Complaint.objects.select_for_update()
+        .filter(pk__in=ids, status__in=ARCHIVE_STATUSES, updated_at__lt=cutoff)
+        .values_list('pk', flat=True)
+    )
+    return delete_rows(Complaint, still_closed)
+
+
+def export_batch(cutoff, after=0, batch_size=None):
+    """
+    Move the exportable complaints among the next batch_size ids above `after`,
+    with their duplicates, to a new segment. Returns (moved ids, last id scanned);
+    the last id is `after` when nothing is left to scan.
+    """
+    batch_size = batch_size or settings.COLD_STORAGE_BATCH_SIZE
+    scanned = list(exportable_complaints(cutoff).filter(pk__gt=after).values_list('pk', flat=True)[:batch_size])
+    if not scanned:
+        return [], after
+    ids = whole_groups(scanned, cutoff)
+    if not ids:
+        return [], scanned[-1]
+
+    segment = f'complaints-{timezone.now():%Y%m%d%H%M%S}-{ids[0]}-{ids[-1]}.jsonl.gz'
+    try:
+        with transaction.atomic():
+            records = build_records(ids)
+            positions = write_segment(segment, records)
+            by_reference = {record['complaint']['reference_number']: record['complaint'] for record in records}
+            ColdComplaint.objects.bulk_create([
+                ColdComplaint(
+                    reference_number=reference_number,
+                    complaint_id=by_reference[reference_number]['id'],
+                    status=by_reference[reference_number]['status'],
+                    department_id=by_reference[reference_number]['department_id'],
+                    segment=segment,
+                    offset=offset,
+                    length=length,
+                )
+                for reference_number, offset, length in positions
+            ])
+            if delete_hot_rows(ids, cutoff) != len(ids):
+                # Something was reopened while the batch was being written
+                raise ColdStorageError('complaints changed during export; batch rolled back')
+    except BaseException:
+        for path in (segment_path(segment), segment_path(segment) + '.tmp'):
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+    return ids, scanned[-1]
+
+
+def export_complaints(months=None, batch_size=None, limit=None):
+    """
+    Export everything eligible, one segment per batch; returns the number of
+    complaints moved. A batch may exceed batch_size (and the run `limit`) by
+    the duplicates of the complaints in it.
+    """
+    batch_size = batch_size or settings.COLD_STORAGE_BATCH_SIZE
+    cutoff = cold_cutoff(months)
+    moved, last_id = 0, 0
+    while limit is None or moved < limit:
+        size = batch_size if limit is None else min(batch_size, limit - moved)
+        ids, scanned_to = export_batch(cutoff, last_id, size)
+        if scanned_to == last_id:
+            break
+        moved += len(ids)
+        last_id = scanned_to
+    if moved:
+        # The plain DELETEs skipped the post_delete receivers
+        bump_version('complaints')
+        bump_version('categories')
+    return moved
+
+
+def read_record(entry):
+    """The exported record behind a ColdComplaint entry"""
+    with open(segment_path(entry.segment), 'rb') as segment_file:
+        segment_file.seek(entry.offset)
+        block = gzip.decompress(segment_file.read(entry.length))
+    for line in block.splitlines():
+        record = json.loads(line)
+        if record['complaint']['reference_number'] == entry.reference_number:
+            return upgrade_record(record)
+    raise ColdStorageError(f'{entry.reference_number} is missing from {entry.segment}')
+
+
+def upgrade_record(record):
+    """Segments written before departments were normalized carry the department name"""
+    complaint = record['complaint']
+    if 'department' in complaint:
+        complaint['department_id'] = department_id(complaint.pop('department'))
+    return record
+
+
+def instance(model, row):
+    """Unsaved model instance from an exported row, with values converted back from JSON"""
+    return model(**{name: model._meta.get_field(name).to_python(value) for name, value in row.items()})
+
+
+def rehydrate(record):
+    """
+    Complaint instance for an exported record, shaped like the ones
+    ComplaintViewSet.with_detail_relations loads, without touching the hot tables
+    """
+    complaint = instance(Complaint, record['complaint'])
+    history = [instance(StatusHistory, row) for row in record['status_history']]
+    users = User.objects.in_bulk({row.changed_by_id for row in history if row.changed_by_id})
+    for row in history:
+        row.changed_by = users.get(row.changed_by_id)
+    complaint.recent_status_history = history
+
+    feedback = instance(Feedback, record['feedback']) if record['feedback'] else None
+    if feedback is not None:
+        complaint.feedback = feedback
+    else:
+        Complaint.feedback.related.set_cached_value(complaint, None)
+    return complaint
+
+
+def lookup(reference_number):
+    """Rehydrated complaint for a reference number in cold storage, or None"""
+    entry = ColdComplaint.objects.filter(reference_number=reference_number).first()
+    if entry is None:
+        return None
+    return rehydrate(read_record(entry))
+
+
+def create_with_timestamps(model, rows):
+    """
+    bulk_create exported rows, then write back the auto_now/auto_now_add
+    timestamps that bulk_create replaced with the current time
+    """
+    objects = [instance(model, row) for row in rows]
+    stamped = [
+        field.attname for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    stored = [[getattr(obj, name) for name in stamped] for obj in objects]
+    # Plain INSERTs skip the save() side effects (reference number, deadlines, events)
+    model.objects.bulk_create(objects)
+    for obj, values in zip(objects, stored):
+        for name, value in zip(stamped, values):
+            setattr(obj, name, value)
+    if objects and stamped:
+        model.objects.bulk_update(objects, stamped)
+    return objects
+
+
+def restore(reference_number):
+    """
+    Move a complaint from cold storage back into the hot tables; returns it,
+    or None if not found. A complaint linked to a parent that is itself in
+    cold storage brings the parent back first.
+    """
+    entry = ColdComplaint.objects.filter(reference_number=reference_number).first()
+    if entry is None:
+        return None
+    record = read_record(entry)
+    with transaction.atomic():
+        parent_id = record['complaint']['parent_id']
+        if parent_id is not None and not Complaint.objects.filter(pk=parent_id).exists():
+            parent = ColdComplaint.objects.filter(complaint_id=parent_id).first()
+            if parent is not None:
+                restore(parent.reference_number)
+            else:
+                record['complaint']['parent_id'] = None
+        [complaint] = create_with_timestamps(Complaint, [record['complaint']])
+        create_with_timestamps(StatusHistory, record['status_history'])
+        if record['feedback']:
+            create_with_timestamps(Feedback, [record['feedback']])
+        entry.delete()
+    bump_version('complaints')
+    bump_version('categories')
+    return complaint
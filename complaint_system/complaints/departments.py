@@ -0,0 +1,64 @@
+"""
+Cached department lookups.
+
+Departments are a short, rarely edited table that nearly every request reads:
+serializers turn department ids into names, filters and registration turn
+names back into ids, and department staff are scoped by id. Each process holds
+the whole table as one {id: name} dict (a VersionedTable), reloaded when a
+department is saved or deleted in any worker (see the receivers in
+models.py), so none of that costs a query or a join. A name or id the table
+doesn't know makes it check for a change at once before giving up.
+"""
+from .cache import VersionedTable
+from .models import Department
+
+
+_departments = VersionedTable('departments', lambda: dict(Department.objects.values_list('id', 'name')))
+
+
+def departments(recheck=False):
+    """{id: name} of every department"""
+    return _departments.get(recheck)
+
+
+def forget_departments():
+    _departments.forget()
+
+
+def department_name(department_id):
+    """Name of a department id; '' for None or an unknown id"""
+    if department_id is None:
+        return ''
+    name = departments().get(department_id)
+    if name is None:
+        name = departments(recheck=True).get(department_id, '')
+    return name
+
+
+def by_name(recheck=False):
+    return {name: pk for pk, name in departments(recheck).items()}
+
+
+def department_id(name):
+    """Id of the department with this name, or None"""
+    if not name:
+        return None
+    pk = by_name().get(name)
+    if pk is None:
+        pk = by_name(recheck=True).get(name)
+    return pk
+
+
+def department_ids(names):
+    """Ids of the named departments, skipping unknown names"""
+    ids = by_name()
+    if any(name not in ids for name in names):
+        ids = by_name(recheck=True)
+    return [ids[name] for name in names if name in ids]
+
+
+def department_instance(department_id):
+    """Department for an id, built from the cache without a query"""
+    if department_id is None:
+        return None
+    return Department(pk=department_id, name=department_name(department_id))
@@ -0,0 +1,149 @@
+"""
+Near-duplicate detection for newly submitted complaints.
+
+Title and description are reduced to a MinHash signature, which is cut into
+bands. Each complaint stores one DuplicateKey per band, salted with the grid
+cell its location falls in (or its category when it has no location). A new
+complaint looks up its own band keys over the surrounding cells in a single
+indexed query, so only complaints that share a band nearby are ever compared,
+however large the table gets. Candidates are then checked properly: estimated
+text similarity, distance and the time window.
+"""
+import hashlib
+import math
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+
+SIGNATURE_SIZE = 16
+BAND_ROWS = 2
+MERSENNE_PRIME = (1 << 61) - 1
+# Fixed (a, b) pairs for the hash permutations; changing them invalidates stored signatures
+PERMUTATIONS = [
+    (
+        int.from_bytes(hashlib.blake2b(f'a{i}'.encode(), digest_size=8).digest(), 'big') % MERSENNE_PRIME or 1,
+        int.from_bytes(hashlib.blake2b(f'b{i}'.encode(), digest_size=8).digest(), 'big') % MERSENNE_PRIME,
+    )
+    for i in range(SIGNATURE_SIZE)
+]
+STOP_WORDS = {
+    'a', 'an', 'and', 'are', 'at', 'be', 'been', 'by', 'for', 'from', 'has', 'have', 'in', 'is', 'it',
+    'its', 'near', 'no', 'not', 'of', 'on', 'or', 'our', 'please', 'since', 'the', 'there', 'this',
+    'to', 'was', 'we', 'with',
+}
+WORD_RE = re.compile(r'\w+')
+EARTH_RADIUS_METERS = 6371000
+METERS_PER_DEGREE = 111320
+
+
+def features(title, description):
+    """Words and word pairs of the complaint text, without stop words"""
+    words = [word for word in WORD_RE.findall(f'{title} {description}'.lower()) if word not in STOP_WORDS]
+    return set(words) | {f'{first} {second}' for first, second in zip(words, words[1:])}
+
+
+def signature(title, description):
+    """MinHash signature of the complaint text, or None when there is nothing to compare"""
+    hashes = [
+        int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), 'big')
+        for feature in features(title, description)
+    ]
+    if not hashes:
+        return None
+    return [min((a * value + b) % MERSENNE_PRIME for value in hashes) for a, b in PERMUTATIONS]
+
+
+def similarity(first, second):
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(1 for x, y in zip(first, second) if x == y) / SIGNATURE_SIZE
+
+
+def bands(sig):
+    for start in range(0, SIGNATURE_SIZE, BAND_ROWS):
+        digest = hashlib.blake2b(repr(sig[start:start + BAND_ROWS]).encode(), digest_size=6).hexdigest()
+        yield f'{start // BAND_ROWS}:{digest}'
+
+
+def cell_size():
+    """Grid cell size in degrees of latitude; one cell spans the match radius"""
+    return settings.DUPLICATE_RADIUS_METERS / METERS_PER_DEGREE
+
+
+def cell(latitude, longitude):
+    size = cell_size()
+    return math.floor(float(latitude) / size), math.floor(float(longitude) / size)
+
+
+def locations(latitude, longitude, category_id, nearby=False):
+    """Location part of the band keys: the complaint's cell, plus its neighbours when looking up"""
+    if latitude is None or longitude is None:
+        return [f'c{category_id}']
+    row, column = cell(latitude, longitude)
+    if not nearby:
+        return [f'{row},{column}']
+    # Cells are square in degrees, so they get narrower in meters away from the equator
+    span = math.ceil(1 / max(math.cos(math.radians(float(latitude))), 0.01))
+    return [
+        f'{row + dy},{column + dx}'
+        for dy in (-1, 0, 1)
+        for dx in range(-span, span + 1)
+    ]
+
+
+def band_keys(sig, latitude, longitude, category_id, nearby=False):
+    places = locations(latitude, longitude, category_id, nearby)
+    return [f'{band}:{place}' for band in bands(sig) for place in places]
+
+
+def distance(lat1, lng1, lat2, lng2):
+    """Great-circle distance in meters"""
+    lat1, lng1, lat2, lng2 = map(math.radians, map(float, (lat1, lng1, lat2, lng2)))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * math.asin(math.sqrt(a))
+
+
+def find_duplicate(sig, latitude, longitude, category_id):
+    """Open complaint this one most likely repeats, as a values() dict, or None"""
+    from .models import Complaint, DuplicateKey
+
+    if sig is None:
+        return None
+    since = timezone.now() - timedelta(hours=settings.DUPLICATE_WINDOW_HOURS)
+    keys = band_keys(sig, latitude, longitude, category_id, nearby=True)
+    candidate_ids = DuplicateKey.objects.filter(key__in=keys, created_at__gte=since).values('complaint_id')
+    candidates = Complaint.objects.filter(
+        pk__in=candidate_ids, status__in=Complaint.OPEN_STATUSES
+    ).values('id', 'parent_id', 'reference_number', 'text_signature', 'latitude', 'longitude')
+
+    best, best_score = None, settings.DUPLICATE_SIMILARITY
+    for candidate in candidates:
+        if not candidate['text_signature']:
+            continue
+        score = similarity(sig, candidate['text_signature'])
+        if score < best_score:
+            continue
+        if latitude is not None and longitude is not None:
+            if distance(latitude, longitude, candidate['latitude'], candidate['longitude']) > settings.DUPLICATE_RADIUS_METERS:
+                continue
+        best, best_score = candidate, score
+    return best
+
+
+def index_complaint(complaint):
+    """Store the band keys later submissions are matched against"""
+    from .models import DuplicateKey
+
+    if not complaint.text_signature:
+        return
+    keys = band_keys(complaint.text_signature, complaint.latitude, complaint.longitude, complaint.category_id)
+    DuplicateKey.objects.bulk_create([
+        DuplicateKey(key=key, complaint=complaint, created_at=complaint.created_at) for key in keys
+    ])
+
+    # Keys older than the window are never looked up; trim them now and then
+    if complaint.pk % 100 == 0:
+        since = timezone.now() - timedelta(hours=settings.DUPLICATE_WINDOW_HOURS)
+        DuplicateKey.objects.filter(created_at__lt=since).delete()
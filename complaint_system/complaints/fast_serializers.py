@@ -0,0 +1,111 @@
+"""
+Read-only fast path for ComplaintListSerializer.
+
+Rows are built straight from values_list() tuples instead of model instances,
+using per-field mappers worked out once from the serializer's own fields.
+Each row is a slotted dataclass that ORJSONRenderer serializes natively, and
+the rendered bytes match what ComplaintListSerializer + JSONRenderer produce.
+"""
+import decimal
+from dataclasses import make_dataclass
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+from .serializers import ComplaintListSerializer
+
+
+# Fields whose to_representation returns the database value unchanged
+PASSTHROUGH_FIELDS = (
+    serializers.CharField,
+    serializers.ChoiceField,
+    serializers.IntegerField,
+    serializers.BooleanField,
+)
+
+
+@lru_cache(maxsize=32)
+def row_class(fields):
+    """Slotted dataclass for one fieldset; orjson keeps the field order"""
+    return make_dataclass('ComplaintRow', list(fields), slots=True)
+
+
+def decimal_mapper(field):
+    exponent = -field.decimal_places if field.decimal_places is not None else None
+    plain = (
+        getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+        and not field.localize
+        and not field.normalize_output
+    )
+    if exponent is None or not plain:
+        return field.to_representation
+
+    def to_string(value):
+        # Database decimals already carry the column's scale
+        if isinstance(value, decimal.Decimal) and value.as_tuple().exponent == exponent:
+            return f'{value:f}'
+        return field.to_representation(value)
+    return to_string
+
+
+def datetime_mapper(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if not settings.USE_TZ or output_format is None or output_format.lower() != ISO_8601:
+        return field.to_representation
+    field_timezone = getattr(field, 'timezone', None) or timezone.get_current_timezone()
+
+    def to_iso(value):
+        if not timezone.is_aware(value):
+            return field.to_representation(value)
+        value = value.astimezone(field_timezone).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return to_iso
+
+
+def field_mapper(field):
+    """Function turning a raw column value into the field's representation, or None if unchanged"""
+    if isinstance(field, serializers.DecimalField):
+        return decimal_mapper(field)
+    if isinstance(field, serializers.DateTimeField):
+        return datetime_mapper(field)
+    if isinstance(field, PASSTHROUGH_FIELDS):
+        return None
+    return field.to_representation
+
+
+class ComplaintListRows:
+    """Builds ComplaintListSerializer-equivalent rows from a complaint queryset"""
+
+    def __init__(self, fields=None):
+        serializer = ComplaintListSerializer(fields=fields)
+        self.fields = tuple(serializer.fields)
+        self.columns = ComplaintListSerializer.model_columns(self.fields)
+        self.row_class = row_class(self.fields)
+        self.mappers = []
+        for index, field in enumerate(serializer.fields.values()):
+            mapper = field_mapper(field)
+            if mapper is not None:
+                self.mappers.append((index, mapper))
+
+    def values(self, queryset):
+        """Tuple queryset with exactly the columns this fieldset reads"""
+        return queryset.values_list(*self.columns)
+
+    def build(self, tuples):
+        row_class = self.row_class
+        mappers = self.mappers
+        rows = []
+        for values in tuples:
+            if mappers:
+                values = list(values)
+                for index, mapper in mappers:
+                    value = values[index]
+                    if value is not None:
+                        values[index] = mapper(value)
+            rows.append(row_class(*values))
+        return rows
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from complaints.archive import archivable_history, archive_cutoff, archive_history
+
+
+class Command(BaseCommand):
+    help = 'Move status history of complaints closed long ago into the archive table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=None, help='Closed for at least this long (default: HISTORY_ARCHIVE_MONTHS)')
+        parser.add_argument('--batch-size', type=int, default=None, help='Rows per transaction (default: HISTORY_ARCHIVE_BATCH_SIZE)')
+        parser.add_argument('--limit', type=int, default=None, help='Move at most this many rows per run')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the rows that would move')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            count = archivable_history(archive_cutoff(options['months'])).count()
+            self.stdout.write(f'{count} status history rows would be archived')
+            return
+
+        start = time.perf_counter()
+        moved = archive_history(options['months'], options['batch_size'], options['limit'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {moved} status history rows in {time.perf_counter() - start:.2f} s'
+        ))
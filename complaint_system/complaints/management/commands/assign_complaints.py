@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from complaints.assignment import LoadIndex, assign_batch, unassigned_complaints
+from complaints.departments import department_ids, department_name
+
+
+class Command(BaseCommand):
+    help = 'Assign pending unassigned complaints to department staff, balancing load and proximity'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--department', action='append', dest='departments', help='Only this department (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--limit', type=int, default=None, help='Assign at most this many complaints per run')
+        parser.add_argument('--dry-run', action='store_true', help='Plan assignments without saving them')
+        parser.add_argument('--loop', action='store_true', help='Keep running, once every --interval seconds')
+        parser.add_argument('--interval', type=int, default=60)
+
+    def handle(self, *args, **options):
+        while True:
+            self.run_once(options)
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def run_once(self, options):
+        start = time.perf_counter()
+        departments = department_ids(options['departments']) if options['departments'] else None
+        if options['departments'] and not departments:
+            self.stdout.write(self.style.WARNING('No such department'))
+            return
+        index = LoadIndex(departments)
+        if not index.staff:
+            self.stdout.write(self.style.WARNING('No active department users to assign to'))
+            return
+
+        # Only departments somebody can take work for
+        rows = list(unassigned_complaints(list(index.by_department), options['limit']))
+        assigned = {}
+        batch_size = options['batch_size']
+        for offset in range(0, len(rows), batch_size):
+            plan = assign_batch(index, rows[offset:offset + batch_size], dry_run=options['dry_run'])
+            for user_id, ids in plan.items():
+                assigned[user_id] = assigned.get(user_id, 0) + len(ids)
+
+        elapsed = time.perf_counter() - start
+        total = sum(assigned.values())
+        verb = 'Would assign' if options['dry_run'] else 'Assigned'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {total} of {len(rows)} complaints to {len(assigned)} staff in {elapsed:.2f} s'
+        ))
+        for department, members in sorted(index.by_department.items(), key=lambda item: department_name(item[0])):
+            summary = ', '.join(
+                f'{member.username} +{assigned.get(member.user_id, 0)} (open {member.open_count})'
+                for member in members
+            )
+            self.stdout.write(f'  {department_name(department)}: {summary}')
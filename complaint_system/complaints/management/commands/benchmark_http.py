@@ -0,0 +1,128 @@
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Load a running server with concurrent keep-alive clients (plus idle slow ones) and report latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+', help='Absolute URLs, requested round robin')
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument(
+            '--idle-connections', type=int, default=0,
+            help='Slow clients that send half a request and then stall, holding a connection each',
+        )
+
+    def handle(self, *args, **options):
+        targets = []
+        for url in options['urls']:
+            parts = urlsplit(url)
+            if parts.scheme != 'http' or not parts.hostname:
+                raise CommandError(f'Only plain http:// URLs are supported: {url}')
+            path = parts.path or '/'
+            if parts.query:
+                path += '?' + parts.query
+            targets.append((parts.hostname, parts.port or 80, path))
+
+        latencies, errors, elapsed = asyncio.run(self.run(targets, options))
+        if not latencies:
+            raise CommandError(f'No successful requests ({errors} errors)')
+
+        latencies.sort()
+        self.stdout.write(
+            f'{len(latencies)} ok, {errors} errors in {elapsed:.2f} s  '
+            f'{len(latencies) / elapsed:8.1f} req/s  '
+            f'p50 {self._percentile(latencies, 50):7.1f} ms  '
+            f'p95 {self._percentile(latencies, 95):7.1f} ms  '
+            f'p99 {self._percentile(latencies, 99):7.1f} ms  '
+            f'mean {statistics.fmean(latencies):7.1f} ms'
+        )
+
+    async def run(self, targets, options):
+        host, port, _ = targets[0]
+        idle = [asyncio.create_task(self.stall(host, port)) for _ in range(options['idle_connections'])]
+        await asyncio.sleep(0.2 if idle else 0)
+
+        remaining = iter(range(options['requests']))
+        latencies = []
+        errors = 0
+
+        async def client():
+            nonlocal errors
+            connection = None
+            for index in remaining:
+                host, port, path = targets[index % len(targets)]
+                start = time.perf_counter()
+                try:
+                    if connection is None:
+                        connection = await asyncio.open_connection(host, port)
+                    status, keep_alive = await self.request(*connection, host, path)
+                except (OSError, asyncio.IncompleteReadError, ValueError):
+                    errors += 1
+                    connection = None
+                    continue
+                if status == 200:
+                    latencies.append((time.perf_counter() - start) * 1000)
+                else:
+                    errors += 1
+                if not keep_alive:
+                    connection[1].close()
+                    connection = None
+            if connection is not None:
+                connection[1].close()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(options['concurrency'])))
+        elapsed = time.perf_counter() - start
+
+        for task in idle:
+            task.cancel()
+        await asyncio.gather(*idle, return_exceptions=True)
+        return latencies, errors, elapsed
+
+    async def request(self, reader, writer, host, path):
+        writer.write(
+            f'GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: application/json\r\n'
+            f'Connection: keep-alive\r\n\r\n'.encode()
+        )
+        await writer.drain()
+
+        head = await reader.readuntil(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        status = int(lines[0].split()[1])
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+                await reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        elif 'content-length' in headers:
+            await reader.readexactly(int(headers['content-length']))
+        else:
+            await reader.read()
+            return status, False
+        return status, headers.get('connection', '').lower() != 'close'
+
+    async def stall(self, host, port):
+        """A client on a bad link: connects, sends part of the request line, then waits"""
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            writer.write(b'GET /api/complaints/ HTTP/1.1\r\nHost: ')
+            await writer.drain()
+            await asyncio.sleep(3600)
+        except OSError:
+            pass
+
+    def _percentile(self, values, percent):
+        index = min(len(values) - 1, round(percent / 100 * (len(values) - 1)))
+        return values[index]
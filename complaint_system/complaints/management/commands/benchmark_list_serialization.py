@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from complaints.fast_serializers import ComplaintListRows
+from complaints.models import Complaint
+from complaints.renderers import ORJSONRenderer, orjson
+from complaints.serializers import ComplaintListSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compare ComplaintListSerializer with the values()-based fast path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000])
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--fields', default=None, help='Fieldset or preset, as in ?fields=')
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            raise CommandError('orjson is not installed')
+
+        fields = ComplaintListSerializer.resolve_fields(options['fields']) if options['fields'] else None
+        queryset = Complaint.objects.select_related('category').order_by('-created_at')
+
+        for count in options['rows']:
+            page = queryset[:count]
+
+            def serializer_path():
+                data = ComplaintListSerializer(list(page.all()), many=True, fields=fields).data
+                return JSONRenderer().render(data)
+
+            def fast_path():
+                rows = ComplaintListRows(fields)
+                return ORJSONRenderer().render(rows.build(rows.values(page.all())))
+
+            slow_body, slow_ms = self._time(serializer_path, options['repeat'])
+            fast_body, fast_ms = self._time(fast_path, options['repeat'])
+            if slow_body != fast_body:
+                raise CommandError(f'Fast path output differs from ComplaintListSerializer at {count} rows')
+
+            rows = max(slow_body.count(b'"id":'), 1)
+            self.stdout.write(
+                f'{rows:>7} rows  serializer {slow_ms:8.1f} ms ({slow_ms * 1000 / rows:6.1f} us/row)  '
+                f'fast path {fast_ms:8.1f} ms ({fast_ms * 1000 / rows:6.1f} us/row)  '
+                f'{slow_ms / fast_ms:4.1f}x, {len(fast_body)} bytes identical'
+            )
+
+    def _time(self, func, repeat):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            body = func()
+            elapsed = (time.perf_counter() - start) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return body, best
@@ -0,0 +1,103 @@
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Start gunicorn bare (as the old Procfile did) and with config/gunicorn_conf.py, '
+        'and report how long after launch each serves fast responses'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*',
+            default=['/api/categories/', '/api/complaints/?page=1', '/api/complaints/?page=2&ordering=priority'],
+        )
+        parser.add_argument('--port', type=int, default=8799)
+        parser.add_argument('--workers', type=int, default=1, help='More than one spreads requests over fresh workers')
+        parser.add_argument('--rounds', type=int, default=20, help='Requests per path after the first')
+        parser.add_argument(
+            '--fast-factor', type=float, default=2.0,
+            help='A response is fast once it takes at most this many times the steady-state median',
+        )
+
+    def handle(self, *args, **options):
+        profiles = {
+            'bare': [sys.executable, '-m', 'gunicorn', 'config.wsgi'],
+            'profile': [sys.executable, '-m', 'gunicorn', 'config.wsgi', '-c', 'config/gunicorn_conf.py'],
+        }
+        for name, command in profiles.items():
+            result = self.measure(command, options)
+            self.report(name, result, options)
+
+    def measure(self, command, options):
+        env = {
+            **os.environ,
+            'PORT': str(options['port']),
+            # One thread per worker, so requests wait for a fresh worker like the bare sync ones
+            'WEB_CONCURRENCY': str(options['workers']),
+            'GUNICORN_THREADS': '1',
+        }
+        command = command + ['--bind', f"127.0.0.1:{options['port']}", '--workers', str(options['workers'])]
+        start = time.perf_counter()
+        server = subprocess.Popen(
+            command, cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            self.wait_for_port(options['port'], server)
+            listening = time.perf_counter() - start
+            timeline = []
+            for round_number in range(options['rounds'] + 1):
+                for path in options['paths']:
+                    latency = self.get(options['port'], path)
+                    timeline.append((path, time.perf_counter() - start, latency))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+        return listening, timeline
+
+    def wait_for_port(self, port, server, deadline=60):
+        limit = time.perf_counter() + deadline
+        while time.perf_counter() < limit:
+            if server.poll() is not None:
+                raise CommandError(f'gunicorn exited with status {server.returncode}')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+                return
+            except OSError:
+                time.sleep(0.01)
+        raise CommandError(f'gunicorn did not listen on port {port} within {deadline}s')
+
+    def get(self, port, path):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        request_start = time.perf_counter()
+        connection.request('GET', path, headers={'Host': 'localhost', 'Accept': 'application/json'})
+        response = connection.getresponse()
+        response.read()
+        connection.close()
+        if response.status != 200:
+            raise CommandError(f'{path} answered {response.status}')
+        return time.perf_counter() - request_start
+
+    def report(self, name, result, options):
+        listening, timeline = result
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{name}: listening after {listening * 1000:.0f} ms'))
+        fast_at = 0.0
+        for path in options['paths']:
+            latencies = [(at, latency) for request_path, at, latency in timeline if request_path == path]
+            steady = statistics.median(latency for at, latency in latencies[len(latencies) // 2:])
+            first_fast = next(at for at, latency in latencies if latency <= steady * options['fast_factor'])
+            fast_at = max(fast_at, first_fast)
+            self.stdout.write(
+                f'  {path:45} first {latencies[0][1] * 1000:8.1f} ms  '
+                f'steady {steady * 1000:6.1f} ms  fast after {first_fast * 1000:6.0f} ms'
+            )
+        self.stdout.write(self.style.SUCCESS(f'  every path fast {fast_at * 1000:.0f} ms after launch'))
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from complaints.sla import backfill_deadlines, escalate_overdue
+
+
+class Command(BaseCommand):
+    help = 'Escalate complaints that missed their SLA deadline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--loop', action='store_true', help='Keep running, once every --interval seconds')
+        parser.add_argument('--interval', type=int, default=60)
+        parser.add_argument('--backfill', action='store_true', help='First set deadlines on complaints that have none')
+        parser.add_argument('--no-email', action='store_true', help='Do not email the escalation digest')
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            start = time.perf_counter()
+            updated = backfill_deadlines(options['batch_size'])
+            self.stdout.write(f'Set deadlines on {updated} complaints in {time.perf_counter() - start:.2f} s')
+
+        while True:
+            self.tick(options)
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def tick(self, options):
+        start = time.perf_counter()
+        escalated = []
+        while True:
+            batch = escalate_overdue(batch_size=options['batch_size'])
+            escalated.extend(batch)
+            if len(batch) < options['batch_size']:
+                break
+
+        if escalated and not options['no_email']:
+            from notifications.email_service import send_sla_escalation_digest
+            send_sla_escalation_digest(escalated)
+        self.stdout.write(self.style.SUCCESS(
+            f'Escalated {len(escalated)} complaints in {time.perf_counter() - start:.2f} s'
+        ))
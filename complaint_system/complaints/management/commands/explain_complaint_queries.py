@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from complaints.models import Category, Complaint
+
+
+class Command(BaseCommand):
+    help = 'Print EXPLAIN output and timings for the complaint list query shapes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per query shape')
+        parser.add_argument('--page-size', type=int, default=20)
+
+    def handle(self, *args, **options):
+        category = Category.objects.filter(department__isnull=False).first()
+        department = category.department_id if category else None
+        base = Complaint.objects.order_by('-created_at')
+
+        # Filter combinations produced by ComplaintViewSet.get_queryset
+        shapes = {
+            'department': base.filter(department=department),
+            'department + status': base.filter(department=department, status='pending'),
+            'department + priority': base.filter(department=department, priority='high'),
+            'department + open statuses': base.filter(department=department, status__in=Complaint.OPEN_STATUSES),
+            'status': base.filter(status='in_progress'),
+            'priority': base.filter(priority='critical'),
+            'category': base.filter(category=category),
+            'category + open statuses': base.filter(category=category, status__in=Complaint.OPEN_STATUSES),
+            'reference_number': Complaint.objects.filter(reference_number='CMP00000000000000'),
+        }
+
+        self.stdout.write(f'Complaints in table: {Complaint.objects.count()}\n')
+        for name, queryset in shapes.items():
+            page = queryset[:options['page_size']]
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                list(page.all())
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(page.explain())
+            self.stdout.write(f'  first page: median {timings[len(timings) // 2]:.2f} ms, best {timings[0]:.2f} ms\n')
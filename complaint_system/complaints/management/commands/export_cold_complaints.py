@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from complaints.cold_storage import cold_cutoff, export_complaints, exportable_complaints, restore
+
+
+class Command(BaseCommand):
+    help = 'Export complaints closed long ago to cold storage segment files and delete them from the hot tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=None, help='Closed for at least this long (default: COLD_STORAGE_MONTHS)')
+        parser.add_argument('--batch-size', type=int, default=None, help='Complaints per segment (default: COLD_STORAGE_BATCH_SIZE)')
+        parser.add_argument('--limit', type=int, default=None, help='Export at most this many complaints per run')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the complaints that would move')
+        parser.add_argument('--restore', metavar='REFERENCE', action='append', help='Move this complaint back into the hot tables (repeatable)')
+
+    def handle(self, *args, **options):
+        if options['restore']:
+            for reference_number in options['restore']:
+                if restore(reference_number) is None:
+                    raise CommandError(f'{reference_number} is not in cold storage')
+                self.stdout.write(self.style.SUCCESS(f'Restored {reference_number}'))
+            return
+
+        if options['dry_run']:
+            count = exportable_complaints(cold_cutoff(options['months'])).count()
+            self.stdout.write(f'{count} complaints would be exported')
+            return
+
+        start = time.perf_counter()
+        moved = export_complaints(options['months'], options['batch_size'], options['limit'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Exported {moved} complaints to cold storage in {time.perf_counter() - start:.2f} s'
+        ))
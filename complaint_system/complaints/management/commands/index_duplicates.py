@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from complaints import duplicates
+from complaints.models import Complaint, DuplicateKey
+
+
+class Command(BaseCommand):
+    help = 'Index open complaints from the duplicate window that have no text signature yet, and drop expired keys'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(hours=settings.DUPLICATE_WINDOW_HOURS)
+        expired, _ = DuplicateKey.objects.filter(created_at__lt=since).delete()
+
+        pending = Complaint.objects.filter(
+            created_at__gte=since, status__in=Complaint.OPEN_STATUSES, text_signature__isnull=True
+        ).only('id', 'title', 'description', 'latitude', 'longitude', 'category_id', 'created_at')
+
+        indexed = 0
+        batch = []
+        for complaint in pending.iterator(chunk_size=options['batch_size']):
+            complaint.text_signature = duplicates.signature(complaint.title, complaint.description)
+            batch.append(complaint)
+            if len(batch) >= options['batch_size']:
+                indexed += self._index(batch)
+                batch = []
+        if batch:
+            indexed += self._index(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} complaints, removed {expired} expired keys'))
+
+    def _index(self, complaints):
+        Complaint.objects.bulk_update(complaints, ['text_signature'])
+        keys = [
+            DuplicateKey(key=key, complaint=complaint, created_at=complaint.created_at)
+            for complaint in complaints if complaint.text_signature
+            for key in duplicates.band_keys(
+                complaint.text_signature, complaint.latitude, complaint.longitude, complaint.category_id
+            )
+        ]
+        DuplicateKey.objects.bulk_create(keys)
+        return len(complaints)
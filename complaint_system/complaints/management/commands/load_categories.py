@@ -1,5 +1,5 @@
 from django.core.management.base import BaseCommand
-from complaints.models import Category
+from complaints.models import Category, Department
 
 
 class Command(BaseCommand):
@@ -66,13 +66,14 @@ class Command(BaseCommand):
         ]
 
         for cat_data in categories:
+            department, _ = Department.objects.get_or_create(name=cat_data['department'])
             category, created = Category.objects.update_or_create(
                 name=cat_data['name'],
                 defaults={
                     'description': cat_data['description'],
                     'icon': cat_data['icon'],
                     'color': cat_data['color'],
-                    'department': cat_data['department'],
+                    'department': department,
                 }
             )
             if created:
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from complaints.models import SLAPolicy
+
+
+class Command(BaseCommand):
+    help = 'Load default SLA policies (hours per status and priority, any category)'
+
+    def handle(self, *args, **kwargs):
+        defaults = {
+            'pending': {'low': 72, 'medium': 48, 'high': 24, 'critical': 4},
+            'acknowledged': {'low': 168, 'medium': 96, 'high': 48, 'critical': 12},
+        }
+
+        count = 0
+        for status, hours_by_priority in defaults.items():
+            for priority, hours in hours_by_priority.items():
+                policy, created = SLAPolicy.objects.update_or_create(
+                    status=status, category=None, priority=priority, defaults={'hours': hours}
+                )
+                action = 'Created' if created else 'Updated'
+                self.stdout.write(self.style.SUCCESS(f'✓ {action} SLA policy: {policy}'))
+                count += 1
+        
+        self.stdout.write(self.style.SUCCESS(f'\n✓ Successfully loaded {count} SLA policies'))
@@ -0,0 +1,75 @@
+import random
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from complaints.models import Category, Complaint
+
+
+class Command(BaseCommand):
+    help = 'Seed synthetic complaints for load testing and query benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=100000, help='Number of complaints to create')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--days', type=int, default=730, help='Spread created_at over this many days')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        categories = list(Category.objects.all())
+        if not categories:
+            raise CommandError('No categories found. Run "python manage.py load_categories" first.')
+
+        rng = random.Random(options['seed'])
+        count = options['count']
+        batch_size = options['batch_size']
+        now = timezone.now()
+        prefix = now.strftime('S%y%m%d%H%M')
+
+        self._seed(rng, categories, count, batch_size, now, options['days'], prefix)
+
+        # Refresh planner statistics; the admin paginator also reads its row estimate from them
+        if connection.vendor in ('sqlite', 'postgresql'):
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Seeded {count} complaints'))
+
+    def _seed(self, rng, categories, count, batch_size, now, days, prefix):
+        statuses = [choice for choice, _ in Complaint.STATUS_CHOICES]
+        priorities = [choice for choice, _ in Complaint.PRIORITY_CHOICES]
+        created = 0
+        while created < count:
+            batch = []
+            created_at_by_reference = {}
+            for i in range(created, min(created + batch_size, count)):
+                category = rng.choice(categories)
+                created_at = now - timedelta(minutes=rng.randint(0, days * 24 * 60))
+                batch.append(Complaint(
+                    title=f'Seeded complaint {i}',
+                    description='Synthetic complaint generated for benchmarking. ' * 4,
+                    category=category,
+                    department_id=category.department_id,
+                    citizen_name=f'Citizen {i}',
+                    citizen_email=f'citizen{i}@example.com',
+                    latitude=round(rng.uniform(18.40, 18.65), 6),
+                    longitude=round(rng.uniform(73.70, 74.00), 6),
+                    address=f'{i} Seed Street',
+                    status=rng.choices(statuses, weights=[30, 10, 15, 25, 15, 5])[0],
+                    priority=rng.choices(priorities, weights=[25, 45, 22, 8])[0],
+                    reference_number=f'{prefix}{i:07d}',
+                ))
+                created_at_by_reference[batch[-1].reference_number] = created_at
+            Complaint.objects.bulk_create(batch, batch_size=batch_size)
+            # bulk_create stamps the current time; spread the timestamps out afterwards
+            ids = dict(
+                Complaint.objects.filter(reference_number__in=created_at_by_reference).values_list('reference_number', 'pk')
+            )
+            for complaint in batch:
+                complaint.pk = ids[complaint.reference_number]
+                complaint.created_at = complaint.updated_at = created_at_by_reference[complaint.reference_number]
+            Complaint.objects.bulk_update(batch, ['created_at', 'updated_at'], batch_size=batch_size)
+            created += len(batch)
+            self.stdout.write(f'  {created}/{count}')
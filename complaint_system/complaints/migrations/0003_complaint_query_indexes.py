@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0002_category_department'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='complaint',
+            name='complaints__referen_08a149_idx',
+        ),
+        migrations.AddIndex(
+            model_name='complaint',
+            index=models.Index(fields=['priority', '-created_at'], name='complaint_priority_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='complaint',
+            index=models.Index(fields=['department', '-created_at'], name='complaint_dept_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='complaint',
+            index=models.Index(fields=['department', 'status', '-created_at'], name='complaint_dept_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='complaint',
+            index=models.Index(fields=['department', 'priority', '-created_at'], name='complaint_dept_priority_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='complaint',
+            index=models.Index(condition=models.Q(('status__in', ['pending', 'acknowledged', 'in_progress'])), fields=['department', '-created_at'], name='complaint_dept_open_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='complaint',
+            index=models.Index(condition=models.Q(('status__in', ['pending', 'acknowledged', 'in_progress'])), fields=['category', '-created_at'], name='complaint_category_open_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0003_complaint_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='complaint',
+            name='parent',
+            field=models.ForeignKey(blank=True, help_text='Earlier complaint about the same incident', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='complaints.complaint'),
+        ),
+        migrations.AddField(
+            model_name='complaint',
+            name='text_signature',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='DuplicateKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=40)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('complaint', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='duplicate_keys', to='complaints.complaint')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['key', 'created_at'], name='complaints__key_e0ebf8_idx')],
+            },
+        ),
+    ]
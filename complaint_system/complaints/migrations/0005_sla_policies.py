@@ -0,0 +1,50 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0004_complaint_duplicates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SLAPolicy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('acknowledged', 'Acknowledged')], max_length=20)),
+                ('priority', models.CharField(blank=True, choices=[('low', 'Low'), ('medium', 'Medium'), ('high', 'High'), ('critical', 'Critical')], max_length=20)),
+                ('hours', models.PositiveIntegerField(help_text='Hours allowed before the complaint is escalated')),
+            ],
+            options={
+                'verbose_name': 'SLA Policy',
+                'verbose_name_plural': 'SLA Policies',
+                'ordering': ['status', 'category__name', 'priority'],
+            },
+        ),
+        migrations.AddField(
+            model_name='complaint',
+            name='due_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='complaint',
+            index=models.Index(condition=models.Q(('due_at__isnull', False)), fields=['due_at'], name='complaint_due_idx'),
+        ),
+        migrations.AddField(
+            model_name='slapolicy',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='sla_policies', to='complaints.category'),
+        ),
+        migrations.AddConstraint(
+            model_name='slapolicy',
+            constraint=models.UniqueConstraint(fields=('status', 'category', 'priority'), name='unique_sla_policy'),
+        ),
+        migrations.AddConstraint(
+            model_name='slapolicy',
+            constraint=models.UniqueConstraint(condition=models.Q(('category__isnull', True)), fields=('status', 'priority'), name='unique_default_sla_policy'),
+        ),
+    ]
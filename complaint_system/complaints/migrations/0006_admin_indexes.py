@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0005_sla_policies'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='complaint',
+            index=models.Index(fields=['-created_at'], name='complaint_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='statushistory',
+            index=models.Index(fields=['complaint', '-created_at'], name='history_complaint_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='statushistory',
+            index=models.Index(fields=['-created_at'], name='history_created_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('complaints', '0006_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedStatusHistory',
+            fields=[
+                ('old_status', models.CharField(blank=True, max_length=20)),
+                ('new_status', models.CharField(max_length=20)),
+                ('notes', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField()),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('changed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('complaint', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_status_history', to='complaints.complaint')),
+            ],
+            options={
+                'verbose_name_plural': 'Archived Status Histories',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['complaint', '-created_at'], name='archived_history_complaint_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0007_status_history_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ColdComplaint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reference_number', models.CharField(max_length=20, unique=True)),
+                ('complaint_id', models.BigIntegerField()),
+                ('status', models.CharField(max_length=20)),
+                ('department', models.CharField(blank=True, max_length=100)),
+                ('segment', models.CharField(max_length=200)),
+                ('offset', models.BigIntegerField(help_text='Byte offset of the gzip block holding the record')),
+                ('length', models.IntegerField(help_text='Compressed size of that block')),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-archived_at'],
+            },
+        ),
+    ]
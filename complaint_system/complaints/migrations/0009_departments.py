@@ -0,0 +1,155 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:12
+
+from collections import Counter, defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Requested on the department registration form; kept as a department so
+# pending admin requests can be listed like any other
+ADMIN_STAFF = 'ADMIN STAFF'
+
+
+def normalized(name):
+    return ' '.join(name.split())
+
+
+def spellings_by_department(apps):
+    """{canonical name: spellings found}; spellings differing only in case or spacing are merged"""
+    sources = [
+        apps.get_model('complaints', 'Category'),
+        apps.get_model('complaints', 'Complaint'),
+        apps.get_model('accounts', 'UserProfile'),
+    ]
+    counts = Counter()
+    for model in sources:
+        rows = model.objects.exclude(department='').values_list('department').annotate(count=models.Count('pk'))
+        for name, count in rows.order_by():
+            counts[name] += count
+
+    groups = defaultdict(Counter)
+    for name, count in counts.items():
+        if normalized(name):
+            groups[normalized(name).casefold()][normalized(name)] += count
+    spellings = {}
+    for key, variants in groups.items():
+        # The most used spelling wins
+        canonical = variants.most_common(1)[0][0]
+        spellings[canonical] = [name for name in counts if normalized(name).casefold() == key]
+    return spellings
+
+
+def create_departments(apps, schema_editor):
+    Department = apps.get_model('complaints', 'Department')
+    spellings = spellings_by_department(apps)
+    spellings.setdefault(ADMIN_STAFF, [])
+    for name in spellings:
+        Department.objects.create(name=name)
+
+    # One UPDATE per department rather than one per row
+    for department in Department.objects.all():
+        for model_name in ('Category', 'Complaint'):
+            model = apps.get_model('complaints', model_name)
+            model.objects.filter(department__in=spellings[department.name]).update(department_ref=department.pk)
+
+
+def restore_department_names(apps, schema_editor):
+    Department = apps.get_model('complaints', 'Department')
+    for department in Department.objects.all():
+        for model_name in ('Category', 'Complaint'):
+            model = apps.get_model('complaints', model_name)
+            model.objects.filter(department_ref=department.pk).update(department=department.name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_userprofile_department_and_more'),
+        ('complaints', '0008_cold_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Department',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='department_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='complaints.department'),
+        ),
+        migrations.AddField(
+            model_name='complaint',
+            name='department_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='complaints.department'),
+        ),
+        migrations.RunPython(create_departments, restore_department_names),
+        migrations.RemoveIndex(
+            model_name='complaint',
+            name='complaint_dept_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='complaint',
+            name='complaint_dept_status_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='complaint',
+            name='complaint_dept_priority_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='complaint',
+            name='complaint_dept_open_idx',
+        ),
+        migrations.RemoveField(
+            model_name='category',
+            name='department',
+        ),
+        migrations.RemoveField(
+            model_name='complaint',
+            name='department',
+        ),
+        migrations.RenameField(
+            model_name='category',
+            old_name='department_ref',
+            new_name='department',
+        ),
+        migrations.RenameField(
+            model_name='complaint',
+            old_name='department_ref',
+            new_name='department',
+        ),
+        migrations.AlterField(
+            model_name='category',
+            name='department',
+            field=models.ForeignKey(blank=True, help_text='Department responsible for this category', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='categories', to='complaints.department'),
+        ),
+        migrations.AlterField(
+            model_name='complaint',
+            name='department',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='complaints', to='complaints.department'),
+        ),
+        migrations.AddIndex(
+            model_name='complaint',
+            index=models.Index(fields=['department', '-created_at'], name='complaint_dept_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='complaint',
+            index=models.Index(fields=['department', 'status', '-created_at'], name='complaint_dept_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='complaint',
+            index=models.Index(fields=['department', 'priority', '-created_at'], name='complaint_dept_priority_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='complaint',
+            index=models.Index(condition=models.Q(('status__in', ['pending', 'acknowledged', 'in_progress'])), fields=['department', '-created_at'], name='complaint_dept_open_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def department_ids(apps, schema_editor):
+    Department = apps.get_model('complaints', 'Department')
+    ColdComplaint = apps.get_model('complaints', 'ColdComplaint')
+    for department in Department.objects.all():
+        ColdComplaint.objects.filter(department=department.name).update(department_ref=department.pk)
+
+
+def department_names(apps, schema_editor):
+    Department = apps.get_model('complaints', 'Department')
+    ColdComplaint = apps.get_model('complaints', 'ColdComplaint')
+    for department in Department.objects.all():
+        ColdComplaint.objects.filter(department_ref=department.pk).update(department=department.name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0009_departments'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coldcomplaint',
+            name='department_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='complaints.department'),
+        ),
+        migrations.RunPython(department_ids, department_names),
+        migrations.RemoveField(
+            model_name='coldcomplaint',
+            name='department',
+        ),
+        migrations.RenameField(
+            model_name='coldcomplaint',
+            old_name='department_ref',
+            new_name='department',
+        ),
+        migrations.AlterField(
+            model_name='coldcomplaint',
+            name='department',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='complaints.department'),
+        ),
+    ]
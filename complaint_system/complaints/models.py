@@ -1,16 +1,37 @@
 from django.db import models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 
 
+class Department(models.Model):
+    """Department responsible for categories of complaints; staff belong to one"""
+    name = models.CharField(max_length=100, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['name']
+    
+    def __str__(self):
+        return self.name
+
+
 class Category(models.Model):
     """Categories for complaint classification"""
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True)
     icon = models.CharField(max_length=50, blank=True, help_text="Icon class or emoji")
     color = models.CharField(max_length=7, default="#3B82F6", help_text="Hex color code")
-    department = models.CharField(max_length=100, blank=True, help_text="Department responsible for this category")
+    department = models.ForeignKey(
+        Department,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='categories',
+        help_text="Department responsible for this category"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -40,6 +61,15 @@ class Complaint(models.Model):
         ('critical', 'Critical'),
     ]
     
+    # Statuses that still need action from a department
+    OPEN_STATUSES = ['pending', 'acknowledged', 'in_progress']
+    
+    # Statuses with an SLA deadline (see SLAPolicy)
+    SLA_STATUSES = ['pending', 'acknowledged']
+    
+    # Fields the deadline depends on; changing one restarts the SLA clock
+    SLA_FIELDS = ('status', 'priority', 'category_id')
+    
     # Basic Information
     title = models.CharField(max_length=200)
     description = models.TextField()
@@ -70,7 +100,13 @@ class Complaint(models.Model):
         blank=True,
         related_name='assigned_complaints'
     )
-    department = models.CharField(max_length=100, blank=True)
+    department = models.ForeignKey(
+        Department,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='complaints'
+    )
     
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
@@ -80,17 +116,73 @@ class Complaint(models.Model):
     # Tracking
     reference_number = models.CharField(max_length=20, unique=True, editable=False)
     
+    # Duplicate detection (complaints/duplicates.py)
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='duplicates',
+        help_text="Earlier complaint about the same incident"
+    )
+    text_signature = models.JSONField(null=True, blank=True, editable=False)
+    
+    # SLA deadline for the current status and priority; recomputed on save
+    due_at = models.DateTimeField(null=True, blank=True, editable=False)
+    
     class Meta:
         ordering = ['-created_at']
         indexes = [
+            # Unfiltered newest-first pages and the admin date hierarchy
+            models.Index(fields=['-created_at'], name='complaint_created_idx'),
             models.Index(fields=['status', '-created_at']),
             models.Index(fields=['category', '-created_at']),
-            models.Index(fields=['reference_number']),
+            models.Index(fields=['priority', '-created_at'], name='complaint_priority_created_idx'),
+            # Department staff always get a department filter first
+            models.Index(fields=['department', '-created_at'], name='complaint_dept_created_idx'),
+            models.Index(fields=['department', 'status', '-created_at'], name='complaint_dept_status_idx'),
+            models.Index(fields=['department', 'priority', '-created_at'], name='complaint_dept_priority_idx'),
+            # Dashboards mostly look at complaints that are still open
+            models.Index(
+                fields=['department', '-created_at'],
+                name='complaint_dept_open_idx',
+                condition=models.Q(status__in=['pending', 'acknowledged', 'in_progress']),
+            ),
+            models.Index(
+                fields=['category', '-created_at'],
+                name='complaint_category_open_idx',
+                condition=models.Q(status__in=['pending', 'acknowledged', 'in_progress']),
+            ),
+            # The escalation worker only ever reads overdue rows
+            models.Index(fields=['due_at'], name='complaint_due_idx', condition=models.Q(due_at__isnull=False)),
         ]
     
     def __str__(self):
         return f"{self.reference_number} - {self.title}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Only the SLA fields actually loaded; a deferred one is unknown, not None
+        loaded = dict(zip(field_names, values))
+        instance._sla_state = {name: loaded[name] for name in cls.SLA_FIELDS if name in loaded}
+        return instance
+    
+    def sla_fields_changed(self):
+        """Whether status, priority or category differ from the stored row"""
+        loaded = getattr(self, '_sla_state', None)
+        if loaded is None or self._state.adding:
+            return True
+        # Deferred when loaded but assigned since: compare with the stored values
+        deferred = self.get_deferred_fields()
+        assigned = [name for name in self.SLA_FIELDS if name not in loaded and name not in deferred]
+        if assigned:
+            stored = type(self)._base_manager.filter(pk=self.pk).values(*assigned).first()
+            if stored is None:
+                return True
+            loaded = {**loaded, **stored}
+        return any(getattr(self, name) != value for name, value in loaded.items())
+    
     def save(self, *args, **kwargs):
         # Generate reference number if not exists
         if not self.reference_number:
@@ -102,26 +194,108 @@ class Complaint(models.Model):
         if self.status == 'resolved' and not self.resolved_at:
             self.resolved_at = timezone.now()
         
+        # Restart the SLA clock when status, priority or category change
+        if self.sla_fields_changed():
+            from .sla import deadline
+            self.due_at = deadline(self.status, self.category_id, self.priority, timezone.now())
+            self._sla_state = {name: getattr(self, name) for name in self.SLA_FIELDS}
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'due_at'}
+        
         super().save(*args, **kwargs)
 
 
-class StatusHistory(models.Model):
-    """Track status changes for transparency"""
-    complaint = models.ForeignKey(Complaint, on_delete=models.CASCADE, related_name='status_history')
+class SLAPolicy(models.Model):
+    """How long a complaint may stay in a status; blank category/priority match any"""
+    status = models.CharField(
+        max_length=20,
+        choices=[choice for choice in Complaint.STATUS_CHOICES if choice[0] in Complaint.SLA_STATUSES]
+    )
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True, related_name='sla_policies')
+    priority = models.CharField(max_length=20, choices=Complaint.PRIORITY_CHOICES, blank=True)
+    hours = models.PositiveIntegerField(help_text="Hours allowed before the complaint is escalated")
+    
+    class Meta:
+        verbose_name = "SLA Policy"
+        verbose_name_plural = "SLA Policies"
+        ordering = ['status', 'category__name', 'priority']
+        constraints = [
+            models.UniqueConstraint(fields=['status', 'category', 'priority'], name='unique_sla_policy'),
+            # NULL categories never collide in the constraint above
+            models.UniqueConstraint(
+                fields=['status', 'priority'],
+                condition=models.Q(category__isnull=True),
+                name='unique_default_sla_policy',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_status_display()} / {self.category or 'any category'} / {self.priority or 'any priority'}: {self.hours}h"
+
+
+class DuplicateKey(models.Model):
+    """Text band + location key of a recent complaint, for finding near-duplicates"""
+    key = models.CharField(max_length=40)
+    complaint = models.ForeignKey(Complaint, on_delete=models.CASCADE, related_name='duplicate_keys')
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['key', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return self.key
+
+
+class StatusHistoryFields(models.Model):
+    """Columns shared by the live and archived status history tables"""
     old_status = models.CharField(max_length=20, blank=True)
     new_status = models.CharField(max_length=20)
-    changed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
-        verbose_name_plural = "Status Histories"
-        ordering = ['-created_at']
+        abstract = True
     
     def __str__(self):
         return f"{self.complaint.reference_number}: {self.old_status} → {self.new_status}"
 
 
+class StatusHistory(StatusHistoryFields):
+    """Track status changes for transparency"""
+    complaint = models.ForeignKey(Complaint, on_delete=models.CASCADE, related_name='status_history')
+    changed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    
+    class Meta:
+        verbose_name_plural = "Status Histories"
+        ordering = ['-created_at']
+        indexes = [
+            # Latest history of one complaint, and the admin changelist/date hierarchy
+            models.Index(fields=['complaint', '-created_at'], name='history_complaint_created_idx'),
+            models.Index(fields=['-created_at'], name='history_created_idx'),
+        ]
+
+
+class ArchivedStatusHistory(StatusHistoryFields):
+    """
+    Status history of complaints closed long ago, moved out of StatusHistory
+    by manage.py archive_status_history. Rows keep their original ids.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    complaint = models.ForeignKey(Complaint, on_delete=models.CASCADE, related_name='archived_status_history')
+    changed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    # Copied from the live row, not stamped when archived
+    created_at = models.DateTimeField()
+    
+    class Meta:
+        verbose_name_plural = "Archived Status Histories"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['complaint', '-created_at'], name='archived_history_complaint_idx'),
+        ]
+
+
 class Feedback(models.Model):
     """Citizen satisfaction feedback after resolution"""
     complaint = models.OneToOneField(Complaint, on_delete=models.CASCADE, related_name='feedback')
@@ -138,3 +312,59 @@ class Feedback(models.Model):
     
     def __str__(self):
         return f"Feedback for {self.complaint.reference_number} - {self.rating}/5"
+
+
+class ColdComplaint(models.Model):
+    """
+    Lookup entry for a complaint exported to cold storage (complaints/cold_storage.py);
+    the record itself is one line in a block of a segment file
+    """
+    reference_number = models.CharField(max_length=20, unique=True)
+    complaint_id = models.BigIntegerField()
+    status = models.CharField(max_length=20)
+    department = models.ForeignKey(
+        Department, on_delete=models.PROTECT, null=True, blank=True, related_name='+'
+    )
+    segment = models.CharField(max_length=200)
+    offset = models.BigIntegerField(help_text="Byte offset of the gzip block holding the record")
+    length = models.IntegerField(help_text="Compressed size of that block")
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-archived_at']
+    
+    def __str__(self):
+        return f"{self.reference_number} ({self.segment})"
+
+
+@receiver([post_save, post_delete], sender=Department)
+def invalidate_departments(sender, **kwargs):
+    """Drop the cached department table; cached responses embed department names"""
+    from .cache import bump_version
+    from .departments import forget_departments
+    forget_departments()
+    bump_version('categories')
+    bump_version('complaints')
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category_responses(sender, **kwargs):
+    """Expire cached API responses that include category data"""
+    from .cache import bump_version
+    bump_version('categories')
+
+
+@receiver([post_save, post_delete], sender=SLAPolicy)
+def invalidate_sla_policies(sender, **kwargs):
+    """Drop the cached policy table"""
+    from .sla import forget_policies
+    forget_policies()
+
+
+@receiver([post_save, post_delete], sender=Complaint)
+@receiver([post_save, post_delete], sender=StatusHistory)
+@receiver([post_save, post_delete], sender=Feedback)
+def invalidate_complaint_responses(sender, **kwargs):
+    """Expire cached API responses that include complaint data"""
+    from .cache import bump_version
+    bump_version('complaints')
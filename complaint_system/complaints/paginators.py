@@ -0,0 +1,54 @@
+"""
+Paginator for admin changelists over very large tables.
+
+An exact COUNT(*) over millions of rows costs more than the page itself.
+For unfiltered querysets the row count comes from the database's table
+statistics instead (pg_class on PostgreSQL, sqlite_stat1 after ANALYZE on
+SQLite, information_schema on MySQL); filtered querysets, small tables and
+databases without statistics still get an exact count.
+"""
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+
+
+def estimated_row_count(model, using):
+    """Row count from table statistics, or None if the database has none"""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+            row = cursor.fetchone()
+            return row[0] if row and row[0] > 0 else None
+        if connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s',
+                [table],
+            )
+            row = cursor.fetchone()
+            return row[0] if row else None
+        if connection.vendor == 'sqlite':
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s', [table])
+            # The first number of each entry is the row count of that index (or of the table)
+            counts = [int(stat.split()[0]) for stat, in cursor.fetchall()]
+            return max(counts) if counts else None
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator using an estimated count for unfiltered querysets on large tables"""
+    estimate_threshold = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet) and not queryset.query.where and not queryset.query.distinct:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= self.estimate_threshold:
+                return estimate
+        return super().count
@@ -1,16 +1,60 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import Category, Complaint, StatusHistory, Feedback
+from . import duplicates
+from .archive import merge_history
+from .departments import department_id, department_instance, department_name
+from .models import Category, Complaint, Department, StatusHistory, Feedback
 from django.contrib.auth.models import User
 
 
+class DepartmentField(serializers.RelatedField):
+    """
+    A department by name, as the API has always exposed it. Names and ids are
+    translated through the cached department table (departments.py), so
+    neither reading nor validating one joins or queries the departments.
+    """
+    default_error_messages = {
+        'does_not_exist': 'Invalid department. Please select from available departments.',
+    }
+    
+    def __init__(self, **kwargs):
+        kwargs.setdefault('queryset', None if kwargs.get('read_only') else Department.objects.all())
+        kwargs.setdefault('required', False)
+        kwargs.setdefault('allow_null', True)
+        super().__init__(**kwargs)
+    
+    def use_pk_only_optimization(self):
+        return True
+    
+    def to_representation(self, value):
+        # PKOnlyObject from a model instance, or the raw id from values_list()
+        return department_name(getattr(value, 'pk', value))
+    
+    def to_internal_value(self, data):
+        pk = department_id(str(data))
+        if pk is None:
+            self.fail('does_not_exist')
+        return department_instance(pk)
+    
+    def validate_empty_values(self, data):
+        # A blank name clears the department, like the old blank CharField
+        if data == '':
+            data = None
+        return super().validate_empty_values(data)
+
+
 class CategorySerializer(serializers.ModelSerializer):
     complaint_count = serializers.SerializerMethodField()
+    department = DepartmentField(read_only=True)
     
     class Meta:
         model = Category
         fields = ['id', 'name', 'description', 'icon', 'color', 'department', 'complaint_count']
     
     def get_complaint_count(self, obj):
+        # Views annotate the count; fall back to a query for bare instances
+        if hasattr(obj, 'complaint_count'):
+            return obj.complaint_count
         return obj.complaints.count()
 
 
@@ -36,6 +80,20 @@ class ComplaintListSerializer(serializers.ModelSerializer):
     """Simplified serializer for list view"""
     category_name = serializers.CharField(source='category.name', read_only=True)
     category_color = serializers.CharField(source='category.color', read_only=True)
+    department = DepartmentField(read_only=True)
+    
+    # Named field subsets accepted by ?fields=<preset>
+    FIELD_PRESETS = {
+        'map': ['id', 'latitude', 'longitude', 'status', 'category_color'],
+        'table': [
+            'id', 'reference_number', 'title', 'category_name', 'citizen_name',
+            'status', 'priority', 'department', 'created_at'
+        ],
+        'mobile': [
+            'id', 'reference_number', 'title', 'category_name', 'category_color',
+            'status', 'latitude', 'longitude', 'created_at'
+        ],
+    }
     
     class Meta:
         model = Complaint
@@ -45,15 +103,49 @@ class ComplaintListSerializer(serializers.ModelSerializer):
             'status', 'priority', 'department', 'latitude', 'longitude', 'address',
             'created_at', 'updated_at'
         ]
+    
+    def __init__(self, *args, **kwargs):
+        # Optional subset of Meta.fields to render
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+    
+    @classmethod
+    def resolve_fields(cls, fields=None, exclude=None):
+        """Turn ?fields= / ?exclude= values into an ordered list of field names"""
+        if fields:
+            requested = cls.FIELD_PRESETS.get(fields) or [name.strip() for name in fields.split(',')]
+        else:
+            requested = cls.Meta.fields
+        excluded = [name.strip() for name in exclude.split(',')] if exclude else []
+        # Keep Meta order, drop unknown names, and always keep the id
+        return [
+            name for name in cls.Meta.fields
+            if name == 'id' or (name in requested and name not in excluded)
+        ]
+    
+    @classmethod
+    def model_columns(cls, fields):
+        """Model lookups read by the given fields, suitable for QuerySet.only()"""
+        columns = []
+        for name in fields:
+            declared = cls._declared_fields.get(name)
+            source = declared.source if declared is not None and declared.source else name
+            columns.append(source.replace('.', '__'))
+        return columns
 
 
 class ComplaintDetailSerializer(serializers.ModelSerializer):
     """Detailed serializer with all relationships"""
     category = CategorySerializer(read_only=True)
-    status_history = StatusHistorySerializer(many=True, read_only=True)
+    status_history = serializers.SerializerMethodField()
     feedback = FeedbackSerializer(read_only=True)
     assigned_to_name = serializers.SerializerMethodField()
     photo_url = serializers.SerializerMethodField()
+    parent_reference = serializers.CharField(source='parent.reference_number', read_only=True, default=None)
+    department = DepartmentField(read_only=True)
     
     class Meta:
         model = Complaint
@@ -62,10 +154,22 @@ class ComplaintDetailSerializer(serializers.ModelSerializer):
             'citizen_name', 'citizen_email', 'citizen_phone',
             'latitude', 'longitude', 'address', 'photo', 'photo_url',
             'status', 'priority', 'assigned_to_name', 'department',
-            'created_at', 'updated_at', 'resolved_at',
+            'created_at', 'updated_at', 'resolved_at', 'due_at',
+            'parent', 'parent_reference',
             'status_history', 'feedback'
         ]
-        read_only_fields = ['reference_number', 'created_at', 'updated_at', 'resolved_at']
+        read_only_fields = ['reference_number', 'created_at', 'updated_at', 'resolved_at', 'due_at', 'parent']
+    
+    def get_status_history(self, obj):
+        # Views prefetch a capped list; fall back to the full relation otherwise
+        history = getattr(obj, 'recent_status_history', None)
+        if history is None:
+            history = obj.status_history.select_related('changed_by')
+        archived = getattr(obj, 'archived_status_history_rows', None)
+        if archived:
+            # Asked for with ?include_archived=true (see archive.py)
+            history = merge_history(history, archived)
+        return StatusHistorySerializer(history, many=True).data
     
     def get_assigned_to_name(self, obj):
         return obj.assigned_to.get_full_name() if obj.assigned_to else None
@@ -102,15 +206,29 @@ class ComplaintCreateSerializer(serializers.ModelSerializer):
         category = Category.objects.get(id=category_id)
         
         # Auto-set department from category
-        validated_data['department'] = category.department
+        validated_data['department_id'] = category.department_id
+        
+        # Link likely repeats of an open complaint to its incident
+        notes = 'Complaint submitted by citizen'
+        if settings.DUPLICATE_DETECTION:
+            signature = duplicates.signature(validated_data['title'], validated_data['description'])
+            validated_data['text_signature'] = signature
+            match = duplicates.find_duplicate(
+                signature, validated_data.get('latitude'), validated_data.get('longitude'), category_id
+            )
+            if match:
+                validated_data['parent_id'] = match['parent_id'] or match['id']
+                notes += f" (likely duplicate of {match['reference_number']})"
         
         complaint = Complaint.objects.create(category=category, **validated_data)
+        if settings.DUPLICATE_DETECTION:
+            duplicates.index_complaint(complaint)
         
         # Create initial status history
         StatusHistory.objects.create(
             complaint=complaint,
             new_status='pending',
-            notes='Complaint submitted by citizen'
+            notes=notes
         )
         
         return complaint
@@ -118,6 +236,7 @@ class ComplaintCreateSerializer(serializers.ModelSerializer):
 
 class ComplaintUpdateSerializer(serializers.ModelSerializer):
     """Serializer for admin updates"""
+    department = DepartmentField()
     
     class Meta:
         model = Complaint
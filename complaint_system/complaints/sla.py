@@ -0,0 +1,148 @@
+"""
+SLA deadlines and escalation.
+
+Every complaint in an SLA status carries a due_at, computed from the most
+specific SLAPolicy when its status, priority or category changes (see
+Complaint.save). The escalation worker only reads rows whose due_at has
+passed, through a partial index, so a tick costs time proportional to the
+number of newly breached complaints. Escalating raises the priority one
+step and starts the deadline for the new priority; at critical the
+complaint is flagged once and its deadline cleared.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import VersionedTable, bump_version
+from .models import Complaint, SLAPolicy, StatusHistory
+
+
+PRIORITY_ORDER = [priority for priority, _ in Complaint.PRIORITY_CHOICES]
+
+
+def load_policies():
+    return {
+        (status, category_id, priority): hours
+        for status, category_id, priority, hours in SLAPolicy.objects.values_list(
+            'status', 'category_id', 'priority', 'hours'
+        )
+    }
+
+
+# Held in each process and reloaded when a policy changes in any worker
+_policies = VersionedTable('sla-policies', load_policies)
+
+
+def policies():
+    """{(status, category_id or None, priority or ''): hours}"""
+    return _policies.get()
+
+
+def forget_policies():
+    _policies.forget()
+
+
+def allowed_hours(status, category_id, priority):
+    """Hours from the most specific matching policy, or None"""
+    table = policies()
+    for key in (
+        (status, category_id, priority),
+        (status, category_id, ''),
+        (status, None, priority),
+        (status, None, ''),
+    ):
+        if key in table:
+            return table[key]
+    return None
+
+
+def deadline(status, category_id, priority, start):
+    if status not in Complaint.SLA_STATUSES:
+        return None
+    hours = allowed_hours(status, category_id, priority)
+    return start + timedelta(hours=hours) if hours is not None else None
+
+
+def next_priority(priority):
+    index = PRIORITY_ORDER.index(priority) if priority in PRIORITY_ORDER else 0
+    return PRIORITY_ORDER[min(index + 1, len(PRIORITY_ORDER) - 1)]
+
+
+def escalate_overdue(now=None, batch_size=500):
+    """Escalate one batch of breached complaints; returns the escalated complaints"""
+    now = now or timezone.now()
+    overdue = list(
+        Complaint.objects.filter(due_at__lte=now).order_by('due_at').only(
+            'id', 'reference_number', 'title', 'status', 'priority', 'category_id', 'department', 'due_at'
+        )[:batch_size]
+    )
+    if not overdue:
+        return []
+
+    notes = {}
+    # Rows escalated together share their new priority and deadline, so
+    # they can be written with one UPDATE per group. Each group is keyed by
+    # what was read too, and only rows still in that state are written, so a
+    # complaint resolved or reprioritised since the SELECT is left alone.
+    groups = defaultdict(list)
+    for complaint in overdue:
+        old_priority = complaint.priority
+        complaint.priority = next_priority(old_priority)
+        overdue_hours = (now - complaint.due_at).total_seconds() / 3600
+        if complaint.priority == old_priority:
+            complaint.due_at = None
+            notes[complaint.pk] = (
+                f'SLA breached by {overdue_hours:.1f}h at {complaint.get_priority_display()} priority'
+            )
+        else:
+            complaint.due_at = deadline(complaint.status, complaint.category_id, complaint.priority, now)
+            notes[complaint.pk] = (
+                f'SLA breached by {overdue_hours:.1f}h: priority raised from '
+                f'{old_priority} to {complaint.priority}'
+            )
+        groups[complaint.status, old_priority, complaint.priority, complaint.due_at].append(complaint.pk)
+
+    escalated = set()
+    with transaction.atomic():
+        for (status, old_priority, priority, due_at), ids in groups.items():
+            unchanged = list(Complaint.objects.select_for_update().filter(
+                pk__in=ids, status=status, priority=old_priority, due_at__lte=now
+            ).values_list('pk', flat=True))
+            Complaint.objects.filter(pk__in=unchanged).update(priority=priority, due_at=due_at, updated_at=now)
+            escalated.update(unchanged)
+        overdue = [complaint for complaint in overdue if complaint.pk in escalated]
+        StatusHistory.objects.bulk_create([
+            StatusHistory(
+                complaint=complaint, old_status=complaint.status, new_status=complaint.status,
+                notes=notes[complaint.pk],
+            )
+            for complaint in overdue
+        ])
+    # Bulk writes skip the post_save receivers
+    bump_version('complaints')
+    return overdue
+
+
+def backfill_deadlines(batch_size=1000):
+    """Set due_at for SLA-status complaints saved before deadlines existed"""
+    missing = Complaint.objects.filter(status__in=Complaint.SLA_STATUSES, due_at__isnull=True).only(
+        'id', 'status', 'priority', 'category_id', 'created_at', 'updated_at'
+    )
+    updated = 0
+    batch = []
+    for complaint in missing.iterator(chunk_size=batch_size):
+        # Best guess for when the current status started
+        start = complaint.created_at if complaint.status == 'pending' else complaint.updated_at
+        complaint.due_at = deadline(complaint.status, complaint.category_id, complaint.priority, start)
+        if complaint.due_at is not None:
+            batch.append(complaint)
+        if len(batch) >= batch_size:
+            Complaint.objects.bulk_update(batch, ['due_at'])
+            updated += len(batch)
+            batch = []
+    if batch:
+        Complaint.objects.bulk_update(batch, ['due_at'])
+        updated += len(batch)
+    return updated
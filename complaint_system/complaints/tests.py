@@ -1,3 +1,940 @@
-from django.test import TestCase
+import gzip
+import io
+import itertools
+import json
+import shutil
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.db.migrations.executor import MigrationExecutor
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from config import api_schema, middleware as compression
+from config.cache import PeriodicCullFileBasedCache
+from . import archive, assignment, async_views, renderers, cold_storage, departments, duplicates, paginators, sla
+from .cache import VERSION_KEY
+from .models import (
+    ArchivedStatusHistory, Category, ColdComplaint, Complaint, Department, DuplicateKey, Feedback, SLAPolicy,
+    StatusHistory,
+)
+from .serializers import ComplaintCreateSerializer, ComplaintListSerializer
+
+
+_references = itertools.count(1)
+
+
+def make_complaint(category, **fields):
+    """Complaint with a unique reference number; save() would derive it from the current second"""
+    fields.setdefault('reference_number', f'TST{next(_references):07d}')
+    return Complaint.objects.create(
+        title=fields.pop('title', 'Pothole on Main Street'),
+        description=fields.pop('description', 'A deep pothole near the bus stop'),
+        category=category,
+        department_id=category.department_id,
+        citizen_name='Citizen',
+        citizen_email='citizen@example.com',
+        **fields,
+    )
+
+
+def age(complaint, days):
+    """Move a complaint's timestamps into the past, as a follow-up UPDATE like the seeder"""
+    then = timezone.now() - timedelta(days=days)
+    Complaint.objects.filter(pk=complaint.pk).update(created_at=then, updated_at=then)
+    complaint.refresh_from_db()
+    return complaint
+
+
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-default'},
+    'throttle': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-throttle'},
+    'versions': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-versions'},
+    'tokens': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-tokens'},
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES, HISTORY_ARCHIVE_MONTHS=6)
+class HistoryArchiveTests(TestCase):
+    def setUp(self):
+        self.addCleanup(caches['default'].clear)
+        self.category = Category.objects.create(name='Potholes')
+
+    def with_history(self, status, days):
+        complaint = make_complaint(self.category, status=status)
+        for new_status in ('pending', 'acknowledged', status):
+            StatusHistory.objects.create(complaint=complaint, new_status=new_status, notes=new_status)
+        return age(complaint, days)
+
+    def test_only_history_of_long_closed_complaints_moves(self):
+        closed = self.with_history('closed', days=30 * 7)
+        recent = self.with_history('closed', days=30)
+        still_open = self.with_history('in_progress', days=30 * 7)
+        ids = list(StatusHistory.objects.filter(complaint=closed).values_list('pk', flat=True))
+
+        self.assertEqual(archive.archive_history(batch_size=2), 3)
+        self.assertEqual(sorted(ArchivedStatusHistory.objects.values_list('pk', flat=True)), sorted(ids))
+        self.assertFalse(closed.status_history.exists())
+        self.assertEqual(recent.status_history.count(), 3)
+        self.assertEqual(still_open.status_history.count(), 3)
+        self.assertEqual(archive.archive_history(), 0)
+
+    def test_archived_history_is_read_back_on_request(self):
+        closed = self.with_history('closed', days=30 * 7)
+        archive.archive_history()
+
+        self.assertEqual(archive.history(closed), [])
+        notes = [row.notes for row in archive.history(closed, include_archived=True)]
+        self.assertEqual(sorted(notes), ['acknowledged', 'closed', 'pending'])
+
+        url = f'/api/complaints/{closed.pk}/'
+        self.assertEqual(self.client.get(url).json()['status_history'], [])
+        rows = self.client.get(url, {'include_archived': 'true'}).json()['status_history']
+        self.assertEqual(sorted(row['notes'] for row in rows), ['acknowledged', 'closed', 'pending'])
+
+
+class ColdStorageTests(TransactionTestCase):
+    """Batches commit one by one here, so deferred foreign key checks run as in production"""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_override = override_settings(
+            COLD_STORAGE_DIR=directory, COLD_STORAGE_MONTHS=24, CACHES=LOCMEM_CACHES
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.department = Department.objects.create(name='Roads')
+        self.category = Category.objects.create(name='Potholes', department=self.department)
+
+    def closed_long_ago(self, **fields):
+        return age(make_complaint(self.category, status='closed', **fields), days=30 * 25)
+
+    def test_round_trip_keeps_history_feedback_and_timestamps(self):
+        complaint = make_complaint(self.category, status='closed')
+        StatusHistory.objects.create(complaint=complaint, new_status='pending', notes='submitted')
+        Feedback.objects.create(complaint=complaint, rating=4, comments='Fixed')
+        complaint = age(complaint, days=30 * 25)
+
+        self.assertEqual(cold_storage.export_complaints(), 1)
+        self.assertFalse(Complaint.objects.filter(pk=complaint.pk).exists())
+        self.assertFalse(StatusHistory.objects.filter(complaint_id=complaint.pk).exists())
+        self.assertEqual(ColdComplaint.objects.get().department_id, self.department.pk)
+
+        cold = cold_storage.lookup(complaint.reference_number)
+        self.assertEqual(cold.title, complaint.title)
+        self.assertEqual([row.notes for row in cold.recent_status_history], ['submitted'])
+        self.assertEqual(cold.feedback.rating, 4)
+
+        cold_storage.restore(complaint.reference_number)
+        restored = Complaint.objects.get(pk=complaint.pk)
+        self.assertEqual(restored.created_at, complaint.created_at)
+        self.assertEqual(restored.updated_at, complaint.updated_at)
+        self.assertEqual(restored.feedback.comments, 'Fixed')
+        self.assertEqual(restored.status_history.get().notes, 'submitted')
+        self.assertFalse(ColdComplaint.objects.exists())
+
+    def test_recent_and_open_complaints_stay(self):
+        make_complaint(self.category, status='closed')
+        age(make_complaint(self.category, status='pending'), days=30 * 25)
+
+        self.assertEqual(cold_storage.export_complaints(), 0)
+        self.assertEqual(Complaint.objects.count(), 2)
+
+    def test_duplicate_group_moves_in_one_batch(self):
+        parent = self.closed_long_ago()
+        child = self.closed_long_ago(parent=parent)
+        other = self.closed_long_ago()
+
+        self.assertEqual(cold_storage.export_complaints(batch_size=1), 3)
+        self.assertFalse(Complaint.objects.exists())
+        segments = dict(ColdComplaint.objects.values_list('complaint_id', 'segment'))
+        self.assertEqual(segments[parent.pk], segments[child.pk])
+        self.assertNotEqual(segments[parent.pk], segments[other.pk])
+
+    def test_duplicate_group_moves_with_limit(self):
+        parent = self.closed_long_ago()
+        self.closed_long_ago(parent=parent)
+
+        cold_storage.export_complaints(limit=1)
+        self.assertFalse(Complaint.objects.exists())
+
+    def test_parent_of_live_duplicate_stays(self):
+        parent = self.closed_long_ago()
+        child = self.closed_long_ago(parent=parent)
+        make_complaint(self.category, status='pending', parent=child)
+
+        self.assertEqual(cold_storage.export_complaints(batch_size=1), 0)
+        self.assertEqual(Complaint.objects.count(), 3)
+
+    def test_restoring_a_duplicate_brings_its_parent_back(self):
+        parent = self.closed_long_ago()
+        child = self.closed_long_ago(parent=parent)
+        cold_storage.export_complaints()
+
+        cold_storage.restore(child.reference_number)
+        self.assertEqual(Complaint.objects.get(pk=child.pk).parent_id, parent.pk)
+        self.assertFalse(ColdComplaint.objects.exists())
+
+
+class DuplicateTests(TestCase):
+    title = 'Broken street light'
+    description = 'The street light outside number 12 has been dark for a week'
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Lighting')
+
+    def reported(self, latitude=51.5, longitude=-0.12, **fields):
+        """An indexed complaint, as ComplaintCreateSerializer leaves it"""
+        complaint = make_complaint(
+            self.category, title=self.title, description=self.description, latitude=latitude, longitude=longitude,
+            text_signature=duplicates.signature(self.title, self.description), **fields,
+        )
+        duplicates.index_complaint(complaint)
+        return complaint
+
+    def match(self, text=None, latitude=51.5005, longitude=-0.1205):
+        sig = duplicates.signature(self.title, self.description) if text is None else duplicates.signature(*text)
+        return duplicates.find_duplicate(sig, latitude, longitude, self.category.pk)
+
+    def test_the_same_report_nearby_matches(self):
+        original = self.reported()
+        bands = duplicates.SIGNATURE_SIZE // duplicates.BAND_ROWS
+        self.assertEqual(DuplicateKey.objects.filter(complaint=original).count(), bands)
+        self.assertEqual(self.match()['id'], original.pk)
+
+    def test_distance_text_and_status_rule_out_a_match(self):
+        self.reported()
+        self.assertIsNone(self.match(latitude=51.55))
+        self.assertIsNone(self.match(text=('Overflowing bins', 'The bins at the market square have not been emptied')))
+        Complaint.objects.update(status='resolved')
+        self.assertIsNone(self.match())
+
+    def test_submission_links_to_the_first_report_of_the_incident(self):
+        original = self.reported()
+        self.reported(parent=original)
+
+        serializer = ComplaintCreateSerializer(data={
+            'title': self.title, 'description': self.description, 'category_id': self.category.pk,
+            'citizen_name': 'Neighbour', 'citizen_email': 'neighbour@example.com',
+            'latitude': '51.500500', 'longitude': '-0.120500',
+        })
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        complaint = serializer.save()
+        self.assertEqual(complaint.parent_id, original.pk)
+        self.assertIn(original.reference_number, complaint.status_history.get().notes)
+
+
+class SharedVersionsTestCase(TestCase):
+    """Per-process response cache with the namespace versions in a scratch directory, as deployed"""
+
+    def setUp(self):
+        self.versions_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.versions_dir)
+        settings_override = override_settings(CACHES={
+            **LOCMEM_CACHES,
+            'versions': {'BACKEND': 'config.cache.PeriodicCullFileBasedCache', 'LOCATION': self.versions_dir},
+        })
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(caches['default'].clear)
+
+    def bump_in_another_worker(self, namespace):
+        """Bump a version the way another process would: through its own view of the directory"""
+        other = PeriodicCullFileBasedCache(self.versions_dir, {})
+        other.set(VERSION_KEY.format(namespace), time.time_ns(), None)
+
+
+class ResponseCacheTests(SharedVersionsTestCase):
+    url = '/api/complaints/'
+
+    def setUp(self):
+        super().setUp()
+        self.category = Category.objects.create(name='Potholes')
+        self.complaint = make_complaint(self.category, title='Before')
+
+    def get(self):
+        response = self.client.get(self.url, HTTP_ACCEPT='application/json')
+        return response['X-Cache'], [row['title'] for row in response.json()['results']]
+
+    def test_second_request_is_a_hit(self):
+        self.assertEqual(self.get(), ('MISS', ['Before']))
+        self.assertEqual(self.get(), ('HIT', ['Before']))
+
+    def test_saving_a_complaint_invalidates(self):
+        self.get()
+        self.complaint.title = 'After'
+        self.complaint.save()
+        self.assertEqual(self.get(), ('MISS', ['After']))
+
+    def test_saving_a_category_invalidates(self):
+        self.get()
+        make_complaint(Category.objects.create(name='Streetlights'), title='Dark street')
+        self.assertEqual(self.get()[0], 'MISS')
+
+    def test_a_write_in_another_worker_invalidates(self):
+        self.get()
+        # The other worker's write, which sends its signals over there
+        Complaint.objects.filter(pk=self.complaint.pk).update(title='After')
+        self.bump_in_another_worker('complaints')
+        self.assertEqual(self.get(), ('MISS', ['After']))
+
+    def test_feedback_shows_on_the_tracking_page(self):
+        Complaint.objects.filter(pk=self.complaint.pk).update(status='resolved')
+        url = f'/api/complaints/reference/{self.complaint.reference_number}/'
+        self.assertIsNone(self.client.get(url).json()['feedback'])
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+        response = self.client.post(
+            f'/api/complaints/{self.complaint.pk}/submit_feedback/', {'rating': 5}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['feedback']['rating'], 5)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ListFastPathTests(TestCase):
+    """values_list() rows rendered by orjson must be byte for byte what the serializer and JSONRenderer give"""
+
+    @classmethod
+    def setUpTestData(cls):
+        roads = Department.objects.create(name='Roads')
+        placed = Category.objects.create(name='Potholes', department=roads, color='#112233')
+        unplaced = Category.objects.create(name='Noise')
+        for number in range(25):
+            if number % 2:
+                make_complaint(placed, latitude='51.507351', longitude='-0.127758', address='1 Main Street')
+            else:
+                # No department, no coordinates, and characters JSONRenderer escapes
+                make_complaint(unplaced, title=f'Loud music\u2028after midnight \u00e9 {number}', priority='high')
+
+    def setUp(self):
+        self.addCleanup(caches['default'].clear)
+
+    def get(self, params):
+        caches['default'].clear()
+        response = self.client.get('/api/complaints/', params, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.content
+
+    def reference(self, params):
+        """The same request through ComplaintListSerializer and the stock JSONRenderer"""
+        with mock.patch('complaints.views.orjson', None), mock.patch.object(renderers, 'orjson', None):
+            return self.get(params)
+
+    def test_every_fieldset_renders_the_same_bytes(self):
+        fieldsets = [{}, {'exclude': 'citizen_email,address'}, {'fields': 'id,department,latitude'}]
+        fieldsets += [{'fields': preset} for preset in ComplaintListSerializer.FIELD_PRESETS]
+        for params in fieldsets:
+            for page in ('1', '2'):
+                query = {**params, 'page': page}
+                with self.subTest(query=query):
+                    self.assertEqual(self.get(query), self.reference(query))
+
+    def test_filtered_and_ordered_pages_render_the_same_bytes(self):
+        for params in ({'ordering': 'priority', 'page': '2'}, {'department': 'Roads'}, {'priority': 'high'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.get(params), self.reference(params))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SparseFieldsetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Potholes', color='#112233')
+        make_complaint(category, latitude='51.507351', longitude='-0.127758')
+
+    def setUp(self):
+        self.addCleanup(caches['default'].clear)
+
+    def get(self, params):
+        """(first row, SQL of the page query) through the fast path and through the serializer"""
+        results = []
+        for fast in (True, False):
+            caches['default'].clear()
+            with mock.patch('complaints.views.orjson', renderers.orjson if fast else None), \
+                    CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/complaints/', params, HTTP_ACCEPT='application/json')
+            results.append((response.json()['results'][0], queries.captured_queries[-1]['sql']))
+        return results
+
+    def test_fields_are_resolved_in_serializer_order(self):
+        resolve = ComplaintListSerializer.resolve_fields
+        self.assertEqual(resolve('map'), ['id', 'category_color', 'status', 'latitude', 'longitude'])
+        self.assertEqual(resolve('status,nonsense,title'), ['id', 'title', 'status'])
+        self.assertEqual(resolve('table', 'citizen_name,id'), [
+            'id', 'reference_number', 'title', 'category_name', 'status', 'priority', 'department', 'created_at',
+        ])
+
+    def test_a_preset_reads_only_its_columns(self):
+        for row, sql in self.get({'fields': 'map'}):
+            self.assertEqual(list(row), ['id', 'category_color', 'status', 'latitude', 'longitude'])
+            self.assertEqual(row['category_color'], '#112233')
+            self.assertNotIn('"title"', sql)
+            self.assertNotIn('"citizen_email"', sql)
+            self.assertNotIn('"description"', sql)
+
+    def test_fields_without_relations_skip_the_join(self):
+        for row, sql in self.get({'fields': 'id,status,latitude'}):
+            self.assertEqual(list(row), ['id', 'status', 'latitude'])
+            self.assertNotIn('JOIN', sql)
+
+    def test_excluded_fields_are_not_read(self):
+        for row, sql in self.get({'exclude': 'citizen_email,address'}):
+            self.assertNotIn('citizen_email', row)
+            self.assertIn('citizen_name', row)
+            self.assertNotIn('"citizen_email"', sql)
+            self.assertNotIn('"address"', sql)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, COMPRESSION_MIN_SIZE=1024)
+class CompressionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Potholes')
+        for _ in range(10):
+            make_complaint(category)
+
+    def setUp(self):
+        self.addCleanup(caches['default'].clear)
+
+    def get(self, accept_encoding, url='/api/complaints/'):
+        return self.client.get(url, HTTP_ACCEPT='application/json', HTTP_ACCEPT_ENCODING=accept_encoding)
+
+    def test_negotiation_follows_q_values_then_server_preference(self):
+        levels = settings.COMPRESSION_LEVELS['application/json']
+        preferred = next(iter(compression.COMPRESSORS))
+        self.assertEqual(compression.choose_encoding('gzip, br, zstd', levels), preferred)
+        self.assertEqual(compression.choose_encoding('*', levels), preferred)
+        self.assertEqual(compression.choose_encoding('br;q=0.5, gzip', levels), 'gzip')
+        self.assertEqual(compression.choose_encoding('gzip;q=0, identity', levels), None)
+        self.assertEqual(compression.choose_encoding('gzip', {'br': 4}), None)
+
+    def test_large_json_is_compressed(self):
+        plain = self.get('')
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertGreater(len(plain.content), 1024)
+
+        response = self.get('gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertLess(len(response.content), len(plain.content))
+        self.assertEqual(json.loads(gzip.decompress(response.content)), plain.json())
+
+    def test_responses_under_the_threshold_are_sent_as_is(self):
+        with override_settings(COMPRESSION_MIN_SIZE=10 ** 6):
+            response = self.get('gzip')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_unlisted_content_types_are_sent_as_is(self):
+        # The browsable API's HTML carries a CSRF token
+        response = self.client.get('/api/complaints/', HTTP_ACCEPT='text/html', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', response)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class QueryCountTests(TestCase):
+    """Each endpoint runs a fixed number of queries however many complaints it returns"""
+
+    @classmethod
+    def setUpTestData(cls):
+        staff = User.objects.create_user('roads-staff')
+        for number in range(9):
+            department, _ = Department.objects.get_or_create(name=f'Department {number % 3}')
+            category, _ = Category.objects.get_or_create(name=f'Category {number % 3}', department=department)
+            complaint = make_complaint(
+                category, latitude='51.507351', longitude='-0.127758', status='resolved', assigned_to=staff,
+            )
+            for status in ('pending', 'resolved'):
+                StatusHistory.objects.create(complaint=complaint, new_status=status)
+            Feedback.objects.create(complaint=complaint, rating=4)
+        cls.complaint = complaint
+
+    def setUp(self):
+        self.addCleanup(caches['default'].clear)
+        # The department table is loaded once per process, not per request
+        departments.departments(recheck=True)
+
+    def assertQueries(self, count, url):
+        caches['default'].clear()
+        with self.assertNumQueries(count):
+            response = self.client.get(url, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_list(self):
+        # COUNT and the page
+        self.assertQueries(2, '/api/complaints/')
+        self.assertQueries(2, '/api/complaints/?fields=table')
+        # Through ComplaintListSerializer, as without orjson
+        with mock.patch('complaints.views.orjson', None):
+            self.assertQueries(2, '/api/complaints/')
+            self.assertQueries(2, '/api/complaints/?fields=table')
+
+    def test_retrieve(self):
+        # The complaint with its relations, the category with its count, the recent history
+        self.assertQueries(3, f'/api/complaints/{self.complaint.pk}/')
+        self.assertQueries(4, f'/api/complaints/{self.complaint.pk}/?include_archived=true')
+
+    def test_statistics(self):
+        # One grouped query per breakdown
+        self.assertQueries(3, '/api/complaints/statistics/')
+
+    def test_categories(self):
+        self.assertQueries(2, '/api/categories/')
+
+    def test_nearby(self):
+        self.assertQueries(1, '/api/complaints/nearby/?lat=51.5&lng=-0.12')
+
+
+@override_settings(CACHES=LOCMEM_CACHES, CLUSTER_GRID_SIZE=8)
+class ClusterTests(TestCase):
+    """At zoom 10 a tile is 0.3515625 degrees wide and a cell an eighth of that"""
+    url = '/api/complaints/clusters/?zoom=10&bbox=-0.2,51.45,-0.05,51.65'
+
+    def setUp(self):
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+        self.roads = Department.objects.create(name='Roads')
+        self.water = Department.objects.create(name='Water')
+        self.potholes = Category.objects.create(name='Potholes', department=self.roads)
+        self.leaks = Category.objects.create(name='Leaks', department=self.water)
+        make_complaint(self.potholes, latitude='51.5010', longitude='-0.1210')
+        make_complaint(self.potholes, latitude='51.5030', longitude='-0.1230', status='resolved')
+        make_complaint(self.leaks, latitude='51.5020', longitude='-0.1220')
+        make_complaint(self.leaks, latitude='51.6000', longitude='-0.1000')
+        # Outside the bbox
+        make_complaint(self.potholes, latitude='52.4862', longitude='-1.8904')
+
+    def clusters(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_counts_per_cell(self):
+        data = self.clusters()
+        self.assertEqual(data['count'], 4)
+        self.assertEqual([cluster['count'] for cluster in data['clusters']], [3, 1])
+        busy = data['clusters'][0]
+        self.assertEqual(busy['by_status'], {'pending': 2, 'resolved': 1})
+        self.assertEqual(busy['by_category'], {str(self.potholes.pk): 2, str(self.leaks.pk): 1})
+        self.assertAlmostEqual(busy['latitude'], 51.502)
+        self.assertAlmostEqual(busy['longitude'], -0.122)
+        west, south, east, north = busy['bounds']
+        self.assertTrue(west <= busy['longitude'] < east and south <= busy['latitude'] < north)
+
+    def test_department_staff_only_count_their_department(self):
+        self.assertEqual(self.clusters()['count'], 4)
+        user = User.objects.create_user('roads-staff', password='s3cret-pass')
+        user.profile.is_department_user = True
+        user.profile.department = self.roads
+        user.profile.save()
+        self.client.force_login(user)
+
+        # The tile computed for the public above is not reused
+        data = self.clusters()
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(data['clusters'][0]['by_category'], {str(self.potholes.pk): 2})
+
+    def test_bad_parameters(self):
+        for query in ('zoom=x&bbox=0,0,1,1', 'zoom=10&bbox=0,0,1', 'zoom=10&bbox=1,0,0,1', 'zoom=8&bbox=-180,-90,180,90'):
+            response = self.client.get(f'/api/complaints/clusters/?{query}')
+            self.assertEqual(response.status_code, 400, query)
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Potholes')
+        for _ in range(3):
+            make_complaint(category)
+
+    def table_statistics(self, rows):
+        """Table statistics as ANALYZE would leave them for a table of this many rows"""
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+            cursor.execute(
+                "UPDATE sqlite_stat1 SET stat = %s || substr(stat, instr(stat || ' ', ' ')) WHERE tbl = %s",
+                [str(rows), Complaint._meta.db_table],
+            )
+
+    def count(self, queryset):
+        return paginators.EstimatedCountPaginator(queryset, 25).count
+
+    def test_large_unfiltered_tables_use_the_statistics(self):
+        self.table_statistics(2_000_000)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.count(Complaint.objects.all()), 2_000_000)
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries.captured_queries))
+
+    def test_filtered_querysets_are_counted(self):
+        self.table_statistics(2_000_000)
+        self.assertEqual(self.count(Complaint.objects.filter(status='pending')), 3)
+        self.assertEqual(self.count(Complaint.objects.values('status').distinct()), 1)
+
+    def test_small_tables_and_missing_statistics_are_counted(self):
+        self.assertEqual(self.count(Complaint.objects.all()), 3)
+        self.table_statistics(500)
+        self.assertEqual(self.count(Complaint.objects.all()), 3)
+
+
+class APISchemaTests(TestCase):
+    schema = b'{"swagger": "2.0", "paths": {}}'
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_override = override_settings(API_SCHEMA_DIR=directory, DEBUG=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        api_schema._schemas.clear()
+        self.addCleanup(api_schema._schemas.clear)
+
+    def test_the_precomputed_file_is_served_without_drf_yasg(self):
+        api_schema.write({'json': self.schema, 'yaml': b'swagger: "2.0"\n'})
+        # Importing drf_yasg (or anything under it) would now raise ImportError
+        blocked = {name: None for name in sys.modules if name == 'drf_yasg' or name.startswith('drf_yasg.')}
+        with mock.patch.dict(sys.modules, {'drf_yasg': None, **blocked}):
+            response = self.client.get('/api/schema.json')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content, self.schema)
+
+            compressed = self.client.get('/api/schema.json', HTTP_ACCEPT_ENCODING='gzip')
+            self.assertEqual(compressed['Content-Encoding'], 'gzip')
+            self.assertEqual(gzip.decompress(compressed.content), self.schema)
+            self.assertNotEqual(compressed['ETag'], response['ETag'])
+
+            cached = self.client.get('/api/schema.json', HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(cached.status_code, 304)
+            self.assertEqual(self.client.get('/api/docs/', {'format': 'openapi'}).content, self.schema)
+
+    def test_a_missing_schema_is_reported(self):
+        response = self.client.get('/api/schema.json')
+        self.assertEqual(response.status_code, 503)
+        self.assertIn(b'generate_api_schema', response.content)
+
+    def test_the_command_writes_every_format(self):
+        call_command('generate_api_schema', stdout=io.StringIO())
+        schema = json.loads(self.client.get('/api/schema.json').content)
+        self.assertIn('/complaints/', schema['paths'])
+        self.assertNotIn('host', schema)
+        self.assertEqual(self.client.get('/api/schema.yaml')['Content-Type'], 'application/yaml')
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ThrottleTests(TestCase):
+    """Submission allows a burst of 5 per minute per client (THROTTLE_CREATE_BURST)"""
+    url = '/api/complaints/'
+
+    def setUp(self):
+        # Other tests share the locmem throttle cache
+        caches['throttle'].clear()
+        self.addCleanup(caches['throttle'].clear)
+
+    def submit(self, **headers):
+        # An empty body is rejected after the throttle has counted it
+        return self.client.post(self.url, {}, **headers)
+
+    def test_burst_then_429_with_retry_after(self):
+        for _ in range(5):
+            self.assertEqual(self.submit().status_code, 400)
+        response = self.submit()
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+
+    def test_forwarded_for_is_ignored_without_proxies(self):
+        statuses = [self.submit(HTTP_X_FORWARDED_FOR=f'203.0.113.{n}').status_code for n in range(6)]
+        self.assertEqual(statuses[-1], 429)
+
+    def test_proxied_clients_get_their_own_buckets(self):
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1}):
+            for _ in range(5):
+                self.submit(HTTP_X_FORWARDED_FOR='198.51.100.1, 203.0.113.1')
+            self.assertEqual(self.submit(HTTP_X_FORWARDED_FOR='spoofed, 203.0.113.1').status_code, 429)
+            self.assertEqual(self.submit(HTTP_X_FORWARDED_FOR='203.0.113.2').status_code, 400)
+
+    def test_async_fallback_takes_one_token(self):
+        """Nearby allows 30 per minute; the browsable API falls back to the sync view"""
+        def nearby():
+            request = RequestFactory().get('/api/complaints/nearby/?lat=1&lng=1', HTTP_ACCEPT='text/html')
+            request.user = AnonymousUser()
+            return async_to_sync(async_views.complaint_nearby)(request).status_code
+
+        statuses = [nearby() for _ in range(31)]
+        self.assertNotIn(429, statuses[:30])
+        self.assertEqual(statuses[30], 429)
+
+
+class DepartmentTableTests(SharedVersionsTestCase):
+    def test_a_department_added_in_another_worker_is_accepted(self):
+        Department.objects.create(name='Roads')
+        self.assertIsNone(departments.department_id('Water'))
+        # Added elsewhere: no post_save receiver runs in this process
+        Department.objects.bulk_create([Department(name='Water')])
+        self.bump_in_another_worker('departments')
+
+        water = Department.objects.get(name='Water')
+        self.assertEqual(departments.department_id('Water'), water.pk)
+        self.assertEqual(departments.department_name(water.pk), 'Water')
+
+    def test_a_rename_in_another_worker_shows_up_at_the_next_check(self):
+        roads = Department.objects.create(name='Roads')
+        self.assertEqual(departments.department_name(roads.pk), 'Roads')
+        Department.objects.filter(pk=roads.pk).update(name='Highways')
+        self.bump_in_another_worker('departments')
+
+        self.assertEqual(departments.departments(recheck=True)[roads.pk], 'Highways')
+
+    def test_registration_accepts_a_new_department(self):
+        Department.objects.create(name='Roads')
+        departments.departments()
+        Department.objects.bulk_create([Department(name='Water')])
+        self.bump_in_another_worker('departments')
+
+        response = self.client.post('/api/auth/register-department/', {
+            'username': 'water-staff', 'email': 'staff@example.com', 'password': 'Unusual-pass-42',
+            'password2': 'Unusual-pass-42', 'first_name': 'W', 'last_name': 'S', 'department': 'Water',
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def test_an_unknown_department_matches_nothing(self):
+        roads = Department.objects.create(name='Roads')
+        make_complaint(Category.objects.create(name='Potholes', department=roads))
+        make_complaint(Category.objects.create(name='Other'))
+
+        self.assertEqual(self.client.get('/api/complaints/', {'department': 'Roads'}).json()['count'], 1)
+        self.assertEqual(self.client.get('/api/complaints/', {'department': 'Typo'}).json()['count'], 0)
+        statistics = self.client.get('/api/complaints/statistics/', {'department': 'Typo'}).json()
+        self.assertEqual(statistics['total_complaints'], 0)
+
+
+class SLATests(SharedVersionsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.category = Category.objects.create(name='Roads')
+        SLAPolicy.objects.create(status='pending', hours=48)
+        SLAPolicy.objects.create(status='pending', priority='high', hours=8)
+
+    def hours_left(self, complaint):
+        return round((complaint.due_at - timezone.now()).total_seconds() / 3600)
+
+    def test_due_at_follows_the_most_specific_policy(self):
+        self.assertEqual(self.hours_left(make_complaint(self.category)), 48)
+        self.assertEqual(self.hours_left(make_complaint(self.category, priority='high')), 8)
+        self.assertIsNone(make_complaint(self.category, status='in_progress').due_at)
+
+    def test_changing_priority_restarts_the_clock(self):
+        complaint = make_complaint(self.category)
+        complaint.priority = 'high'
+        complaint.save()
+        self.assertEqual(self.hours_left(complaint), 8)
+
+    def test_saving_a_deferred_load_keeps_the_deadline(self):
+        complaint = make_complaint(self.category, priority='high')
+        due_at = complaint.due_at - timedelta(hours=1)
+        Complaint.objects.filter(pk=complaint.pk).update(due_at=due_at)
+
+        for partial in (Complaint.objects.only('id', 'title'), Complaint.objects.defer('status', 'priority')):
+            loaded = partial.get(pk=complaint.pk)
+            loaded.title = 'Renamed'
+            loaded.save()
+            self.assertEqual(Complaint.objects.get(pk=complaint.pk).due_at, due_at)
+
+    def test_assigning_a_deferred_field_compares_with_the_stored_value(self):
+        complaint = make_complaint(self.category)
+        loaded = Complaint.objects.only('id').get(pk=complaint.pk)
+        loaded.priority = 'medium'
+        loaded.save()
+        self.assertEqual(Complaint.objects.get(pk=complaint.pk).due_at, complaint.due_at)
+
+        loaded.priority = 'high'
+        loaded.save()
+        self.assertEqual(self.hours_left(Complaint.objects.get(pk=complaint.pk)), 8)
+
+    def test_overdue_complaints_escalate_until_critical(self):
+        complaint = make_complaint(self.category, priority='high')
+        later = timezone.now() + timedelta(hours=9)
+        self.assertEqual([c.pk for c in sla.escalate_overdue(now=later)], [complaint.pk])
+        complaint.refresh_from_db()
+        self.assertEqual(complaint.priority, 'critical')
+        self.assertEqual(complaint.due_at, later + timedelta(hours=48))
+
+        sla.escalate_overdue(now=later + timedelta(hours=49))
+        complaint.refresh_from_db()
+        self.assertEqual(complaint.priority, 'critical')
+        self.assertIsNone(complaint.due_at)
+        self.assertEqual(sla.escalate_overdue(now=later + timedelta(days=30)), [])
+        self.assertEqual(StatusHistory.objects.filter(complaint=complaint).count(), 2)
+
+    def test_complaints_changed_after_the_read_are_not_escalated(self):
+        resolved = make_complaint(self.category, priority='high')
+        reprioritised = make_complaint(self.category, priority='high')
+        overdue = make_complaint(self.category, priority='high')
+        later = timezone.now() + timedelta(hours=9)
+
+        def changed_meanwhile(*args):
+            # Saved by another request between the escalation's SELECT and UPDATE
+            if not Complaint.objects.filter(pk=resolved.pk, status='resolved').exists():
+                Complaint.objects.filter(pk=resolved.pk).update(status='resolved', due_at=None)
+                Complaint.objects.filter(pk=reprioritised.pk).update(priority='low', due_at=later - timedelta(hours=1))
+            return later + timedelta(hours=48)
+
+        with mock.patch.object(sla, 'deadline', changed_meanwhile):
+            self.assertEqual([c.pk for c in sla.escalate_overdue(now=later)], [overdue.pk])
+        self.assertEqual(Complaint.objects.get(pk=resolved.pk).priority, 'high')
+        self.assertEqual(Complaint.objects.get(pk=reprioritised.pk).priority, 'low')
+        self.assertEqual(Complaint.objects.get(pk=overdue.pk).priority, 'critical')
+        self.assertEqual(list(StatusHistory.objects.values_list('complaint_id', flat=True)), [overdue.pk])
+
+    def test_a_policy_changed_in_another_worker_is_used(self):
+        self.assertEqual(sla.allowed_hours('pending', self.category.pk, ''), 48)
+        # Changed elsewhere: no post_save receiver runs in this process
+        SLAPolicy.objects.filter(priority='').update(hours=24)
+        self.bump_in_another_worker('sla-policies')
+        sla._policies.get(recheck=True)
+        self.assertEqual(sla.allowed_hours('pending', self.category.pk, ''), 24)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, ASSIGNMENT_MAX_OPEN=50)
+class AssignmentTests(TestCase):
+    def setUp(self):
+        self.addCleanup(caches['versions'].clear)
+        self.department = Department.objects.create(name='Roads')
+        self.category = Category.objects.create(name='Potholes', department=self.department)
+        self.staff = [self.department_user(name) for name in ('alice', 'bob')]
+
+    def department_user(self, username):
+        user = User.objects.create_user(username, password='s3cret-pass')
+        user.profile.is_department_user = True
+        user.profile.department = self.department
+        user.profile.save()
+        return user
+
+    def assign_all(self):
+        return assignment.assign_batch(assignment.LoadIndex(), list(assignment.unassigned_complaints()))
+
+    def test_complaints_go_to_the_least_loaded_staff(self):
+        alice, bob = self.staff
+        make_complaint(self.category, priority='high', status='in_progress', assigned_to=alice)
+        first, second, third, fourth = [make_complaint(self.category, priority='medium') for _ in range(4)]
+
+        # Weighted loads: alice starts at 3, each medium complaint adds 2
+        self.assertEqual(self.assign_all(), {bob.pk: [first.pk, second.pk, fourth.pk], alice.pk: [third.pk]})
+        self.assertEqual(Complaint.objects.filter(assigned_to=alice).count(), 2)
+        self.assertEqual(Complaint.objects.filter(assigned_to=bob).count(), 3)
+
+    def test_equal_loads_go_to_whoever_works_nearest(self):
+        alice, bob = self.staff
+        make_complaint(self.category, status='in_progress', assigned_to=alice, latitude=51.50, longitude=-0.12)
+        make_complaint(self.category, status='in_progress', assigned_to=bob, latitude=53.48, longitude=-2.24)
+        north = make_complaint(self.category, latitude=53.47, longitude=-2.25)
+        south = make_complaint(self.category, latitude=51.51, longitude=-0.13)
+
+        self.assertEqual(self.assign_all(), {bob.pk: [north.pk], alice.pk: [south.pk]})
+
+    def test_nobody_is_given_more_than_the_max_open(self):
+        for _ in range(5):
+            make_complaint(self.category)
+        with self.settings(ASSIGNMENT_MAX_OPEN=2):
+            plan = self.assign_all()
+        self.assertEqual([len(ids) for ids in plan.values()], [2, 2])
+        self.assertEqual(Complaint.objects.filter(assigned_to__isnull=True).count(), 1)
+
+    def test_dry_run_plans_without_saving(self):
+        make_complaint(self.category)
+        plan = assignment.assign_batch(assignment.LoadIndex(), list(assignment.unassigned_complaints()), dry_run=True)
+        self.assertEqual(sum(len(ids) for ids in plan.values()), 1)
+        self.assertFalse(Complaint.objects.filter(assigned_to__isnull=False).exists())
+
+    def test_rows_changed_before_the_update_do_not_count_as_load(self):
+        taken = make_complaint(self.category)
+        closed = make_complaint(self.category)
+        left = make_complaint(self.category)
+        index = assignment.LoadIndex()
+        rows = list(assignment.unassigned_complaints())
+        # A supervisor gets there first
+        Complaint.objects.filter(pk=taken.pk).update(assigned_to=self.staff[0])
+        Complaint.objects.filter(pk=closed.pk).update(status='rejected')
+
+        plan = assignment.assign_batch(index, rows)
+        self.assertEqual(list(itertools.chain(*plan.values())), [left.pk])
+        self.assertEqual(sum(member.open_count for member in index.staff.values()), 1)
+        self.assertEqual(
+            sum(member.load for member in index.staff.values()), settings.ASSIGNMENT_PRIORITY_WEIGHTS[left.priority]
+        )
+
+
+class DepartmentMigrationTests(TransactionTestCase):
+    """complaints.0009 and accounts.0003 turn department names into Department rows"""
+    before = [('complaints', '0008_cold_storage'), ('accounts', '0002_userprofile_department_and_more')]
+    after = [('complaints', '0009_departments'), ('accounts', '0003_userprofile_department_fk')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def setUp(self):
+        apps = self.migrate(self.before)
+        self.addCleanup(self.migrate, self.after)
+
+        Category = apps.get_model('complaints', 'Category')
+        Complaint = apps.get_model('complaints', 'Complaint')
+        User = apps.get_model('auth', 'User')
+        UserProfile = apps.get_model('accounts', 'UserProfile')
+
+        roads = Category.objects.create(name='Potholes', department='Roads')
+        Category.objects.create(name='Streetlights', department=' roads ')
+        Category.objects.create(name='Misc', department='')
+        for number, department in enumerate(['Roads', 'Roads', 'ROADS', '']):
+            Complaint.objects.create(
+                title='Issue', description='Details', category=roads, department=department,
+                citizen_name='Citizen', citizen_email='citizen@example.com', reference_number=f'MIG{number}',
+            )
+        for username, department in [('roads-staff', 'roads'), ('parks-staff', 'Parks  Dept'), ('citizen', '')]:
+            UserProfile.objects.create(user=User.objects.create(username=username), department=department)
+
+    def test_names_become_rows_and_references(self):
+        apps = self.migrate(self.after)
+        Department = apps.get_model('complaints', 'Department')
+        Category = apps.get_model('complaints', 'Category')
+        Complaint = apps.get_model('complaints', 'Complaint')
+        UserProfile = apps.get_model('accounts', 'UserProfile')
+
+        # Spellings differing in case or spacing merge; the most used one names the row
+        self.assertEqual(
+            sorted(Department.objects.values_list('name', flat=True)), ['ADMIN STAFF', 'Parks Dept', 'Roads']
+        )
+        roads = Department.objects.get(name='Roads').pk
+        self.assertEqual(
+            dict(Category.objects.values_list('name', 'department_id')),
+            {'Potholes': roads, 'Streetlights': roads, 'Misc': None},
+        )
+        self.assertEqual(
+            sorted(Complaint.objects.values_list('department_id', flat=True), key=str),
+            sorted([roads, roads, roads, None], key=str),
+        )
+        self.assertEqual(dict(UserProfile.objects.values_list('user__username', 'department__name')), {
+            'roads-staff': 'Roads', 'parks-staff': 'Parks Dept', 'citizen': None,
+        })
+
+    def test_reverse_restores_the_names(self):
+        self.migrate(self.after)
+        apps = self.migrate(self.before)
+        Category = apps.get_model('complaints', 'Category')
+        self.assertEqual(Category.objects.get(name='Streetlights').department, 'Roads')
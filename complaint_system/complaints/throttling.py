@@ -0,0 +1,96 @@
+"""
+Token-bucket throttles for the public complaint endpoints.
+
+Each endpoint class (submission, nearby, statistics, search) has a burst and a
+sustained scope in REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']. A rate of N/period
+is a bucket holding N tokens that refills evenly over the period, so clients
+can spend a burst at once but not exceed the average. Buckets are kept per
+client IP and, when the request carries a session cookie, per session too.
+The IP is REMOTE_ADDR, or behind NUM_PROXIES proxies the X-Forwarded-For
+entry the nearest of them added; entries a client sends itself are ignored,
+so it can't pick a fresh bucket per request.
+
+Clients are identified from the request line and cookies only, and the
+throttles run before authentication, so a rejected request never reaches the
+database. Buckets live in the THROTTLE_CACHE_ALIAS cache, which is file based
+by default (config.cache) so every worker on the host sees the same state.
+"""
+import hashlib
+import math
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import SimpleRateThrottle
+
+
+THROTTLE_WINDOWS = ('burst', 'sustained')
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """One bucket per client key for a single rate scope"""
+    cache_format = 'throttle:%(scope)s:%(ident)s'
+
+    def __init__(self, scope):
+        self.scope = scope
+        super().__init__()
+        self.cache = caches[settings.THROTTLE_CACHE_ALIAS]
+        self.wait_seconds = None
+
+    def get_cache_key(self, request, view):
+        # Unused: a request can map to several buckets, see client_keys()
+        return None
+
+    def client_keys(self, request):
+        idents = [f'ip:{self.get_ident(request)}']
+        session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        if session_key:
+            idents.append('session:' + hashlib.md5(session_key.encode()).hexdigest())
+        return [self.cache_format % {'scope': self.scope, 'ident': ident} for ident in idents]
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        capacity = self.num_requests
+        refill = self.num_requests / self.duration
+        now = self.timer()
+        keys = self.client_keys(request)
+        buckets = self.cache.get_many(keys)
+
+        updated = {}
+        wait = 0
+        for key in keys:
+            tokens, stamp = buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - stamp) * refill)
+            if tokens < 1:
+                wait = max(wait, (1 - tokens) / refill)
+            updated[key] = (tokens - 1, now)
+
+        if wait:
+            self.wait_seconds = wait
+            return False
+        # An idle bucket is full again after one period, so let it expire then
+        self.cache.set_many(updated, math.ceil(self.duration))
+        return True
+
+    def wait(self):
+        return self.wait_seconds
+
+
+def bucket_throttles(scope):
+    """Burst and sustained throttles for an endpoint class"""
+    return [TokenBucketThrottle(f'{scope}_{window}') for window in THROTTLE_WINDOWS]
+
+
+class ThrottleBeforeAuthMixin:
+    """Check throttles ahead of authentication, which may query the session and user tables"""
+
+    def perform_authentication(self, request):
+        self.check_throttles(request)
+        super().perform_authentication(request)
+
+    def check_throttles(self, request):
+        if getattr(request, '_throttles_checked', False):
+            return
+        request._throttles_checked = True
+        super().check_throttles(request)
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import CategoryViewSet, ComplaintViewSet
@@ -6,6 +7,18 @@ router = DefaultRouter()
 router.register(r'categories', CategoryViewSet, basename='category')
 router.register(r'complaints', ComplaintViewSet, basename='complaint')
 
-urlpatterns = [
+urlpatterns = []
+
+# Async read paths for ASGI serving; they take precedence over the router
+if settings.ASYNC_READ_VIEWS:
+    from . import async_views
+    urlpatterns += [
+        path('complaints/', async_views.complaint_collection),
+        path('complaints/nearby/', async_views.complaint_nearby),
+        path('complaints/statistics/', async_views.complaint_statistics_view),
+        path('complaints/<int:pk>/', async_views.complaint_detail),
+    ]
+
+urlpatterns += [
     path('', include(router.urls)),
 ]
@@ -1,11 +1,22 @@
+from django.conf import settings
+from django.http import Http404
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
-from django.db.models import Q
+from rest_framework.settings import api_settings
+from django.db.models import Q, Count, Prefetch
 from math import radians, cos, sin, asin, sqrt
 
-from .models import Category, Complaint, Feedback
+from monitoring import metrics
+
+from .models import ArchivedStatusHistory, Category, Complaint, StatusHistory, Feedback
+from .fast_serializers import ComplaintListRows
+from .renderers import ORJSONRenderer, orjson
+from . import clusters, cold_storage
+from .cache import cache_response, data_cache_key, get_cache
+from .departments import department_id, department_name
+from .throttling import ThrottleBeforeAuthMixin, bucket_throttles
 from .serializers import (
     CategorySerializer,
     ComplaintListSerializer,
@@ -20,12 +31,20 @@ class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
     """
     API endpoint for viewing complaint categories
     """
-    queryset = Category.objects.all()
+    queryset = Category.objects.annotate(complaint_count=Count('complaints')).order_by('name')
     serializer_class = CategorySerializer
     permission_classes = [AllowAny]
+    
+    @cache_response('categories', 'complaints')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+    
+    @cache_response('categories', 'complaints')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
 
-class ComplaintViewSet(viewsets.ModelViewSet):
+class ComplaintViewSet(ThrottleBeforeAuthMixin, viewsets.ModelViewSet):
     """
     API endpoint for complaint management
     
@@ -34,15 +53,25 @@ class ComplaintViewSet(viewsets.ModelViewSet):
     retrieve: Get complaint details
     update: Update complaint (admin only)
     """
-    queryset = Complaint.objects.all().select_related('category').prefetch_related('status_history', 'feedback')
+    queryset = Complaint.objects.all()
     permission_classes = [AllowAny]  # Allow public submission
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['title', 'description', 'reference_number', 'address']
     ordering_fields = ['created_at', 'updated_at', 'priority']
     ordering = ['-created_at']
     
+    # Most recent status changes embedded in detail responses
+    status_history_limit = 50
+    
+    # Throttle scope per public endpoint class; searches are throttled on list
+    throttle_scopes = {
+        'create': 'complaint_create',
+        'nearby': 'complaint_nearby',
+        'statistics': 'complaint_statistics',
+    }
+    
     def get_serializer_class(self):
-        if self.action == 'list':
+        if self.action in ['list', 'nearby']:
             return ComplaintListSerializer
         elif self.action == 'create':
             return ComplaintCreateSerializer
@@ -58,16 +87,92 @@ class ComplaintViewSet(viewsets.ModelViewSet):
             return [IsAdminUser()]
         return [AllowAny()]
     
-    def get_queryset(self):
+    def get_throttles(self):
+        scope = self.throttle_scopes.get(self.action)
+        if self.action == 'list' and self.request.query_params.get(api_settings.SEARCH_PARAM):
+            scope = 'complaint_search'
+        if scope is None:
+            return []
+        return bucket_throttles(scope)
+    
+    def with_detail_relations(self, queryset):
+        """Load everything ComplaintDetailSerializer reads in a fixed number of queries"""
+        history = StatusHistory.objects.select_related('changed_by').order_by('-created_at')
+        queryset = queryset.select_related('assigned_to', 'feedback', 'parent').prefetch_related(
+            Prefetch('category', queryset=Category.objects.annotate(complaint_count=Count('complaints'))),
+            Prefetch('status_history', queryset=history[:self.status_history_limit], to_attr='recent_status_history'),
+        )
+        if self.include_archived_history():
+            archived = ArchivedStatusHistory.objects.select_related('changed_by').order_by('-created_at')
+            queryset = queryset.prefetch_related(
+                Prefetch('archived_status_history', queryset=archived[:self.status_history_limit],
+                         to_attr='archived_status_history_rows'),
+            )
+        return queryset
+    
+    def include_archived_history(self):
+        """?include_archived=true adds archived status history to detail responses"""
+        request = getattr(self, 'request', None)
+        if request is None:
+            return False
+        return request.query_params.get('include_archived', '').lower() in ('1', 'true', 'yes')
+    
+    def get_base_queryset(self):
+        """Only join/prefetch what the current action's serializer needs"""
         queryset = super().get_queryset()
-        
-        # Enforce department filtering for department staff
+        if self.action == 'list':
+            return self.only_sparse_columns(queryset.select_related('category'))
+        if self.action in ['statistics', 'clusters']:
+            return queryset
+        if self.action == 'submit_feedback':
+            return queryset.select_related('feedback')
+        return self.with_detail_relations(queryset)
+    
+    def get_sparse_fields(self):
+        """List fields picked with ?fields= (names or a preset) and ?exclude=, or None for all"""
+        params = self.request.query_params
+        if not params.get('fields') and not params.get('exclude'):
+            return None
+        return ComplaintListSerializer.resolve_fields(params.get('fields'), params.get('exclude'))
+    
+    def only_sparse_columns(self, queryset, extra_columns=()):
+        """Push the requested fieldset down to SQL so unused columns are never read"""
+        fields = self.get_sparse_fields()
+        if fields is None:
+            return queryset
+        columns = ComplaintListSerializer.model_columns(fields) + list(extra_columns)
+        if not any('__' in column for column in columns):
+            queryset = queryset.select_related(None)
+        return queryset.only(*columns)
+    
+    def get_serializer(self, *args, **kwargs):
+        if self.action in ['list', 'nearby']:
+            kwargs.setdefault('fields', self.get_sparse_fields())
+        return super().get_serializer(*args, **kwargs)
+    
+    def use_fast_path(self):
+        """values()-based list rendering only applies when orjson renders the response"""
+        return orjson is not None and isinstance(getattr(self.request, 'accepted_renderer', None), ORJSONRenderer)
+    
+    def scoped_department(self):
+        """Id of the only department department staff may see, or None"""
         user = self.request.user
+        claims = self.request.auth
+        if isinstance(claims, dict):
+            # Signed-token clients carry their role in the token (accounts/tokens.py)
+            return (claims['role'] == 'department' and claims['dept']) or None
         if user.is_authenticated and not user.is_staff:
             if hasattr(user, 'profile') and user.profile.is_department_user:
-                department = user.profile.department
-                if department:
-                    queryset = queryset.filter(department=department)
+                return user.profile.department_id
+        return None
+    
+    def get_queryset(self):
+        queryset = self.get_base_queryset()
+        
+        # Enforce department filtering for department staff
+        department = self.scoped_department()
+        if department:
+            queryset = queryset.filter(department=department)
         
         # Filter by status
         status_filter = self.request.query_params.get('status', None)
@@ -84,22 +189,38 @@ class ComplaintViewSet(viewsets.ModelViewSet):
         if priority:
             queryset = queryset.filter(priority=priority)
         
-        # Filter by department
+        # Filter by department name; unknown names match nothing
         department = self.request.query_params.get('department', None)
         if department:
-            queryset = queryset.filter(department=department)
+            pk = department_id(department)
+            # Without the check, department=None would list the unassigned complaints
+            queryset = queryset.filter(department=pk) if pk is not None else queryset.none()
         
         return queryset
     
+    @cache_response('complaints', 'categories')
+    def list(self, request, *args, **kwargs):
+        """List complaints, skipping model instances and serializer fields when possible"""
+        if not self.use_fast_path():
+            return super().list(request, *args, **kwargs)
+        
+        rows = ComplaintListRows(self.get_sparse_fields())
+        queryset = rows.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(rows.build(page))
+        return Response(rows.build(queryset))
+    
     def create(self, request, *args, **kwargs):
         """Create complaint and send notification"""
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         complaint = serializer.save()
         
-        # Send notification to admin
-        from notifications.email_service import send_new_complaint_notification
-        send_new_complaint_notification(complaint)
+        # Send notification to admin; duplicates ride on the original's notification
+        if complaint.parent_id is None:
+            from notifications.email_service import send_new_complaint_notification
+            send_new_complaint_notification(complaint)
         
         # Return detailed response
         response_serializer = ComplaintDetailSerializer(complaint, context={'request': request})
@@ -130,6 +251,8 @@ class ComplaintViewSet(viewsets.ModelViewSet):
             from notifications.email_service import send_status_update_notification
             send_status_update_notification(complaint)
         
+        # Reload so the response includes the history entry written by the serializer
+        complaint = self.with_detail_relations(Complaint.objects.all()).get(pk=complaint.pk)
         response_serializer = ComplaintDetailSerializer(complaint, context={'request': request})
         return Response(response_serializer.data)
     
@@ -159,31 +282,24 @@ class ComplaintViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'], permission_classes=[AllowAny])
     def nearby(self, request):
         """Find complaints near a location"""
-        lat = request.query_params.get('lat', None)
-        lng = request.query_params.get('lng', None)
-        radius = float(request.query_params.get('radius', 5))  # Default 5 km
-        
-        if not lat or not lng:
-            return Response(
-                {'error': 'lat and lng parameters are required'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        try:
-            lat = float(lat)
-            lng = float(lng)
-        except ValueError:
-            return Response(
-                {'error': 'Invalid latitude or longitude'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        params = self.nearby_params(request)
+        if isinstance(params, Response):
+            return params
+        lat, lng, radius = params
         
         # Get complaints with location data
-        complaints = Complaint.objects.filter(
+        complaints = Complaint.objects.select_related('category').filter(
             latitude__isnull=False,
             longitude__isnull=False
         )
         
+        if self.use_fast_path():
+            rows = ComplaintListRows(self.get_sparse_fields())
+            values = complaints.values_list('latitude', 'longitude', *rows.columns)
+            return Response(rows.build(self.within_radius(values, lat, lng, radius)))
+        
+        complaints = self.only_sparse_columns(complaints, extra_columns=['latitude', 'longitude'])
+        
         # Filter by distance (simple haversine calculation)
         nearby_complaints = []
         for complaint in complaints:
@@ -194,31 +310,116 @@ class ComplaintViewSet(viewsets.ModelViewSet):
             if distance <= radius:
                 nearby_complaints.append(complaint)
         
-        serializer = ComplaintListSerializer(nearby_complaints, many=True, context={'request': request})
+        serializer = self.get_serializer(nearby_complaints, many=True)
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'], permission_classes=[AllowAny])
+    @cache_response('complaints', 'categories')
     def statistics(self, request):
         """Get complaint statistics (Respects department filtering)"""
         queryset = self.get_queryset()
         
-        total = queryset.count()
-        by_status = {}
-        for status_choice, _ in Complaint.STATUS_CHOICES:
-            by_status[status_choice] = queryset.filter(status=status_choice).count()
+        status_counts, category_counts, department_counts = self.statistics_queries(queryset)
+        return Response(self.statistics_payload(status_counts, category_counts, department_counts))
+    
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny])
+    def clusters(self, request):
+        """Complaint counts per map grid cell for ?bbox=min_lng,min_lat,max_lng,max_lat&zoom="""
+        try:
+            zoom, bbox = clusters.parse_params(request.query_params)
+            tiles = clusters.tiles_for(zoom, bbox)
+        except clusters.ClusterParamError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
         
-        by_category = {}
-        # Only show categories that have complaints in the current filtered queryset
-        categories = Category.objects.filter(complaints__in=queryset).distinct()
-        for category in categories:
-            by_category[category.name] = queryset.filter(category=category).count()
+        # Tiles are cached separately so panning only aggregates the new ones
+        cache = get_cache()
+        prefix = data_cache_key(self, request, ['complaints'], ignore=['bbox'])
+        keys = {tile: f'{prefix}:{tile[0]}:{tile[1]}' for tile in tiles}
+        cached = cache.get_many(keys.values())
+        missing = [tile for tile in tiles if keys[tile] not in cached]
+        metrics.inc('cache_requests_total', {'cache': 'cluster_tiles', 'result': 'hit'}, len(tiles) - len(missing))
+        metrics.inc('cache_requests_total', {'cache': 'cluster_tiles', 'result': 'miss'}, len(missing))
+        if missing:
+            computed = clusters.aggregate(self.filter_queryset(self.get_queryset()), zoom, missing)
+            fresh = {keys[tile]: cells for tile, cells in computed.items()}
+            cache.set_many(fresh, settings.RESPONSE_CACHE_TIMEOUT)
+            cached.update(fresh)
         
+        cells = [cell for tile in tiles for cell in cached[keys[tile]]]
         return Response({
-            'total_complaints': total,
-            'by_status': by_status,
-            'by_category': by_category,
+            'zoom': zoom,
+            'cell_size': clusters.cell_size(zoom),
+            'bbox': clusters.tiles_bbox(zoom, tiles),
+            'count': sum(cell['count'] for cell in cells),
+            'clusters': cells,
         })
     
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny],
+            url_path=r'reference/(?P<reference_number>[\w-]+)')
+    @cache_response('complaints', 'categories')
+    def by_reference(self, request, reference_number=None):
+        """Complaint details by reference number, including complaints moved to cold storage"""
+        complaint = self.get_queryset().filter(reference_number=reference_number).first()
+        if complaint is None:
+            complaint = cold_storage.lookup(reference_number)
+            department = self.scoped_department()
+            if complaint is None or (department and complaint.department_id != department):
+                raise Http404('No Complaint matches the given query.')
+        serializer = ComplaintDetailSerializer(complaint, context={'request': request})
+        return Response(serializer.data)
+    
+    def statistics_queries(self, queryset):
+        """One grouped query per breakdown instead of one COUNT per status/category"""
+        by_status = queryset.order_by().values_list('status').annotate(count=Count('id'))
+        # Only categories that have complaints in the current filtered queryset
+        by_category = queryset.order_by('category__name').values_list('category__name').annotate(count=Count('id'))
+        # Grouped on the integer key; names come from the cached department table
+        by_department = queryset.order_by().values_list('department').annotate(count=Count('id'))
+        return by_status, by_category, by_department
+    
+    def statistics_payload(self, status_counts, category_counts, department_counts):
+        status_counts = dict(status_counts)
+        by_status = {}
+        for status_choice, _ in Complaint.STATUS_CHOICES:
+            by_status[status_choice] = status_counts.get(status_choice, 0)
+        
+        return {
+            'total_complaints': sum(status_counts.values()),
+            'by_status': by_status,
+            'by_category': dict(category_counts),
+            'by_department': dict(sorted(
+                (department_name(pk) or 'Unassigned', count) for pk, count in department_counts
+            )),
+        }
+    
+    def nearby_params(self, request):
+        """(lat, lng, radius) from the query string, or an error Response"""
+        lat = request.query_params.get('lat', None)
+        lng = request.query_params.get('lng', None)
+        radius = float(request.query_params.get('radius', 5))  # Default 5 km
+        
+        if not lat or not lng:
+            return Response(
+                {'error': 'lat and lng parameters are required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            return float(lat), float(lng), radius
+        except ValueError:
+            return Response(
+                {'error': 'Invalid latitude or longitude'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+    
+    def within_radius(self, values, lat, lng, radius):
+        """Rows of (latitude, longitude, *columns) within radius km, without the coordinates"""
+        nearby_rows = []
+        for row in values:
+            if self._calculate_distance(lat, lng, float(row[0]), float(row[1])) <= radius:
+                nearby_rows.append(row[2:])
+        return nearby_rows
+    
     def _calculate_distance(self, lat1, lon1, lat2, lon2):
         """Calculate distance between two points using Haversine formula (in km)"""
         lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
@@ -0,0 +1,166 @@
+"""
+Precomputed OpenAPI schema and the documentation pages that read it.
+
+drf_yasg builds the schema by introspecting every viewset and serializer,
+which is too slow to repeat per request on a public URL. The
+`generate_api_schema` command runs it once at deploy time and writes
+openapi.json and openapi.yaml to API_SCHEMA_DIR, each next to gzip and brotli
+copies. The views below serve those files with an ETag, choose the
+compressed copy the client accepts, and hold everything in memory after the
+first read. Swagger UI and ReDoc are drf_yasg's own templates and static
+files, pointed at /api/schema.json.
+
+drf_yasg is only imported to generate the schema: by the command, or by the
+first request for it when DEBUG is on, so schema changes show up after the
+dev server reloads.
+"""
+import gzip
+import hashlib
+import json
+import os
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.shortcuts import render
+from django.test import RequestFactory
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+
+from .middleware import choose_encoding
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+TITLE = 'Municipal Complaint System API'
+FORMATS = {
+    'json': 'application/json',
+    'yaml': 'application/yaml',
+}
+# Compressed copies written next to each file, by encoding: file extension
+ENCODINGS = {'br': 'br', 'gzip': 'gz'}
+
+_schemas = {}
+
+
+def generate():
+    """{format: bytes} of the schema, built by drf_yasg"""
+    from drf_yasg import openapi
+    from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+    from drf_yasg.generators import OpenAPISchemaGenerator
+    from rest_framework.request import Request
+
+    info = openapi.Info(
+        title=TITLE,
+        default_version='v1',
+        description="Smart Complaint & Issue Tracking System for E-Governance",
+        contact=openapi.Contact(email="admin@complaints.gov.in"),
+        license=openapi.License(name="MIT License"),
+    )
+    # Views read request.user and query params; describe the API as an anonymous client sees it
+    request = Request(RequestFactory().get(reverse('schema-json')))
+    # The url only sets host and schemes, which are dropped: without them the
+    # docs call the API on whichever host served them
+    schema = OpenAPISchemaGenerator(info, url='http://localhost').get_schema(request=request, public=True)
+    schema.pop('host', None)
+    schema.pop('schemes', None)
+    return {
+        'json': OpenAPICodecJson(validators=[]).encode(schema),
+        'yaml': OpenAPICodecYaml(validators=[]).encode(schema),
+    }
+
+
+def compress(encoding, data):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def write(schemas):
+    """Write each format and its compressed copies to API_SCHEMA_DIR"""
+    directory = settings.API_SCHEMA_DIR
+    os.makedirs(directory, exist_ok=True)
+    for name, data in schemas.items():
+        variants = {f'openapi.{name}': data}
+        for encoding, extension in ENCODINGS.items():
+            if encoding != 'br' or brotli is not None:
+                variants[f'openapi.{name}.{extension}'] = compress(encoding, data)
+        for filename, content in variants.items():
+            path = os.path.join(directory, filename)
+            with open(f'{path}.tmp', 'wb') as schema_file:
+                schema_file.write(content)
+            os.replace(f'{path}.tmp', path)
+
+
+def read(name):
+    """{encoding or None: bytes} for one format, from API_SCHEMA_DIR"""
+    base = os.path.join(settings.API_SCHEMA_DIR, f'openapi.{name}')
+    with open(base, 'rb') as schema_file:
+        variants = {None: schema_file.read()}
+    for encoding, extension in ENCODINGS.items():
+        try:
+            with open(f'{base}.{extension}', 'rb') as schema_file:
+                variants[encoding] = schema_file.read()
+        except FileNotFoundError:
+            pass
+    return variants
+
+
+def load(name):
+    """(variants, etag) for a format; generated in-process only when DEBUG is on"""
+    if name not in _schemas:
+        if settings.DEBUG:
+            write(generate())
+        variants = read(name)
+        _schemas[name] = variants, hashlib.sha1(variants[None]).hexdigest()[:16]
+    return _schemas[name]
+
+
+def schema_view(request, format):
+    try:
+        variants, etag = load(format)
+    except FileNotFoundError:
+        return HttpResponse(
+            'The API schema has not been generated; run `python manage.py generate_api_schema`.\n',
+            status=503,
+            content_type='text/plain',
+        )
+
+    encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''), variants)
+    # Each representation gets its own strong ETag
+    tag = f'"{etag}-{encoding}"' if encoding else f'"{etag}"'
+    response = get_conditional_response(request, etag=tag)
+    if response is None:
+        response = HttpResponse(variants[encoding], content_type=FORMATS[format])
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = tag
+    response['Cache-Control'] = 'public, max-age=0, must-revalidate'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+def ui_context(request):
+    spec_url = request.build_absolute_uri(reverse('schema-json'))
+    return {
+        'title': TITLE,
+        'swagger_settings': json.dumps({'url': spec_url, 'docExpansion': 'list', 'deepLinking': False}),
+        'redoc_settings': json.dumps({'url': spec_url, 'lazyRendering': False, 'hideHostname': False}),
+        'oauth2_config': json.dumps({}),
+        'USE_SESSION_AUTH': True,
+        'LOGIN_URL': settings.LOGIN_URL,
+        'LOGOUT_URL': getattr(settings, 'LOGOUT_URL', '/accounts/logout/'),
+    }
+
+
+def swagger_ui(request):
+    # drf_yasg served the schema itself at ?format=openapi; keep that URL working
+    if request.GET.get('format') == 'openapi':
+        return schema_view(request, 'json')
+    return render(request, 'drf-yasg/swagger-ui.html', ui_context(request))
+
+
+def redoc(request):
+    return render(request, 'drf-yasg/redoc.html', ui_context(request))
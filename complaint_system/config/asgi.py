@@ -12,5 +12,9 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# Serve the read-heavy complaint endpoints from async views (complaints/async_views.py)
+os.environ.setdefault('ASYNC_READ_VIEWS', 'True')
+# Don't hold an event-loop thread on SMTP
+os.environ.setdefault('EMAIL_ASYNC', 'True')
 
 application = get_asgi_application()
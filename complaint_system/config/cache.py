@@ -0,0 +1,40 @@
+"""
+Cache backends for state the workers on a host share through files.
+
+Django's FileBasedCache decides whether to cull by listing its whole directory
+on every set(), so each write costs time proportional to the number of
+entries. PeriodicCullFileBasedCache checks at most once every CULL_INTERVAL
+seconds per process, and removes expired entries before random ones. With
+OPTIONS['EVICT_LIVE'] set to False it only ever removes expired entries, for
+state that must not disappear early, such as the token deny-list.
+"""
+import time
+from contextlib import suppress
+
+from django.core.cache.backends.filebased import FileBasedCache
+
+
+class PeriodicCullFileBasedCache(FileBasedCache):
+    """FileBasedCache whose writes don't list the directory; OPTIONS['CULL_INTERVAL'] in seconds"""
+
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        options = params.get('OPTIONS', {})
+        self._cull_interval = options.get('CULL_INTERVAL', 60)
+        self._evict_live = options.get('EVICT_LIVE', True)
+        self._last_cull = time.monotonic()
+
+    def _cull(self):
+        now = time.monotonic()
+        if now - self._last_cull < self._cull_interval:
+            return
+        self._last_cull = now
+        filelist = self._list_cache_files()
+        if len(filelist) < self._max_entries:
+            return
+        for fname in filelist:
+            # _is_expired() deletes the file when it has expired
+            with suppress(FileNotFoundError), open(fname, 'rb') as cache_file:
+                self._is_expired(cache_file)
+        if self._evict_live:
+            super()._cull()
@@ -0,0 +1,97 @@
+"""
+Production gunicorn profile: `gunicorn config.wsgi -c config/gunicorn_conf.py`.
+
+The app is loaded once in the master (preload_app) and warmed there
+(config/warmup.py), so the workers start from shared, already imported and
+populated memory. Each worker then opens its database connections and fills
+its caches before it accepts a request. Workers are threaded (gthread) because
+most request time is spent waiting on the database. Set GUNICORN_WORKER_CLASS
+to uvicorn_worker.UvicornWorker, with config.asgi:application as the app, for
+the async read views.
+
+Every setting can be overridden from the environment; see the README.
+"""
+import multiprocessing
+import os
+
+# Reuse the connections opened by the warmup instead of reconnecting per request
+os.environ.setdefault('DB_CONN_MAX_AGE', '60')
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+preload_app = True
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# Recycle workers now and then to bound memory growth; jitter keeps them from
+# restarting together, and the warmup makes a restart cheap
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 200))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+
+# Worker heartbeats in memory rather than on a possibly slow disk
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = '-'
+errorlog = '-'
+
+WARMUP = os.environ.get('GUNICORN_WARMUP', 'True').lower() not in ('0', 'false', 'no')
+
+
+def check_shared_caches(server):
+    """Refuse to run several workers on caches each of them would keep to itself"""
+    from django.conf import settings
+    from django.core.cache import caches
+    from django.core.cache.backends.locmem import LocMemCache
+
+    if server.num_workers < 2:
+        return
+    for setting in ('CACHE_VERSION_ALIAS', 'THROTTLE_CACHE_ALIAS', 'TOKEN_DENYLIST_CACHE_ALIAS'):
+        alias = getattr(settings, setting)
+        if isinstance(caches[alias], LocMemCache):
+            raise RuntimeError(
+                f'{setting} points at the per-process cache {alias!r}; '
+                f'{server.num_workers} workers need one they share'
+            )
+
+
+def on_starting(server):
+    """Check the caches, and drop the metrics and slow-query logs of the previous run before any worker writes"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    from monitoring import metrics, slow_queries
+
+    check_shared_caches(server)
+    metrics.clear_directory()
+    slow_queries.clear_directory()
+
+
+def when_ready(server):
+    # With preload_app the app is loaded by now and no worker has been forked
+    if WARMUP:
+        from config import warmup
+
+        warmup.preload()
+        server.log.info('Preloaded and warmed the application')
+
+
+def child_exit(server, worker):
+    """Fold an exited worker's metrics and slow queries into the totals, so recycled workers leave no files"""
+    from monitoring import metrics, slow_queries
+
+    metrics.mark_process_dead(worker.pid)
+    slow_queries.mark_process_dead(worker.pid)
+
+
+def post_worker_init(worker):
+    if not WARMUP:
+        return
+    from config import warmup
+
+    statuses = warmup.warm_worker()
+    if getattr(worker, 'tpool', None) is not None:
+        warmup.warm_thread_connections(worker.tpool, worker.cfg.threads)
+    worker.log.info('Worker %s warmed: %s', worker.pid, statuses)
@@ -0,0 +1,152 @@
+import time
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class _BrotliStream:
+    """Give brotli's incremental API the same compress/flush shape as zlib"""
+
+    def __init__(self, level):
+        self.compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self.compressor.process(data)
+
+    def flush(self):
+        return self.compressor.finish()
+
+
+def _gzip_stream(level):
+    return zlib.compressobj(level, zlib.DEFLATED, 31)
+
+
+def _zstd_stream(level):
+    return zstandard.ZstdCompressor(level=level).compressobj()
+
+
+# Server preference when the client accepts several encodings equally
+COMPRESSORS = {}
+if zstandard is not None:
+    COMPRESSORS['zstd'] = _zstd_stream
+if brotli is not None:
+    COMPRESSORS['br'] = _BrotliStream
+COMPRESSORS['gzip'] = _gzip_stream
+
+
+def parse_accept_encoding(header):
+    """Map each encoding in an Accept-Encoding header to its q-value"""
+    accepted = {}
+    for part in header.split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name] = quality
+    return accepted
+
+
+def choose_encoding(header, levels):
+    """Best encoding the client accepts and the content type policy allows, or None"""
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get('*', 0.0)
+    best, best_quality = None, 0.0
+    for name in COMPRESSORS:
+        if name not in levels:
+            continue
+        quality = accepted.get(name, wildcard)
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Negotiated zstd/br/gzip compression for API responses.
+
+    COMPRESSION_LEVELS maps content types to the encodings (and levels) allowed
+    for them; anything else passes through untouched. Buffered responses under
+    COMPRESSION_MIN_SIZE are left alone, streaming responses are compressed
+    chunk by chunk. The time spent and the bytes saved are reported in a
+    Server-Timing entry.
+    """
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding') or response.status_code in (204, 304):
+            return response
+
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        levels = settings.COMPRESSION_LEVELS.get(content_type)
+        if not levels:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''), levels)
+        if encoding is None:
+            return response
+        stream = COMPRESSORS[encoding](levels[encoding])
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = self._compress_async_stream(stream, response.streaming_content)
+            else:
+                response.streaming_content = self._compress_stream(stream, response.streaming_content)
+            del response.headers['Content-Length']
+        else:
+            start = time.perf_counter()
+            original_size = len(response.content)
+            compressed = stream.compress(response.content) + stream.flush()
+            elapsed = (time.perf_counter() - start) * 1000
+            if len(compressed) >= original_size:
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+            self._add_server_timing(response, encoding, elapsed, original_size, len(compressed))
+
+        # The representation changed, so a strong ETag no longer applies
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def _compress_stream(self, stream, chunks):
+        for chunk in chunks:
+            data = stream.compress(chunk)
+            if data:
+                yield data
+        yield stream.flush()
+
+    async def _compress_async_stream(self, stream, chunks):
+        async for chunk in chunks:
+            data = stream.compress(chunk)
+            if data:
+                yield data
+        yield stream.flush()
+
+    def _add_server_timing(self, response, encoding, elapsed, original_size, compressed_size):
+        entry = f'compress;dur={elapsed:.2f};desc="{encoding} {original_size}>{compressed_size}"'
+        existing = response.get('Server-Timing')
+        response.headers['Server-Timing'] = f'{existing}, {entry}' if existing else entry
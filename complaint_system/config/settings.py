@@ -51,16 +51,20 @@ INSTALLED_APPS = [
     'accounts',
     'complaints',
     'notifications',
+    'monitoring',
 ]
 
 MIDDLEWARE = [
+    'monitoring.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'config.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'monitoring.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -92,6 +96,10 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Seconds a connection is kept between requests; config/gunicorn_conf.py
+        # raises it so the connections opened by the worker warmup get reused
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=0, cast=int),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
@@ -134,6 +142,15 @@ STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+# OpenAPI schema written by `manage.py generate_api_schema` (config/api_schema.py)
+API_SCHEMA_DIR = config('API_SCHEMA_DIR', default=str(BASE_DIR / 'openapi'))
+
+# Runtime state shared by the workers on a host: throttle buckets, cache
+# versions, the token deny-list, metrics, profiles and the slow-query log.
+# Created with mode 0700; other local users must not be able to read or write
+# it, so it stays out of /tmp.
+VAR_DIR = Path(config('VAR_DIR', default=str(BASE_DIR / 'var')))
+
 # Media files (User uploads)
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
@@ -143,19 +160,121 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Cache
+# LocMemCache is per process. Invalidation goes through the shared 'versions'
+# cache, so it reaches every worker either way; RedisCache also shares the entries.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='complaint-system'),
+    },
+    # Throttle buckets must be shared by all workers on the host. Django's
+    # FileBasedCache lists the directory on every write; this one culls once a minute.
+    'throttle': {
+        'BACKEND': config('THROTTLE_CACHE_BACKEND', default='config.cache.PeriodicCullFileBasedCache'),
+        'LOCATION': config('THROTTLE_CACHE_LOCATION', default=str(VAR_DIR / 'throttle')),
+        'OPTIONS': {'MAX_ENTRIES': 100000, 'CULL_INTERVAL': 60},
+    },
+    # Cache namespace versions (complaints/cache.py): a handful of keys read on
+    # every cached request, never evicted
+    'versions': {
+        'BACKEND': 'config.cache.PeriodicCullFileBasedCache',
+        'LOCATION': config('CACHE_VERSION_LOCATION', default=str(VAR_DIR / 'versions')),
+        'OPTIONS': {'MAX_ENTRIES': 1000, 'CULL_INTERVAL': 60, 'EVICT_LIVE': False},
+    },
+    # Token deny-list (accounts/tokens.py), apart from the throttle buckets so
+    # that no amount of throttle traffic can evict a revocation. Entries are
+    # only removed once expired, and expire with the token they deny.
+    'tokens': {
+        'BACKEND': 'config.cache.PeriodicCullFileBasedCache',
+        'LOCATION': config('TOKEN_CACHE_LOCATION', default=str(VAR_DIR / 'tokens')),
+        'OPTIONS': {'MAX_ENTRIES': 10000, 'CULL_INTERVAL': 60, 'EVICT_LIVE': False},
+    },
+}
+
+# Sessions
+# 'django.contrib.sessions.backends.cached_db' reads sessions from the cache and
+# falls back to the database; 'django.contrib.sessions.backends.signed_cookies'
+# keeps them in the (signed, not encrypted) cookie and needs no storage at all.
+SESSION_ENGINE = config('SESSION_ENGINE', default='django.contrib.sessions.backends.db')
+SESSION_CACHE_ALIAS = config('SESSION_CACHE_ALIAS', default='default')
+
+# Serialized users answered by /api/auth/check/ and /api/auth/me/ (accounts/auth_cache.py)
+AUTH_PAYLOAD_CACHE_ALIAS = 'default'
+AUTH_PAYLOAD_CACHE_TIMEOUT = config('AUTH_PAYLOAD_CACHE_TIMEOUT', default=300, cast=int)
+
+# Signed access/refresh tokens for mobile and API clients (accounts/tokens.py).
+# The deny-list must be shared by all workers and must never evict live entries.
+TOKEN_ACCESS_LIFETIME = config('TOKEN_ACCESS_LIFETIME', default=900, cast=int)
+TOKEN_REFRESH_LIFETIME = config('TOKEN_REFRESH_LIFETIME', default=14 * 24 * 3600, cast=int)
+TOKEN_DENYLIST_CACHE_ALIAS = config('TOKEN_DENYLIST_CACHE_ALIAS', default='tokens')
+
+# Prometheus metrics at /metrics (monitoring/metrics.py). Every worker writes
+# its counters to METRICS_DIR, which must be shared by the workers on a host;
+# the scraper authenticates with METRICS_TOKEN, staff with their session.
+METRICS_DIR = config('METRICS_DIR', default=str(VAR_DIR / 'metrics'))
+METRICS_FLUSH_INTERVAL = config('METRICS_FLUSH_INTERVAL', default=5, cast=float)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+# Queue depth gauges count database rows; don't recount on every scrape
+METRICS_QUEUE_DEPTH_TTL = config('METRICS_QUEUE_DEPTH_TTL', default=30, cast=int)
+
+# Request profiling (monitoring/profiling.py): staff send `X-Profile: 1` or
+# `?profile=1`; PROFILE_SAMPLE_RATE also profiles that share of all requests.
+# The newest PROFILE_RING_SIZE profiles are kept in PROFILE_DIR.
+PROFILE_DIR = config('PROFILE_DIR', default=str(VAR_DIR / 'profiles'))
+PROFILE_RING_SIZE = config('PROFILE_RING_SIZE', default=50, cast=int)
+PROFILE_SAMPLE_RATE = config('PROFILE_SAMPLE_RATE', default=0.0, cast=float)
+PROFILE_MAX_QUERIES = config('PROFILE_MAX_QUERIES', default=500, cast=int)
+
+# Slow-query log (monitoring/slow_queries.py): queries taking SLOW_QUERY_THRESHOLD
+# seconds or more, grouped by statement; browsed at /admin/slow-queries/.
+SLOW_QUERY_DIR = config('SLOW_QUERY_DIR', default=str(VAR_DIR / 'slow-queries'))
+SLOW_QUERY_THRESHOLD = config('SLOW_QUERY_THRESHOLD', default=0.2, cast=float)
+SLOW_QUERY_MAX_GROUPS = config('SLOW_QUERY_MAX_GROUPS', default=200, cast=int)
+SLOW_QUERY_SAMPLES = config('SLOW_QUERY_SAMPLES', default=100, cast=int)
+
+# Response cache for public endpoints (complaints/cache.py). Entries may be per
+# process; the namespace versions that invalidate them must be shared by all
+# workers, so one worker's write reaches the others.
+RESPONSE_CACHE_ALIAS = 'default'
+CACHE_VERSION_ALIAS = config('CACHE_VERSION_ALIAS', default='versions')
+RESPONSE_CACHE_TIMEOUT = config('RESPONSE_CACHE_TIMEOUT', default=300, cast=int)
+
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'accounts.tokens.SignedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'complaints.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
+    # Proxies in front of the app that append to X-Forwarded-For (1 on Render).
+    # Throttles key on the address the nearest of them saw; 0 ignores the header
+    'NUM_PROXIES': config('NUM_PROXIES', default=0, cast=int),
     'DEFAULT_FILTER_BACKENDS': [
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ],
+    # Token buckets for the public complaint endpoints (complaints/throttling.py):
+    # burst caps short spikes, sustained caps the average over the hour
+    'DEFAULT_THROTTLE_RATES': {
+        'complaint_create_burst': config('THROTTLE_CREATE_BURST', default='5/min'),
+        'complaint_create_sustained': config('THROTTLE_CREATE_SUSTAINED', default='20/hour'),
+        'complaint_nearby_burst': config('THROTTLE_NEARBY_BURST', default='30/min'),
+        'complaint_nearby_sustained': config('THROTTLE_NEARBY_SUSTAINED', default='300/hour'),
+        'complaint_statistics_burst': config('THROTTLE_STATISTICS_BURST', default='60/min'),
+        'complaint_statistics_sustained': config('THROTTLE_STATISTICS_SUSTAINED', default='600/hour'),
+        'complaint_search_burst': config('THROTTLE_SEARCH_BURST', default='30/min'),
+        'complaint_search_sustained': config('THROTTLE_SEARCH_SUSTAINED', default='300/hour'),
+    },
 }
 
+THROTTLE_CACHE_ALIAS = 'throttle'
+
 # CORS Configuration (for frontend integration)
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -179,3 +298,57 @@ EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='noreply@complaints.gov.in')
 ADMIN_EMAIL = config('ADMIN_EMAIL', default='admin@complaints.gov.in')
+# Hand notification emails to a small thread pool instead of sending inline
+EMAIL_ASYNC = config('EMAIL_ASYNC', default=False, cast=bool)
+EMAIL_ASYNC_WORKERS = config('EMAIL_ASYNC_WORKERS', default=2, cast=int)
+
+# Near-duplicate detection for new complaints (complaints/duplicates.py)
+DUPLICATE_DETECTION = config('DUPLICATE_DETECTION', default=True, cast=bool)
+DUPLICATE_WINDOW_HOURS = config('DUPLICATE_WINDOW_HOURS', default=72, cast=int)
+DUPLICATE_RADIUS_METERS = config('DUPLICATE_RADIUS_METERS', default=500, cast=int)
+# Estimated Jaccard similarity of title + description words
+DUPLICATE_SIMILARITY = config('DUPLICATE_SIMILARITY', default=0.5, cast=float)
+
+# Automatic assignment (complaints/assignment.py, manage.py assign_complaints)
+ASSIGNMENT_PRIORITY_WEIGHTS = {'low': 1, 'medium': 2, 'high': 3, 'critical': 5}
+# Kilometers from a staff member's recent work that cost as much as one unit of load
+ASSIGNMENT_KM_PER_LOAD = config('ASSIGNMENT_KM_PER_LOAD', default=2.0, cast=float)
+ASSIGNMENT_RECENT_DAYS = 30
+ASSIGNMENT_MAX_OPEN = config('ASSIGNMENT_MAX_OPEN', default=50, cast=int)
+
+# Status history archival (complaints/archive.py, manage.py archive_status_history)
+# History of complaints closed or rejected this many months ago moves to the archive table
+HISTORY_ARCHIVE_MONTHS = config('HISTORY_ARCHIVE_MONTHS', default=6, cast=int)
+HISTORY_ARCHIVE_BATCH_SIZE = config('HISTORY_ARCHIVE_BATCH_SIZE', default=2000, cast=int)
+
+# Cold storage (complaints/cold_storage.py, manage.py export_cold_complaints)
+# Complaints closed or rejected this many months ago move to compressed segment files
+COLD_STORAGE_DIR = config('COLD_STORAGE_DIR', default=str(BASE_DIR / 'cold_storage'))
+COLD_STORAGE_MONTHS = config('COLD_STORAGE_MONTHS', default=24, cast=int)
+COLD_STORAGE_BATCH_SIZE = config('COLD_STORAGE_BATCH_SIZE', default=5000, cast=int)
+
+# Map clustering (complaints/clusters.py): each tile is split into GRID_SIZE x GRID_SIZE
+# cells and a request may cover at most MAX_TILES tiles
+CLUSTER_GRID_SIZE = 8
+CLUSTER_MAX_TILES = 64
+CLUSTER_MAX_ZOOM = 20
+
+# Async serving (config/asgi.py turns this on)
+ASYNC_READ_VIEWS = config('ASYNC_READ_VIEWS', default=False, cast=bool)
+
+# Live complaint events (notifications/views.py)
+EVENT_BUFFER_SIZE = config('EVENT_BUFFER_SIZE', default=5000, cast=int)
+EVENT_STREAM_BATCH_SIZE = 200
+EVENT_STREAM_POLL_SECONDS = config('EVENT_STREAM_POLL_SECONDS', default=1.0, cast=float)
+EVENT_STREAM_MAX_SECONDS = config('EVENT_STREAM_MAX_SECONDS', default=300, cast=int)
+EVENT_STREAM_RETRY_MS = config('EVENT_STREAM_RETRY_MS', default=3000, cast=int)
+
+# Response Compression (config.middleware.CompressionMiddleware)
+# Encodings and levels allowed per content type; unlisted types are sent as-is.
+# HTML is left out on purpose: it carries CSRF tokens (BREACH).
+COMPRESSION_MIN_SIZE = config('COMPRESSION_MIN_SIZE', default=1024, cast=int)
+COMPRESSION_LEVELS = {
+    'application/json': {'zstd': 3, 'br': 4, 'gzip': 6},
+    'text/csv': {'zstd': 6, 'br': 5, 'gzip': 6},
+    'text/plain': {'zstd': 3, 'br': 4, 'gzip': 6},
+}
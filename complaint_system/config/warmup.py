@@ -0,0 +1,203 @@
+"""
+Worker warmup for the gunicorn profile (config/gunicorn_conf.py).
+
+Django and DRF do a lot of work lazily on first use: the URL resolvers compile
+their patterns and build the reverse lookup, DRF imports its renderer,
+parser and authentication classes, serializers introspect their models,
+and the cached department, category and SLA tables start empty. Left alone,
+all of that lands on the first requests each worker serves after a deploy or
+a max_requests recycle.
+
+preload() runs in the gunicorn master after the app is loaded and before it
+forks. It does the part that doesn't touch the database, so the workers share
+the result copy-on-write, and then freezes the garbage collector so that
+collections in the workers don't write to (and so copy) those pages.
+
+warm_worker() runs in each worker after the fork. It opens the worker's
+database connection and fills the per-process caches by sending a few
+requests (WARMUP_PATHS) through a private WSGI handler, so the caches hold
+rows read by this process rather than inherited from the master. Threaded
+workers also open a connection on each request thread
+(warm_thread_connections).
+"""
+import gc
+import io
+import logging
+import sys
+import threading
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+# Paths requested once per worker: public, read-only and not throttled
+WARMUP_PATHS = [
+    '/api/categories/',
+    '/api/complaints/?page=1',
+    '/api/auth/departments/',
+]
+
+# Modules imported lazily on the request path
+REQUEST_MODULES = [
+    'complaints.fast_serializers',
+    'complaints.renderers',
+    'accounts.serializers',
+    'accounts.tokens',
+    'notifications.email_service',
+    'monitoring.views',
+]
+
+
+def populate_url_resolvers():
+    """Import the URLconf, compile every pattern and build the reverse lookup"""
+    from django.urls import get_resolver
+
+    resolver = get_resolver()
+
+    def compile_patterns(patterns):
+        for pattern in patterns:
+            pattern.pattern.regex
+            if hasattr(pattern, 'url_patterns'):
+                compile_patterns(pattern.url_patterns)
+
+    compile_patterns(resolver.url_patterns)
+    resolver.reverse_dict
+
+
+def import_request_modules():
+    from rest_framework.settings import api_settings
+
+    for module in REQUEST_MODULES:
+        __import__(module)
+    # DRF imports these classes from their dotted paths on first access
+    for name in ('DEFAULT_RENDERER_CLASSES', 'DEFAULT_PARSER_CLASSES', 'DEFAULT_AUTHENTICATION_CLASSES',
+                 'DEFAULT_PERMISSION_CLASSES', 'DEFAULT_CONTENT_NEGOTIATION_CLASS', 'DEFAULT_PAGINATION_CLASS',
+                 'DEFAULT_THROTTLE_CLASSES', 'DEFAULT_METADATA_CLASS', 'EXCEPTION_HANDLER'):
+        getattr(api_settings, name)
+
+
+def build_serializers():
+    """
+    Build every serializer's fields once. ModelSerializer reads its model's
+    _meta on each instantiation; the first read fills caches on the model.
+    """
+    from rest_framework import serializers
+
+    for module_name in ('complaints.serializers', 'accounts.serializers'):
+        module = sys.modules[module_name]
+        for value in vars(module).values():
+            if (isinstance(value, type) and issubclass(value, serializers.BaseSerializer)
+                    and value.__module__ == module_name):
+                try:
+                    value().fields
+                except Exception:
+                    # Some need a request or instance in their context; skip them
+                    continue
+
+
+def load_api_schema():
+    from . import api_schema
+
+    if settings.DEBUG:
+        return
+    for name in api_schema.FORMATS:
+        try:
+            api_schema.load(name)
+        except FileNotFoundError:
+            logger.warning('API schema not generated; run `manage.py generate_api_schema`')
+            return
+
+
+def preload():
+    """Warm everything that doesn't need the database; run before forking workers"""
+    from django.db import connections
+
+    populate_url_resolvers()
+    import_request_modules()
+    build_serializers()
+    load_api_schema()
+    # A connection opened here would be shared by every worker
+    connections.close_all()
+    gc.collect()
+    gc.freeze()
+
+
+def request_environ(path):
+    host = next((host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')), 'localhost')
+    path, _, query = path.partition('?')
+    return {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'SERVER_NAME': host,
+        'SERVER_PORT': '443' if settings.SECURE_SSL_REDIRECT else '80',
+        'HTTP_HOST': host,
+        'HTTP_ACCEPT': 'application/json',
+        'HTTP_ACCEPT_ENCODING': 'br, gzip',
+        'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.url_scheme': 'https' if settings.SECURE_SSL_REDIRECT else 'http',
+        'wsgi.version': (1, 0),
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+
+
+def warm_requests(paths=WARMUP_PATHS):
+    """Send paths through a WSGI handler of our own; works under either server interface"""
+    from django.core.handlers.wsgi import WSGIHandler
+
+    handler = WSGIHandler()
+    statuses = {}
+
+    for path in paths:
+        def start_response(status, headers, exc_info=None):
+            statuses[path] = status
+
+        try:
+            response = handler(request_environ(path), start_response)
+            b''.join(response)
+            response.close()
+        except Exception:
+            logger.exception('Warmup request for %s failed', path)
+    return statuses
+
+
+def warm_connection():
+    from django.db import connection
+
+    connection.ensure_connection()
+
+
+def warm_thread_connections(executor, threads):
+    """
+    Open a database connection on each thread of a worker's pool. Django keeps
+    one connection per thread, and each task waits for the others so every
+    thread gets one.
+    """
+    barrier = threading.Barrier(threads)
+
+    def task():
+        try:
+            barrier.wait(timeout=5)
+        except threading.BrokenBarrierError:
+            pass
+        warm_connection()
+
+    for future in [executor.submit(task) for _ in range(threads)]:
+        future.result()
+
+
+def warm_worker():
+    """Fill this worker's caches and open its connection; run after the fork"""
+    from monitoring import metrics, slow_queries
+
+    warm_connection()
+    statuses = warm_requests()
+    # Warmup traffic isn't traffic
+    metrics.reset()
+    slow_queries.reset()
+    return statuses
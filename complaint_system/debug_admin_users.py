@@ -33,8 +33,8 @@ def debug_users():
         print(f"Error: {e}")
     print("\nAttempting Department Serialization...")
     try:
-        from complaints.models import Category
-        departments = Category.objects.exclude(department='').values_list('department', flat=True).distinct().order_by('department')
+        from complaints.models import Department
+        departments = Department.objects.values_list('name', flat=True).order_by('name')
         dept_list = list(departments)
         print(f"Serialized {len(dept_list)} departments.")
         print("Departments:", dept_list)
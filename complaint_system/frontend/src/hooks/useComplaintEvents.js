@@ -0,0 +1,68 @@
+import { useEffect, useRef } from 'react';
+
+import API_URL from '../apiConfig';
+
+const EVENTS_URL = `${API_URL}/api/events/complaints/`;
+
+// Subscribe to live complaint events (Server-Sent Events).
+// EventSource reconnects on its own and resumes after the last event id.
+const useComplaintEvents = (onEvent, enabled = true) => {
+    const handlerRef = useRef(onEvent);
+    handlerRef.current = onEvent;
+
+    useEffect(() => {
+        if (!enabled || typeof EventSource === 'undefined') return undefined;
+
+        const source = new EventSource(EVENTS_URL, { withCredentials: true });
+        const dispatch = (type) => (message) => {
+            handlerRef.current(type, message.data ? JSON.parse(message.data) : {});
+        };
+        source.addEventListener('created', dispatch('created'));
+        source.addEventListener('status_changed', dispatch('status_changed'));
+        source.addEventListener('reset', dispatch('reset'));
+
+        return () => source.close();
+    }, [enabled]);
+};
+
+// Apply one event to a loaded page of complaints
+export const applyEventToComplaints = (complaints, type, event, filters = {}) => {
+    const matches = (!filters.status || filters.status === event.status)
+        && (!filters.priority || filters.priority === event.priority);
+
+    if (type === 'created') {
+        if (!matches || complaints.some(c => c.id === event.id)) return complaints;
+        return [event, ...complaints];
+    }
+    if (type === 'status_changed') {
+        if (!matches) return complaints.filter(c => c.id !== event.id);
+        return complaints.map(c => (c.id === event.id ? { ...c, status: event.status } : c));
+    }
+    return complaints;
+};
+
+// Apply one event to the /statistics/ payload
+export const applyEventToStats = (stats, type, event) => {
+    if (!stats) return stats;
+    const byStatus = { ...stats.by_status };
+    if (type === 'created') {
+        byStatus[event.status] = (byStatus[event.status] || 0) + 1;
+        return {
+            ...stats,
+            total_complaints: stats.total_complaints + 1,
+            by_status: byStatus,
+            by_category: {
+                ...stats.by_category,
+                [event.category_name]: (stats.by_category[event.category_name] || 0) + 1,
+            },
+        };
+    }
+    if (type === 'status_changed') {
+        if (event.old_status) byStatus[event.old_status] = Math.max((byStatus[event.old_status] || 0) - 1, 0);
+        byStatus[event.status] = (byStatus[event.status] || 0) + 1;
+        return { ...stats, by_status: byStatus };
+    }
+    return stats;
+};
+
+export default useComplaintEvents;
@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { useAuth } from '../context/AuthContext';
 
 import API_URL from '../apiConfig';
+import useComplaintEvents, { applyEventToComplaints, applyEventToStats } from '../hooks/useComplaintEvents';
 
 const API_BASE = `${API_URL}/api`;
 
@@ -18,6 +19,14 @@ const AdminDashboard = () => {
     const [expandedId, setExpandedId] = useState(null);
     const [updating, setUpdating] = useState(null);
     const [showStaffOnly, setShowStaffOnly] = useState(true);
+    // User directory is paginated and filtered on the server
+    const [userSearch, setUserSearch] = useState('');
+    const [userQuery, setUserQuery] = useState('');
+    const [roleFilter, setRoleFilter] = useState('');
+    const [userDeptFilter, setUserDeptFilter] = useState('');
+    const [userPage, setUserPage] = useState(1);
+    const [userCount, setUserCount] = useState(0);
+    const USER_PAGE_SIZE = 25;
 
     useEffect(() => {
         if (tab === 'complaints') {
@@ -25,38 +34,44 @@ const AdminDashboard = () => {
         } else {
             loadUsers();
         }
-    }, [tab, statusFilter, priorityFilter]);
+    }, [tab, statusFilter, priorityFilter, showStaffOnly, userQuery, roleFilter, userDeptFilter, userPage]);
+
+    // Departments only change with categories; load them once for the filters and selects
+    useEffect(() => {
+        if (tab !== 'users' || departments.length) return;
+        fetch(`${API_BASE}/auth/departments/`, { credentials: 'include' })
+            .then(r => r.ok ? r.json() : { departments: [] })
+            .then(data => setDepartments(data.departments || []))
+            .catch(() => console.warn('Departments fetch failed'));
+    }, [tab]);
+
+    // Search as the admin types, without a request per keystroke
+    useEffect(() => {
+        const timer = setTimeout(() => {
+            setUserQuery(userSearch.trim());
+            setUserPage(1);
+        }, 300);
+        return () => clearTimeout(timer);
+    }, [userSearch]);
 
     const loadUsers = async () => {
         setLoading(true);
         try {
-            // Fetch Users with explicit error handling
-            const uRes = await fetch(`${API_BASE}/auth/users/`, { credentials: 'include' });
+            const params = new URLSearchParams({ page: userPage, page_size: USER_PAGE_SIZE });
+            if (roleFilter === 'pending') params.append('pending', 'true');
+            else if (roleFilter) params.append('role', roleFilter);
+            else if (showStaffOnly) params.append('role', 'staff');
+            if (userDeptFilter) params.append('department', userDeptFilter);
+            if (userQuery) params.append('search', userQuery);
+
+            const uRes = await fetch(`${API_BASE}/auth/users/?${params.toString()}`, { credentials: 'include' });
             if (!uRes.ok) {
                 const errText = await uRes.text();
                 throw new Error(`Users Fetch Failed: ${uRes.status} ${errText}`);
             }
             const usersRes = await uRes.json();
-
-            // Fetch Departments
-            const dRes = await fetch(`${API_BASE}/auth/departments/`, { credentials: 'include' });
-            if (!dRes.ok) {
-                console.warn('Departments fetch failed');
-            }
-            const deptsRes = dRes.ok ? await dRes.json() : { departments: [] };
-
-            // Handle if lists are wrapped & FLATTEN profile data (support both flat and nested responses)
-            const list = Array.isArray(usersRes) ? usersRes : usersRes.results || [];
-
-            console.log("Users Loaded:", list.length, list);
-
-            const flatUsers = list.map(u => ({
-                ...u,
-                department: u.department || u.profile?.department || '',
-                is_department_user: (u.is_department_user !== undefined) ? u.is_department_user : (u.profile?.is_department_user || false)
-            }));
-            setUsers(flatUsers);
-            setDepartments(deptsRes.departments || []);
+            setUsers(usersRes.results || []);
+            setUserCount(usersRes.count || 0);
         } catch (error) {
             console.error('Error loading users:', error);
             // Alert user so they can report the specific error
@@ -66,8 +81,21 @@ const AdminDashboard = () => {
         }
     };
 
+    const userPages = Math.max(1, Math.ceil(userCount / USER_PAGE_SIZE));
+
     // Original loadData... keeping it but showing modified useEffect above covering both
 
+    // Apply live changes instead of re-downloading the list and statistics
+    useComplaintEvents((type, event) => {
+        if (type === 'reset') {
+            loadData();
+            return;
+        }
+        const filters = { status: statusFilter, priority: priorityFilter };
+        setComplaints(prev => applyEventToComplaints(prev, type, event, filters));
+        setStats(prev => applyEventToStats(prev, type, event));
+    }, tab === 'complaints');
+
     const loadData = async () => {
         try {
             const params = new URLSearchParams();
@@ -534,7 +562,7 @@ const AdminDashboard = () => {
                         <div style={{ display: 'flex', gap: '0.8rem', alignItems: 'center' }}>
                             {showStaffOnly ? (
                                 <button
-                                    onClick={() => setShowStaffOnly(false)}
+                                    onClick={() => { setShowStaffOnly(false); setUserPage(1); }}
                                     style={{
                                         padding: '0.5rem 1rem', borderRadius: '8px',
                                         background: 'linear-gradient(135deg, #667eea, #764ba2)',
@@ -546,7 +574,7 @@ const AdminDashboard = () => {
                                 </button>
                             ) : (
                                 <button
-                                    onClick={() => setShowStaffOnly(true)}
+                                    onClick={() => { setShowStaffOnly(true); setUserPage(1); }}
                                     style={{
                                         padding: '0.5rem 1rem', borderRadius: '8px',
                                         background: 'rgba(255,255,255,0.1)',
@@ -576,6 +604,27 @@ const AdminDashboard = () => {
                         </div>
                     )}
 
+                    <div style={{ display: 'flex', gap: '0.5rem', flexWrap: 'wrap', marginBottom: '1rem' }}>
+                        <input
+                            type="search"
+                            value={userSearch}
+                            onChange={(e) => setUserSearch(e.target.value)}
+                            placeholder="Search username, name or email"
+                            style={{ flex: '1 1 240px' }}
+                        />
+                        <select value={roleFilter} onChange={(e) => { setRoleFilter(e.target.value); setUserPage(1); }} style={{ minWidth: '150px' }}>
+                            <option value="">{showStaffOnly ? 'All Staff' : 'All Roles'}</option>
+                            <option value="admin">Admin</option>
+                            <option value="department">Staff</option>
+                            <option value="pending">Pending Approval</option>
+                            {!showStaffOnly && <option value="citizen">Citizen</option>}
+                        </select>
+                        <select value={userDeptFilter} onChange={(e) => { setUserDeptFilter(e.target.value); setUserPage(1); }} style={{ minWidth: '180px' }}>
+                            <option value="">All Departments</option>
+                            {departments.map(d => <option key={d} value={d}>{d}</option>)}
+                        </select>
+                    </div>
+
                     <div style={{ overflowX: 'auto' }}>
                         <table style={{ width: '100%', borderCollapse: 'collapse' }}>
                             <thead>
@@ -586,7 +635,7 @@ const AdminDashboard = () => {
                                 </tr>
                             </thead>
                             <tbody>
-                                {users.filter(u => !showStaffOnly || u.is_staff || u.is_department_user || u.department).map(u => (
+                                {users.map(u => (
                                     <tr key={u.id} style={{ borderBottom: '1px solid var(--glass-border)' }}>
                                         <td style={{ padding: '1rem', fontWeight: '600' }}>{u.username}</td>
                                         <td style={{ padding: '1rem' }}>{u.first_name} {u.last_name}</td>
@@ -673,6 +722,27 @@ const AdminDashboard = () => {
                             </tbody>
                         </table>
                     </div>
+
+                    <div style={{ display: 'flex', justifyContent: 'space-between', alignItems: 'center', marginTop: '1rem', color: 'var(--text-secondary)', fontSize: '0.9rem' }}>
+                        <span>{userCount} user{userCount === 1 ? '' : 's'}</span>
+                        <div style={{ display: 'flex', gap: '0.5rem', alignItems: 'center' }}>
+                            <button
+                                onClick={() => setUserPage(p => p - 1)}
+                                disabled={userPage <= 1}
+                                style={{ padding: '0.4rem 0.8rem', borderRadius: '6px', border: 'none', background: 'var(--glass-hover)', color: 'var(--text-primary)', cursor: 'pointer' }}
+                            >
+                                Previous
+                            </button>
+                            <span>Page {userPage} of {userPages}</span>
+                            <button
+                                onClick={() => setUserPage(p => p + 1)}
+                                disabled={userPage >= userPages}
+                                style={{ padding: '0.4rem 0.8rem', borderRadius: '6px', border: 'none', background: 'var(--glass-hover)', color: 'var(--text-primary)', cursor: 'pointer' }}
+                            >
+                                Next
+                            </button>
+                        </div>
+                    </div>
                 </div>
             )}
         </div>
@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { useAuth } from '../context/AuthContext';
 
 import API_URL from '../apiConfig';
+import useComplaintEvents, { applyEventToComplaints, applyEventToStats } from '../hooks/useComplaintEvents';
 
 const API_BASE = `${API_URL}/api`;
 
@@ -21,6 +22,17 @@ const DeptDashboard = () => {
         if (department) loadData();
     }, [department, statusFilter, priorityFilter]);
 
+    // Apply live changes instead of re-downloading the list and statistics
+    useComplaintEvents((type, event) => {
+        if (type === 'reset') {
+            loadData();
+            return;
+        }
+        const filters = { status: statusFilter, priority: priorityFilter };
+        setComplaints(prev => applyEventToComplaints(prev, type, event, filters));
+        setStats(prev => applyEventToStats(prev, type, event));
+    }, !!department);
+
     const loadData = async () => {
         try {
             const params = new URLSearchParams();
@@ -104,7 +104,13 @@ const SubmitComplaint = () => {
 
             if (response.ok) {
                 const data = await response.json();
-                setSuccess('Complaint submitted successfully! Reference: ' + data.reference_number);
+                if (data.parent_reference) {
+                    setSuccess('Complaint submitted! Reference: ' + data.reference_number +
+                        '. This issue has already been reported as ' + data.parent_reference +
+                        ', so your complaint has been linked to it. You can track that reference for updates.');
+                } else {
+                    setSuccess('Complaint submitted successfully! Reference: ' + data.reference_number);
+                }
                 setFormData({ title: '', description: '', citizen_name: '', citizen_email: '', citizen_phone: '', address: '', photo: null });
                 setSelectedCategory(null);
                 setLocationInput({ lat: '', lng: '' });
@@ -0,0 +1,11 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('profiles/', views.profile_list, name='profile-list'),
+    path('profiles/compare/', views.profile_compare, name='profile-compare'),
+    path('profiles/<str:profile_id>/', views.profile_detail, name='profile-detail'),
+    path('profiles/<str:profile_id>/download/<str:format>/', views.profile_download, name='profile-download'),
+    path('slow-queries/', views.slow_query_list, name='slow-query-list'),
+    path('slow-queries/<str:fingerprint>/', views.slow_query_detail, name='slow-query-detail'),
+]
@@ -0,0 +1,261 @@
+"""
+Prometheus metrics, counted per process and merged across workers through files.
+
+Each process counts into an in-memory registry (a lock and a few dicts, so
+recording costs microseconds) and writes a JSON snapshot of it to
+METRICS_DIR/<pid>.json at most every METRICS_FLUSH_INTERVAL seconds, and when
+it exits. The metrics view merges every snapshot in the directory: counters
+and histograms are summed, including those of workers that have exited, so
+totals never go backwards while the server runs; gauges are per process and
+only count processes that are still alive. Clear METRICS_DIR when the server
+starts, like prometheus_client's multiprocess mode.
+
+When a worker exits, the gunicorn master folds its snapshot into
+METRICS_DIR/totals.json (mark_process_dead(), as in prometheus_client), so
+the directory holds one file per live worker however often they recycle.
+
+A child forked from a process that already counted something (gunicorn with
+preload_app) starts from an empty registry so nothing is counted twice.
+"""
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+
+from .storage import private_directory
+
+
+MetricSpec = namedtuple('MetricSpec', ['kind', 'help', 'buckets'])
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+METRICS = {
+    'http_requests_total': MetricSpec(
+        'counter', 'HTTP requests by view, action, method and status code', None),
+    'http_request_duration_seconds': MetricSpec(
+        'histogram', 'Time spent handling a request, by view and action', LATENCY_BUCKETS),
+    'http_request_db_queries': MetricSpec(
+        'histogram', 'Database queries run by a request, by view and action', QUERY_BUCKETS),
+    'cache_requests_total': MetricSpec(
+        'counter', 'Cache lookups by cache and result (hit or miss)', None),
+    'cache_hit_ratio': MetricSpec(
+        'gauge', 'Hits over lookups since the server started, by cache', None),
+    'emails_total': MetricSpec(
+        'counter', 'Emails handed to the mail backend, by result (sent or failed)', None),
+    'email_send_duration_seconds': MetricSpec(
+        'histogram', 'Time spent sending one email', LATENCY_BUCKETS),
+    'background_queue_depth': MetricSpec(
+        'gauge', 'Work waiting for a background worker, by queue', None),
+}
+
+# Counters and histograms of processes that have exited
+TOTALS_FILE = 'totals.json'
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_gauges = {}
+_last_flush = 0.0
+
+
+def label_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def inc(name, labels=None, amount=1):
+    key = (name, label_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name, value, labels=None):
+    buckets = METRICS[name].buckets
+    key = (name, label_key(labels))
+    with _lock:
+        entry = _histograms.get(key)
+        if entry is None:
+            # One count per bucket plus +Inf, then the sum
+            entry = _histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+        for index, bound in enumerate(buckets):
+            if value <= bound:
+                entry[index] += 1
+                break
+        else:
+            entry[len(buckets)] += 1
+        entry[-1] += value
+
+
+def register_gauge(name, collect):
+    """Per-process gauge; collect() returns {label_key(labels): value} and is called at flush time"""
+    _gauges[name] = collect
+
+
+def reset():
+    global _last_flush
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+    _last_flush = 0.0
+
+
+def snapshot():
+    with _lock:
+        counters = [[name, list(labels), value] for (name, labels), value in _counters.items()]
+        histograms = [[name, list(labels), list(entry)] for (name, labels), entry in _histograms.items()]
+    gauges = []
+    for name, collect in list(_gauges.items()):
+        try:
+            values = collect()
+        except Exception:
+            continue
+        gauges.extend([name, list(labels), value] for labels, value in values.items())
+    return {'pid': os.getpid(), 'counters': counters, 'histograms': histograms, 'gauges': gauges}
+
+
+def flush():
+    """Write this process's snapshot to METRICS_DIR"""
+    global _last_flush
+    _last_flush = time.monotonic()
+    directory = settings.METRICS_DIR
+    private_directory(directory)
+    path = os.path.join(directory, f'{os.getpid()}.json')
+    temporary = f'{path}.{threading.get_ident()}.tmp'
+    with open(temporary, 'w') as snapshot_file:
+        json.dump(snapshot(), snapshot_file)
+    os.replace(temporary, path)
+
+
+def maybe_flush():
+    if time.monotonic() - _last_flush >= settings.METRICS_FLUSH_INTERVAL:
+        flush()
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def read_snapshot(path):
+    try:
+        with open(path) as snapshot_file:
+            return json.load(snapshot_file)
+    except (OSError, ValueError):
+        return None
+
+
+def add_counts(counters, histograms, data):
+    """Add a snapshot's counters and histograms to the dicts keyed by (name, labels)"""
+    for name, labels, value in data['counters']:
+        key = (name, tuple(map(tuple, labels)))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, entry in data['histograms']:
+        key = (name, tuple(map(tuple, labels)))
+        merged = histograms.setdefault(key, [0] * len(entry))
+        for index, value in enumerate(entry):
+            merged[index] += value
+
+
+def collect():
+    """Merge the snapshots of every process: (counters, histograms, gauges) keyed by (name, labels)"""
+    counters, histograms, gauges = {}, {}, {}
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.json')):
+        data = read_snapshot(path)
+        if data is None:
+            continue
+        add_counts(counters, histograms, data)
+        # The totals of exited workers have no pid and no gauges
+        if data['pid'] is not None and process_alive(data['pid']):
+            for name, labels, value in data['gauges']:
+                key = (name, tuple(map(tuple, labels)))
+                gauges[key] = gauges.get(key, 0) + value
+    return counters, histograms, gauges
+
+
+def mark_process_dead(pid):
+    """Fold an exited process's counters into totals.json and drop its snapshot; call from one process only"""
+    path = os.path.join(settings.METRICS_DIR, f'{pid}.json')
+    data = read_snapshot(path)
+    if data is None:
+        return
+    totals_path = os.path.join(settings.METRICS_DIR, TOTALS_FILE)
+    counters, histograms = {}, {}
+    for snapshot_data in (read_snapshot(totals_path), data):
+        if snapshot_data is not None:
+            add_counts(counters, histograms, snapshot_data)
+    totals = {
+        'pid': None,
+        'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+        'histograms': [[name, list(labels), entry] for (name, labels), entry in histograms.items()],
+        'gauges': [],
+    }
+    temporary = f'{totals_path}.tmp'
+    with open(temporary, 'w') as totals_file:
+        json.dump(totals, totals_file)
+    # Replace the totals before removing the snapshot: a scrape in between
+    # counts the worker twice for a moment rather than losing it
+    os.replace(temporary, totals_path)
+    os.remove(path)
+
+
+def clear_directory():
+    """Drop the snapshots of a previous server run; call before workers start"""
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.json')):
+        os.remove(path)
+
+
+def escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{escape(value)}"' for key, value in pairs) + '}'
+
+
+def render(counters, histograms, gauges):
+    """Prometheus text exposition format (version 0.0.4)"""
+    samples = {}
+    for (name, labels), value in counters.items():
+        samples.setdefault(name, []).append(f'{name}{format_labels(labels)} {value}')
+    for (name, labels), value in gauges.items():
+        samples.setdefault(name, []).append(f'{name}{format_labels(labels)} {value}')
+    for (name, labels), entry in sorted(histograms.items()):
+        buckets = METRICS[name].buckets
+        cumulative = 0
+        lines = samples.setdefault(name, [])
+        for bound, count in zip(list(buckets) + ['+Inf'], entry[:-1]):
+            cumulative += count
+            lines.append(f'{name}_bucket{format_labels(labels, [("le", bound)])} {cumulative}')
+        lines.append(f'{name}_sum{format_labels(labels)} {entry[-1]}')
+        lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+
+    output = []
+    for name, spec in METRICS.items():
+        if name not in samples:
+            continue
+        output.append(f'# HELP {name} {spec.help}')
+        output.append(f'# TYPE {name} {spec.kind}')
+        output.extend(samples[name] if spec.kind == 'histogram' else sorted(samples[name]))
+    return '\n'.join(output) + '\n'
+
+
+def flush_at_exit():
+    if _counters or _histograms:
+        flush()
+
+
+os.register_at_fork(after_in_child=reset)
+atexit.register(flush_at_exit)
@@ -0,0 +1,137 @@
+import cProfile
+import random
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.utils.deprecation import MiddlewareMixin
+
+from . import metrics, profiling, slow_queries
+
+
+class QueryCounter:
+    """
+    connection.execute_wrapper that counts the queries a request runs and
+    records those slower than SLOW_QUERY_THRESHOLD (monitoring/slow_queries.py)
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            if elapsed >= settings.SLOW_QUERY_THRESHOLD:
+                slow_queries.record(
+                    sql, params, many, elapsed, *view_labels(self.request), connection=context['connection'],
+                )
+
+
+def view_labels(request):
+    """(view, action): the URL name, and the DRF viewset action for the method if there is one"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched', ''
+    actions = getattr(match.func, 'actions', None) or {}
+    return match.view_name, actions.get(request.method.lower(), '')
+
+
+class MetricsMiddleware(MiddlewareMixin):
+    """
+    Request count, latency and queries per request, by view and action
+    (monitoring/metrics.py). Goes first so the time includes the other
+    middleware.
+    """
+
+    def process_request(self, request):
+        request._metrics_start = time.perf_counter()
+        request._metrics_queries = QueryCounter(request)
+        connection.execute_wrappers.append(request._metrics_queries)
+
+    def process_response(self, request, response):
+        counter = getattr(request, '_metrics_queries', None)
+        if counter is None:
+            return response
+        if counter in connection.execute_wrappers:
+            connection.execute_wrappers.remove(counter)
+        elapsed = time.perf_counter() - request._metrics_start
+
+        view, action = view_labels(request)
+        labels = {'view': view, 'action': action}
+        metrics.inc('http_requests_total', {**labels, 'method': request.method, 'status': response.status_code})
+        metrics.observe('http_request_duration_seconds', elapsed, labels)
+        metrics.observe('http_request_db_queries', counter.count, labels)
+        metrics.maybe_flush()
+        slow_queries.maybe_flush()
+        return response
+
+
+def profiling_requested(request):
+    return request.META.get('HTTP_X_PROFILE') == '1' or request.GET.get('profile') == '1'
+
+
+def profiling_allowed(request):
+    """Staff sessions, or an access token for a staff user"""
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if not header.startswith('Bearer '):
+        return False
+    from accounts import tokens
+
+    try:
+        return tokens.verify(header[7:], tokens.ACCESS)['role'] == 'admin'
+    except tokens.InvalidToken:
+        return False
+
+
+class ProfilingMiddleware:
+    """
+    Runs a request under cProfile and records its SQL when staff ask for it
+    or when it is sampled (monitoring/profiling.py). Goes after the
+    authentication middleware; the profile covers the middleware below it
+    and the view.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sampled = settings.PROFILE_SAMPLE_RATE and random.random() < settings.PROFILE_SAMPLE_RATE
+        if not sampled and not (profiling_requested(request) and profiling_allowed(request)):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        recorder = profiling.SQLRecorder(settings.PROFILE_MAX_QUERIES)
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already running in this thread
+            return self.get_response(request)
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(recorder):
+                response = self.get_response(request)
+        finally:
+            profiler.disable()
+        elapsed = time.perf_counter() - start
+
+        view, action = view_labels(request)
+        profile_id = profiling.save(profiler, recorder, {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': view,
+            'action': action,
+            'status': response.status_code,
+            'duration': round(elapsed, 6),
+            'user': request.user.get_username() if request.user.is_authenticated else '',
+            'sampled': bool(sampled),
+            'created_at': time.time(),
+        })
+        response['X-Profile-Id'] = profile_id
+        return response
@@ -0,0 +1,255 @@
+"""
+On-demand request profiling.
+
+A staff request that carries an `X-Profile: 1` header or a `?profile=1` query
+flag, or any request picked at PROFILE_SAMPLE_RATE, runs under cProfile with
+its SQL recorded (see ProfilingMiddleware). The result is kept in PROFILE_DIR
+as two files per request: <id>.prof, the pstats dump, and <id>.json, the
+request, timings and statements, with a fingerprint in place of each
+statement's parameters. Only the newest PROFILE_RING_SIZE profiles
+are kept. The id is returned in the X-Profile-Id response header and the
+profiles are browsed under /admin/profiles/.
+
+When neither the flag nor sampling applies the middleware costs a header
+lookup, so it can stay installed in production.
+"""
+import glob
+import json
+import os
+import pstats
+import re
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+
+from .slow_queries import fingerprint
+from .storage import private_directory
+
+
+# Ids sort in creation order, which is also the ring order; profiles saved
+# before the microseconds were added have none
+PROFILE_ID_PATTERN = re.compile(r'^\d{8}T\d{6}(\.\d{6})?-\d+-[0-9a-f]{6}$')
+
+# speedscope frames cheaper than this are dropped so the file stays small
+SPEEDSCOPE_MIN_WEIGHT = 1e-5
+SPEEDSCOPE_MAX_DEPTH = 200
+
+
+class SQLRecorder:
+    """connection.execute_wrapper that keeps each statement, a fingerprint of its parameters and its duration"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.statements = []
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            if len(self.statements) < self.limit:
+                self.statements.append({
+                    'sql': sql,
+                    # Parameters can be emails or password hashes; never written out
+                    'params': fingerprint(repr(params)),
+                    'many': many,
+                    'duration': round(elapsed, 6),
+                })
+
+
+def new_profile_id():
+    now = time.time()
+    stamp = time.strftime('%Y%m%dT%H%M%S', time.localtime(now))
+    return f'{stamp}.{int(now % 1 * 1e6):06d}-{os.getpid()}-{uuid.uuid4().hex[:6]}'
+
+
+def profile_path(profile_id, extension):
+    if not PROFILE_ID_PATTERN.match(profile_id):
+        raise FileNotFoundError(profile_id)
+    return os.path.join(settings.PROFILE_DIR, f'{profile_id}.{extension}')
+
+
+def write_atomic(path, write):
+    temporary = f'{path}.tmp'
+    write(temporary)
+    os.replace(temporary, path)
+
+
+def save(profiler, recorder, meta):
+    """Store a finished profile and its SQL; returns the profile id"""
+    private_directory(settings.PROFILE_DIR)
+    profile_id = new_profile_id()
+    meta = {
+        **meta,
+        'id': profile_id,
+        'queries': recorder.count,
+        'sql_duration': round(recorder.duration, 6),
+        'statements': recorder.statements,
+    }
+
+    def write_meta(path):
+        with open(path, 'w') as meta_file:
+            json.dump(meta, meta_file)
+
+    # The .prof is written first; a profile is listed once its .json exists
+    write_atomic(profile_path(profile_id, 'prof'), profiler.dump_stats)
+    write_atomic(profile_path(profile_id, 'json'), write_meta)
+    trim()
+    return profile_id
+
+
+def trim():
+    """Drop the oldest profiles beyond PROFILE_RING_SIZE"""
+    paths = sorted(glob.glob(os.path.join(settings.PROFILE_DIR, '*.json')))
+    excess = len(paths) - settings.PROFILE_RING_SIZE
+    for path in paths[:max(excess, 0)]:
+        for stale in (path, path[:-len('json')] + 'prof'):
+            try:
+                os.remove(stale)
+            except FileNotFoundError:
+                pass
+
+
+def load_meta(profile_id):
+    with open(profile_path(profile_id, 'json')) as meta_file:
+        return json.load(meta_file)
+
+
+def load_stats(profile_id):
+    return pstats.Stats(profile_path(profile_id, 'prof'))
+
+
+def profiles():
+    """Metadata of every stored profile, newest first, without the statements"""
+    found = []
+    for path in sorted(glob.glob(os.path.join(settings.PROFILE_DIR, '*.json')), reverse=True):
+        try:
+            with open(path) as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError):
+            continue
+        meta.pop('statements', None)
+        found.append(meta)
+    return found
+
+
+def function_label(func):
+    filename, line, name = func
+    if filename == '~':
+        return name
+    return f'{name} ({os.path.basename(filename)}:{line})'
+
+
+def top_functions(stats, sort='cumulative', limit=50):
+    """[{'function', 'calls', 'tottime', 'cumtime'}] ordered by cumtime or tottime"""
+    index = 3 if sort == 'cumulative' else 2
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][index], reverse=True)[:limit]
+    return [
+        {'function': function_label(func), 'calls': nc, 'tottime': tt, 'cumtime': ct}
+        for func, (cc, nc, tt, ct, callers) in rows
+    ]
+
+
+def repeated_statements(statements):
+    """[(sql, times run, total duration)] for statements run more than once: N+1 candidates"""
+    grouped = defaultdict(lambda: [0, 0.0])
+    for statement in statements:
+        entry = grouped[statement['sql']]
+        entry[0] += 1
+        entry[1] += statement['duration']
+    repeated = [(sql, count, duration) for sql, (count, duration) in grouped.items() if count > 1]
+    return sorted(repeated, key=lambda row: row[1], reverse=True)
+
+
+def compare(before, after, limit=50):
+    """Functions whose cumulative time changed most between two pstats.Stats"""
+    rows = []
+    for func in set(before.stats) | set(after.stats):
+        old = before.stats.get(func, (0, 0, 0.0, 0.0, None))
+        new = after.stats.get(func, (0, 0, 0.0, 0.0, None))
+        rows.append({
+            'function': function_label(func),
+            'calls_before': old[1],
+            'calls_after': new[1],
+            'cumtime_before': old[3],
+            'cumtime_after': new[3],
+            'delta': new[3] - old[3],
+        })
+    rows.sort(key=lambda row: abs(row['delta']), reverse=True)
+    return rows[:limit]
+
+
+def speedscope(stats, name):
+    """
+    speedscope 'sampled' profile rebuilt from pstats.
+
+    cProfile keeps caller -> callee totals, not stacks, so each call path is
+    unfolded from the roots, and a callee's time is split between its callers
+    in proportion to what each of them spent in it. Recursive calls are cut
+    at the first repeat.
+    """
+    raw = stats.stats
+    callees = defaultdict(dict)
+    for func, (cc, nc, tt, ct, callers) in raw.items():
+        for caller, (caller_cc, caller_nc, caller_tt, caller_ct) in callers.items():
+            callees[caller][func] = caller_ct
+
+    frames, frame_index = [], {}
+
+    def frame(func):
+        if func not in frame_index:
+            filename, line, function_name = func
+            frame_index[func] = len(frames)
+            frames.append({'name': function_name, 'file': filename, 'line': line})
+        return frame_index[func]
+
+    # Roots are called from outside the profile: the middleware that enabled it.
+    # Nested middleware calls the same few functions in a cycle, so the
+    # outermost call may show no outside caller; it has the most cumulative time.
+    pending = []
+    for func, (cc, nc, tt, ct, callers) in raw.items():
+        outside = [entry[3] for caller, entry in callers.items() if caller not in raw]
+        if outside or not callers:
+            pending.append((func, (frame(func),), sum(outside) if outside else ct))
+    if raw:
+        outermost = max(raw, key=lambda func: raw[func][3])
+        if all(root != outermost for root, stack, budget in pending):
+            pending.append((outermost, (frame(outermost),), raw[outermost][3]))
+
+    samples, weights = [], []
+    while pending:
+        func, stack, budget = pending.pop()
+        cc, nc, tt, ct, callers = raw[func]
+        scale = min(budget / ct, 1.0) if ct else 0.0
+        if tt * scale >= SPEEDSCOPE_MIN_WEIGHT:
+            samples.append(list(stack))
+            weights.append(tt * scale)
+        if len(stack) >= SPEEDSCOPE_MAX_DEPTH:
+            continue
+        for callee, callee_ct in callees[func].items():
+            if callee not in raw or frame(callee) in stack or callee_ct * scale < SPEEDSCOPE_MIN_WEIGHT:
+                continue
+            pending.append((callee, stack + (frame(callee),), callee_ct * scale))
+
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': name,
+        'exporter': 'complaint-system',
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled',
+            'name': name,
+            'unit': 'seconds',
+            'startValue': 0,
+            'endValue': sum(weights),
+            'samples': samples,
+            'weights': weights,
+        }],
+    }
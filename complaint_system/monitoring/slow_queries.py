@@ -0,0 +1,272 @@
+"""
+Slow-query log grouped by statement shape.
+
+The metrics middleware's execute wrapper times every query a request runs;
+those that take SLOW_QUERY_THRESHOLD seconds or longer are recorded here with
+their normalized SQL, a fingerprint of the parameters, the view and action
+that ran them and the application frame that issued them (the innermost
+frame in this project's code, outside monitoring/).
+
+Statements differing only in literals, parameters or the length of an IN list
+share a fingerprint and are grouped: a count, total time and the last
+SLOW_QUERY_SAMPLES records for percentiles, plus the slowest record. At most
+SLOW_QUERY_MAX_GROUPS groups are kept, dropping the least recently seen.
+
+Parameters can be emails, names or password hashes, so they are never kept.
+To see a plan, staff ask for one on the admin page (/admin/slow-queries/):
+that leaves a marker in SLOW_QUERY_DIR/plans/, and the next worker to record
+the statement runs EXPLAIN with the live parameters and keeps only the plan.
+
+Like the metrics, each process keeps its groups in memory and writes them to
+SLOW_QUERY_DIR/<pid>.json every METRICS_FLUSH_INTERVAL seconds; the admin page
+merges the files. When a worker exits the gunicorn master folds its groups
+into SLOW_QUERY_DIR/totals.json (mark_process_dead()).
+"""
+import atexit
+import contextlib
+import glob
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+
+from .storage import private_directory
+
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+IN_LIST = re.compile(r'\bIN \((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+WHITESPACE = re.compile(r'\s+')
+
+# Groups of processes that have exited
+TOTALS_FILE = 'totals.json'
+
+_lock = threading.Lock()
+_groups = OrderedDict()
+_last_flush = 0.0
+_dirty = False
+
+
+def normalize(sql):
+    sql = STRING_LITERAL.sub('?', sql)
+    sql = NUMBER_LITERAL.sub('?', sql)
+    sql = IN_LIST.sub('IN (...)', sql)
+    return WHITESPACE.sub(' ', sql).strip()
+
+
+def fingerprint(text):
+    return hashlib.sha1(text.encode()).hexdigest()[:12]
+
+
+def application_frame():
+    """'path:line in function' of the innermost project frame that isn't monitoring or a dependency"""
+    root = str(settings.BASE_DIR) + os.sep
+    monitoring = os.path.dirname(os.path.abspath(__file__)) + os.sep
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(root) and not filename.startswith(monitoring) and 'site-packages' not in filename:
+            return f'{os.path.relpath(filename, root)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return ''
+
+
+def plan_marker(key):
+    return os.path.join(settings.SLOW_QUERY_DIR, 'plans', key)
+
+
+def request_plan(key):
+    """Ask the next worker that records this statement to capture its plan"""
+    private_directory(os.path.dirname(plan_marker(key)))
+    open(plan_marker(key), 'w').close()
+
+
+def plan_requested(key):
+    return os.path.exists(plan_marker(key))
+
+
+def explainable(sql, params, many):
+    return not many and isinstance(params, (list, tuple)) and sql.lstrip().upper().startswith('SELECT')
+
+
+def capture_plan(connection, sql, params):
+    """EXPLAIN a statement with the parameters it just ran with; returns the plan text"""
+    prefix = connection.ops.explain_query_prefix()
+    try:
+        # A savepoint, so a failing EXPLAIN can't break the request's transaction
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+    except DatabaseError as exc:
+        return f'EXPLAIN failed: {exc}'
+
+
+def record(sql, params, many, duration, view, action, connection=None):
+    global _dirty
+    normalized = normalize(sql)
+    key = fingerprint(normalized)
+    plan = None
+    if connection is not None and plan_requested(key):
+        with contextlib.suppress(FileNotFoundError):
+            # Whoever removes the marker captures the plan; other workers skip it
+            os.remove(plan_marker(key))
+            plan = {
+                'text': capture_plan(connection, sql, params) if explainable(sql, params, many)
+                else 'Only single SELECT statements are explained.',
+                'at': time.time(),
+            }
+    entry = {
+        'duration': round(duration, 6),
+        'params': fingerprint(repr(params)),
+        'view': view,
+        'action': action,
+        'frame': application_frame(),
+        'at': time.time(),
+    }
+    with _lock:
+        group = _groups.pop(key, None)
+        if group is None:
+            group = {'sql': normalized, 'count': 0, 'total': 0.0, 'slowest': None, 'plan': None,
+                     'samples': deque(maxlen=settings.SLOW_QUERY_SAMPLES)}
+        group['count'] += 1
+        group['total'] += duration
+        group['samples'].append(entry)
+        if group['slowest'] is None or duration > group['slowest']['duration']:
+            group['slowest'] = entry
+        if plan is not None:
+            group['plan'] = plan
+        # Most recently seen last; the first group is the one to drop
+        _groups[key] = group
+        while len(_groups) > settings.SLOW_QUERY_MAX_GROUPS:
+            _groups.popitem(last=False)
+        _dirty = True
+
+
+def reset():
+    global _last_flush, _dirty
+    with _lock:
+        _groups.clear()
+    _last_flush = 0.0
+    _dirty = False
+
+
+def flush():
+    global _last_flush, _dirty
+    _last_flush = time.monotonic()
+    with _lock:
+        groups = {key: {**group, 'samples': list(group['samples'])} for key, group in _groups.items()}
+        _dirty = False
+    directory = settings.SLOW_QUERY_DIR
+    private_directory(directory)
+    path = os.path.join(directory, f'{os.getpid()}.json')
+    temporary = f'{path}.{threading.get_ident()}.tmp'
+    with open(temporary, 'w') as groups_file:
+        json.dump(groups, groups_file)
+    os.replace(temporary, path)
+
+
+def maybe_flush():
+    if _dirty and time.monotonic() - _last_flush >= settings.METRICS_FLUSH_INTERVAL:
+        flush()
+
+
+def clear_directory():
+    for path in glob.glob(os.path.join(settings.SLOW_QUERY_DIR, '*.json')):
+        os.remove(path)
+    for path in glob.glob(plan_marker('*')):
+        os.remove(path)
+
+
+def percentile(ordered, fraction):
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def read_groups(path):
+    try:
+        with open(path) as groups_file:
+            return json.load(groups_file)
+    except (OSError, ValueError):
+        return None
+
+
+def merge_groups(merged, groups):
+    """Add groups read from a file to merged, by fingerprint"""
+    for key, group in groups.items():
+        into = merged.get(key)
+        if into is None:
+            merged[key] = group
+            continue
+        into['count'] += group['count']
+        into['total'] += group['total']
+        into['samples'].extend(group['samples'])
+        if group['slowest']['duration'] > into['slowest']['duration']:
+            into['slowest'] = group['slowest']
+        if group['plan'] and (not into['plan'] or group['plan']['at'] > into['plan']['at']):
+            into['plan'] = group['plan']
+
+
+def mark_process_dead(pid):
+    """Fold an exited process's groups into totals.json and drop its file; call from one process only"""
+    path = os.path.join(settings.SLOW_QUERY_DIR, f'{pid}.json')
+    groups = read_groups(path)
+    if groups is None:
+        return
+    totals_path = os.path.join(settings.SLOW_QUERY_DIR, TOTALS_FILE)
+    totals = read_groups(totals_path) or {}
+    merge_groups(totals, groups)
+    # Same bounds as a live process: the newest samples of the most recently seen groups
+    for group in totals.values():
+        group['samples'] = sorted(group['samples'], key=lambda sample: sample['at'])[-settings.SLOW_QUERY_SAMPLES:]
+    recent = sorted(totals, key=lambda key: totals[key]['samples'][-1]['at'])[-settings.SLOW_QUERY_MAX_GROUPS:]
+    totals = {key: totals[key] for key in recent}
+    temporary = f'{totals_path}.tmp'
+    with open(temporary, 'w') as totals_file:
+        json.dump(totals, totals_file)
+    os.replace(temporary, totals_path)
+    os.remove(path)
+
+
+def collect():
+    """Groups of every process merged by fingerprint, each with p50/p95/p99 of its samples"""
+    if _dirty:
+        flush()
+    merged = {}
+    for path in glob.glob(os.path.join(settings.SLOW_QUERY_DIR, '*.json')):
+        groups = read_groups(path)
+        if groups is not None:
+            merge_groups(merged, groups)
+
+    for key, group in merged.items():
+        durations = sorted(sample['duration'] for sample in group['samples'])
+        group.update({
+            'fingerprint': key,
+            'mean': group['total'] / group['count'],
+            'p50': percentile(durations, 0.5),
+            'p95': percentile(durations, 0.95),
+            'p99': percentile(durations, 0.99),
+            'max': durations[-1],
+            'last_seen': max(sample['at'] for sample in group['samples']),
+            'views': Counter(
+                f"{sample['view']} · {sample['action']}" if sample['action'] else sample['view']
+                for sample in group['samples']
+            ).most_common(),
+            'frames': Counter(sample['frame'] for sample in group['samples']).most_common(),
+            'param_sets': len({sample['params'] for sample in group['samples']}),
+        })
+    return merged
+
+
+def flush_at_exit():
+    if _dirty:
+        flush()
+
+
+os.register_at_fork(after_in_child=reset)
+atexit.register(flush_at_exit)
@@ -0,0 +1,19 @@
+"""
+Directories for the files monitoring writes: metric snapshots, profiles and
+the slow-query log. They can hold SQL, view names and timings of every
+worker, so only the user the server runs as may read them.
+"""
+import os
+
+
+def private_directory(path):
+    """Create path with mode 0700, or tighten it if it already exists; returns path"""
+    # makedirs() applies the umask to the mode, so clear group and other bits first
+    old_umask = os.umask(0o077)
+    try:
+        os.makedirs(path, 0o700, exist_ok=True)
+    finally:
+        os.umask(old_umask)
+    if os.stat(path).st_mode & 0o077:
+        os.chmod(path, 0o700)
+    return path
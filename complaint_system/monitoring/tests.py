@@ -0,0 +1,185 @@
+import json
+import os
+import shutil
+import stat
+import tempfile
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from . import metrics, profiling, slow_queries
+
+
+class SlowQueryLogTests(TestCase):
+    sql = 'SELECT id FROM auth_user WHERE email = %s'
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.log_dir = os.path.join(directory, 'slow-queries')
+        settings_override = override_settings(
+            SLOW_QUERY_DIR=self.log_dir,
+            # The admin pages link static files that tests don't collect
+            STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        slow_queries.reset()
+        self.addCleanup(slow_queries.reset)
+
+    def record(self):
+        slow_queries.record(self.sql, ['secret@example.com'], False, 0.5, 'user-list', 'list', connection=connection)
+        return slow_queries.fingerprint(slow_queries.normalize(self.sql))
+
+    def test_parameters_never_reach_the_directory(self):
+        self.record()
+        slow_queries.flush()
+        self.assertEqual(stat.S_IMODE(os.stat(self.log_dir).st_mode), 0o700)
+        for name in os.listdir(self.log_dir):
+            with open(os.path.join(self.log_dir, name)) as log_file:
+                self.assertNotIn('secret@example.com', log_file.read())
+
+    def test_a_requested_plan_is_captured_by_the_next_slow_run(self):
+        key = self.record()
+        self.assertIsNone(slow_queries.collect()[key]['plan'])
+
+        slow_queries.request_plan(key)
+        self.record()
+        plan = slow_queries.collect()[key]['plan']
+        self.assertIn('auth_user', plan['text'])
+        self.assertNotIn('secret@example.com', plan['text'])
+        self.assertFalse(slow_queries.plan_requested(key))
+
+    def test_staff_ask_for_a_plan_from_the_admin(self):
+        key = self.record()
+        User.objects.create_user('admin', password='s3cret-pass', is_staff=True)
+        self.client.login(username='admin', password='s3cret-pass')
+        url = reverse('slow-query-detail', args=[key])
+
+        self.assertRedirects(self.client.post(url), url)
+        self.assertTrue(slow_queries.plan_requested(key))
+        self.assertContains(self.client.get(url), 'Waiting for the statement to run slow again')
+
+    def test_an_exited_worker_is_folded_into_the_totals(self):
+        key = self.record()
+        slow_queries.flush()
+        os.rename(os.path.join(self.log_dir, f'{os.getpid()}.json'), os.path.join(self.log_dir, '1.json'))
+        slow_queries.reset()
+        self.record()
+
+        slow_queries.mark_process_dead(1)
+        self.assertEqual(os.listdir(self.log_dir), ['totals.json'])
+        self.assertEqual(slow_queries.collect()[key]['count'], 2)
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.profile_dir = os.path.join(directory, 'profiles')
+        settings_override = override_settings(
+            PROFILE_DIR=self.profile_dir, PROFILE_SAMPLE_RATE=0.0, PROFILE_RING_SIZE=2,
+            STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.staff = User.objects.create_user('admin', is_staff=True)
+
+    def test_only_staff_can_ask_for_a_profile(self):
+        for user in (None, User.objects.create_user('citizen')):
+            if user is not None:
+                self.client.force_login(user)
+            for response in (
+                self.client.get('/api/categories/', HTTP_X_PROFILE='1'),
+                self.client.get('/api/categories/', {'profile': '1'}),
+            ):
+                self.assertEqual(response.status_code, 200)
+                self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(profiling.profiles(), [])
+
+    def test_staff_requests_are_profiled_with_their_sql(self):
+        self.client.force_login(self.staff)
+        response = self.client.get('/api/auth/users/', HTTP_X_PROFILE='1')
+        profile_id = response['X-Profile-Id']
+
+        meta = profiling.load_meta(profile_id)
+        self.assertEqual((meta['path'], meta['status'], meta['user']), ('/api/auth/users/', 200, 'admin'))
+        self.assertEqual(meta['queries'], len(meta['statements']))
+        self.assertTrue(any('auth_user' in statement['sql'] for statement in meta['statements']))
+        self.assertTrue(profiling.top_functions(profiling.load_stats(profile_id)))
+        self.assertContains(self.client.get(reverse('profile-detail', args=[profile_id])), profile_id)
+
+    def test_only_the_newest_profiles_are_kept(self):
+        self.client.force_login(self.staff)
+        # Saved within the same second
+        ids = [self.client.get('/api/auth/users/', HTTP_X_PROFILE='1')['X-Profile-Id'] for _ in range(3)]
+        self.assertEqual(sorted(meta['id'] for meta in profiling.profiles()), sorted(ids[1:]))
+        self.assertEqual(len(os.listdir(self.profile_dir)), 4)
+
+
+class MetricsFileTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_override = override_settings(METRICS_DIR=directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.directory = directory
+
+    def write_snapshot(self, pid, requests):
+        snapshot = {
+            'pid': pid,
+            'counters': [['http_requests_total', [['view', 'complaint-list']], requests]],
+            'histograms': [['http_request_db_queries', [['view', 'complaint-list']], [requests] + [0] * 9 + [2.0]]],
+            'gauges': [['background_queue_depth', [['queue', 'emails']], 7]],
+        }
+        with open(os.path.join(self.directory, f'{pid}.json'), 'w') as snapshot_file:
+            json.dump(snapshot, snapshot_file)
+
+    def test_exited_workers_leave_one_totals_file(self):
+        # Pids far above pid_max: processes that can't be alive
+        for pid in (2 ** 30, 2 ** 30 + 1):
+            self.write_snapshot(pid, 3)
+            metrics.mark_process_dead(pid)
+
+        self.assertEqual(os.listdir(self.directory), ['totals.json'])
+        counters, histograms, gauges = metrics.collect()
+        labels = (('view', 'complaint-list'),)
+        self.assertEqual(counters['http_requests_total', labels], 6)
+        self.assertEqual(histograms['http_request_db_queries', labels][0], 6)
+        self.assertEqual(histograms['http_request_db_queries', labels][-1], 4.0)
+        self.assertEqual(gauges, {})
+
+
+@override_settings(METRICS_TOKEN='scrape-token')
+class MetricsEndpointTests(TestCase):
+    url = '/metrics'
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_override = override_settings(METRICS_DIR=directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_the_scraper_token_is_accepted(self):
+        response = self.client.get(self.url, HTTP_AUTHORIZATION='Bearer scrape-token')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('# TYPE background_queue_depth gauge', response.content.decode())
+
+    def test_anonymous_and_wrong_tokens_are_refused(self):
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION='Bearer guess').status_code, 403)
+        with override_settings(METRICS_TOKEN=''):
+            self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+    def test_only_staff_sessions_are_accepted(self):
+        User.objects.create_user('citizen', password='s3cret-pass')
+        self.client.login(username='citizen', password='s3cret-pass')
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+        User.objects.create_user('admin', password='s3cret-pass', is_staff=True)
+        self.client.login(username='admin', password='s3cret-pass')
+        self.assertEqual(self.client.get(self.url).status_code, 200)
@@ -0,0 +1,176 @@
+import datetime
+import json
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import cache
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden
+from django.shortcuts import redirect, render
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+
+from . import metrics, profiling, slow_queries
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+QUEUE_DEPTH_CACHE_KEY = 'metrics:queue-depths'
+
+
+def scrape_allowed(request):
+    """Staff sessions, or the METRICS_TOKEN as a Bearer token (for the Prometheus scraper)"""
+    token = settings.METRICS_TOKEN
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if token and header.startswith('Bearer ') and constant_time_compare(header[7:], token):
+        return True
+    return request.user.is_authenticated and request.user.is_staff
+
+
+def queue_depths():
+    """Backlog of the database-driven workers; counted at most every METRICS_QUEUE_DEPTH_TTL seconds"""
+    return cache.get_or_set(QUEUE_DEPTH_CACHE_KEY, count_queues, settings.METRICS_QUEUE_DEPTH_TTL)
+
+
+def count_queues():
+    from complaints.models import Complaint
+
+    return {
+        metrics.label_key({'queue': 'assignment'}): Complaint.objects.filter(
+            status='pending', assigned_to__isnull=True, department__isnull=False
+        ).count(),
+        metrics.label_key({'queue': 'sla_escalation'}): Complaint.objects.filter(due_at__lte=timezone.now()).count(),
+    }
+
+
+def hit_ratios(counters):
+    lookups = {}
+    for (name, labels), value in counters.items():
+        if name == 'cache_requests_total':
+            labels = dict(labels)
+            hits, total = lookups.get(labels['cache'], (0, 0))
+            lookups[labels['cache']] = (hits + (value if labels['result'] == 'hit' else 0), total + value)
+    return {
+        ('cache_hit_ratio', metrics.label_key({'cache': cache})): round(hits / total, 4)
+        for cache, (hits, total) in lookups.items() if total
+    }
+
+
+def metrics_view(request):
+    """Prometheus text format metrics for every worker process"""
+    if not scrape_allowed(request):
+        return HttpResponseForbidden('Staff or the metrics token only.\n')
+    metrics.flush()
+    counters, histograms, gauges = metrics.collect()
+    gauges.update(hit_ratios(counters))
+    gauges.update({('background_queue_depth', labels): depth for labels, depth in queue_depths().items()})
+    return HttpResponse(metrics.render(counters, histograms, gauges), content_type=CONTENT_TYPE)
+
+
+def load_profile(profile_id):
+    try:
+        return profiling.load_meta(profile_id), profiling.load_stats(profile_id)
+    except (OSError, ValueError):
+        raise Http404('No such profile; it may have left the ring.')
+
+
+@staff_member_required
+def profile_list(request):
+    """Stored profiles, newest first, with a form to compare two of them"""
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Request profiles',
+        'profiles': profiling.profiles(),
+        'ring_size': settings.PROFILE_RING_SIZE,
+    }
+    return render(request, 'admin/monitoring/profile_list.html', context)
+
+
+@staff_member_required
+def profile_detail(request, profile_id):
+    meta, stats = load_profile(profile_id)
+    sort = 'tottime' if request.GET.get('sort') == 'tottime' else 'cumulative'
+    context = {
+        **admin.site.each_context(request),
+        'title': f'Profile {profile_id}',
+        'profile': meta,
+        'sort': sort,
+        'functions': profiling.top_functions(stats, sort),
+        'repeated': profiling.repeated_statements(meta['statements']),
+    }
+    return render(request, 'admin/monitoring/profile_detail.html', context)
+
+
+@staff_member_required
+def profile_download(request, profile_id, format):
+    """The raw pstats dump (snakeviz, `python -m pstats`) or a speedscope JSON file"""
+    if format not in ('prof', 'speedscope'):
+        raise Http404('Download as prof or speedscope.')
+    meta, stats = load_profile(profile_id)
+    if format == 'prof':
+        return FileResponse(
+            open(profiling.profile_path(profile_id, 'prof'), 'rb'),
+            as_attachment=True,
+            filename=f'{profile_id}.prof',
+        )
+    name = f"{meta['method']} {meta['path']}"
+    response = HttpResponse(json.dumps(profiling.speedscope(stats, name)), content_type='application/json')
+    response['Content-Disposition'] = f'attachment; filename="{profile_id}.speedscope.json"'
+    return response
+
+
+@staff_member_required
+def profile_compare(request):
+    before_meta, before = load_profile(request.GET.get('before', ''))
+    after_meta, after = load_profile(request.GET.get('after', ''))
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Compare profiles',
+        'before': before_meta,
+        'after': after_meta,
+        'rows': profiling.compare(before, after),
+    }
+    return render(request, 'admin/monitoring/profile_compare.html', context)
+
+
+SLOW_QUERY_ORDERINGS = {
+    'total': lambda group: group['total'],
+    'p95': lambda group: group['p95'],
+    'count': lambda group: group['count'],
+    'recent': lambda group: group['last_seen'],
+}
+
+
+@staff_member_required
+def slow_query_list(request):
+    """Slow statement groups, worst first (by total time unless ?sort= says otherwise)"""
+    sort = request.GET.get('sort') if request.GET.get('sort') in SLOW_QUERY_ORDERINGS else 'total'
+    groups = sorted(slow_queries.collect().values(), key=SLOW_QUERY_ORDERINGS[sort], reverse=True)
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Slow queries',
+        'groups': groups,
+        'sort': sort,
+        'orderings': list(SLOW_QUERY_ORDERINGS),
+        'threshold': settings.SLOW_QUERY_THRESHOLD,
+    }
+    return render(request, 'admin/monitoring/slow_query_list.html', context)
+
+
+@staff_member_required
+def slow_query_detail(request, fingerprint):
+    """A statement group; POST asks the workers to capture its plan the next time it runs slow"""
+    group = slow_queries.collect().get(fingerprint)
+    if group is None:
+        raise Http404('No such statement; it may have been dropped from the log.')
+    if request.method == 'POST':
+        slow_queries.request_plan(fingerprint)
+        return redirect('slow-query-detail', fingerprint=fingerprint)
+    context = {
+        **admin.site.each_context(request),
+        'title': f'Slow query {fingerprint}',
+        'group': group,
+        'plan_requested': slow_queries.plan_requested(fingerprint),
+        'plan_at': datetime.datetime.fromtimestamp(group['plan']['at'], datetime.timezone.utc) if group['plan'] else None,
+        'samples': sorted(group['samples'], key=lambda sample: sample['at'], reverse=True),
+    }
+    return render(request, 'admin/monitoring/slow_query_detail.html', context)
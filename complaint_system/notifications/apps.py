@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class NotificationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'notifications'
+
+    def ready(self):
+        # Registers the email queue gauge (monitoring/metrics.py) in every process
+        from . import email_service  # noqa: F401
@@ -1,7 +1,54 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 from django.core.mail import send_mail
 from django.conf import settings
 from django.template.loader import render_to_string
 
+from complaints.departments import department_name
+from monitoring import metrics
+
+
+_executor = None
+
+
+def _send(subject, message, recipient, sent_message, failed_message):
+    start = time.perf_counter()
+    try:
+        send_mail(
+            subject=subject,
+            message=message,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            recipient_list=[recipient],
+            fail_silently=False,
+        )
+        metrics.inc('emails_total', {'result': 'sent'})
+        print(sent_message)
+    except Exception as e:
+        metrics.inc('emails_total', {'result': 'failed'})
+        print(f"{failed_message}: {e}")
+    metrics.observe('email_send_duration_seconds', time.perf_counter() - start)
+
+
+def _queue_depth():
+    """Emails waiting for a background sender in this process"""
+    depth = _executor._work_queue.qsize() if _executor is not None else 0
+    return {metrics.label_key({'queue': 'email'}): depth}
+
+
+metrics.register_gauge('background_queue_depth', _queue_depth)
+
+
+def deliver(subject, message, recipient, sent_message, failed_message):
+    """Send an email, in the background when EMAIL_ASYNC is on so SMTP never blocks a request"""
+    global _executor
+    if not settings.EMAIL_ASYNC:
+        _send(subject, message, recipient, sent_message, failed_message)
+        return
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.EMAIL_ASYNC_WORKERS, thread_name_prefix='email')
+    _executor.submit(_send, subject, message, recipient, sent_message, failed_message)
+
 
 def send_new_complaint_notification(complaint):
     """Send email notification to admin when new complaint is submitted"""
@@ -27,17 +74,13 @@ Location: {complaint.address or 'Not provided'}
 View and manage this complaint in the admin panel.
     """
     
-    try:
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[settings.ADMIN_EMAIL],
-            fail_silently=False,
-        )
-        print(f"✓ Admin notification sent for complaint {complaint.reference_number}")
-    except Exception as e:
-        print(f"✗ Failed to send admin notification: {e}")
+    deliver(
+        subject,
+        message,
+        settings.ADMIN_EMAIL,
+        f"✓ Admin notification sent for complaint {complaint.reference_number}",
+        "✗ Failed to send admin notification",
+    )
 
 
 def send_status_update_notification(complaint):
@@ -66,7 +109,7 @@ Title: {complaint.title}
 Current Status: {complaint.get_status_display()}
 Priority: {complaint.get_priority_display()}
 
-{f'Assigned to: {complaint.department}' if complaint.department else ''}
+{f'Assigned to: {department_name(complaint.department_id)}' if complaint.department_id else ''}
 
 Description:
 {complaint.description}
@@ -77,17 +120,13 @@ Best regards,
 Municipal Complaint System
     """
     
-    try:
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[complaint.citizen_email],
-            fail_silently=False,
-        )
-        print(f"✓ Status update notification sent to {complaint.citizen_email}")
-    except Exception as e:
-        print(f"✗ Failed to send status notification: {e}")
+    deliver(
+        subject,
+        message,
+        complaint.citizen_email,
+        f"✓ Status update notification sent to {complaint.citizen_email}",
+        "✗ Failed to send status notification",
+    )
 
 
 def send_feedback_request(complaint):
@@ -112,14 +151,39 @@ Best regards,
 Municipal Complaint System
     """
     
-    try:
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[complaint.citizen_email],
-            fail_silently=False,
-        )
-        print(f"✓ Feedback request sent to {complaint.citizen_email}")
-    except Exception as e:
-        print(f"✗ Failed to send feedback request: {e}")
+    deliver(
+        subject,
+        message,
+        complaint.citizen_email,
+        f"✓ Feedback request sent to {complaint.citizen_email}",
+        "✗ Failed to send feedback request",
+    )
+
+
+def send_sla_escalation_digest(complaints):
+    """Send one email to admin listing complaints escalated for missing their SLA"""
+    subject = f'SLA Escalation: {len(complaints)} overdue complaint(s)'
+    
+    listed = 200
+    lines = '\n'.join(
+        f"- {complaint.reference_number} [{complaint.get_priority_display()}] "
+        f"{complaint.title} ({department_name(complaint.department_id) or 'No department'}, {complaint.get_status_display()})"
+        for complaint in complaints[:listed]
+    )
+    if len(complaints) > listed:
+        lines += f"\n...and {len(complaints) - listed} more"
+    message = f"""
+The following complaints missed their SLA deadline and have been escalated:
+
+{lines}
+
+Review them in the admin panel.
+    """
+    
+    deliver(
+        subject,
+        message,
+        settings.ADMIN_EMAIL,
+        f"✓ SLA escalation digest sent for {len(complaints)} complaint(s)",
+        "✗ Failed to send SLA escalation digest",
+    )
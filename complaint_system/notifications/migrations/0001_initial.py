@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ComplaintEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(choices=[('created', 'Created'), ('status_changed', 'Status Changed')], max_length=20)),
+                ('complaint_id', models.BigIntegerField()),
+                ('department', models.CharField(blank=True, max_length=100)),
+                ('payload', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['department', 'id'], name='notificatio_departm_28a16f_idx')],
+            },
+        ),
+    ]
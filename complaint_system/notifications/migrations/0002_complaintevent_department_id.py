@@ -0,0 +1,57 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def department_ids(apps, schema_editor):
+    Department = apps.get_model('complaints', 'Department')
+    ComplaintEvent = apps.get_model('notifications', 'ComplaintEvent')
+    for department in Department.objects.all():
+        ComplaintEvent.objects.filter(department=department.name).update(department_ref=department.pk)
+
+
+def department_names(apps, schema_editor):
+    Department = apps.get_model('complaints', 'Department')
+    ComplaintEvent = apps.get_model('notifications', 'ComplaintEvent')
+    for department in Department.objects.all():
+        ComplaintEvent.objects.filter(department_ref=department.pk).update(department=department.name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0009_departments'),
+        ('notifications', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='complaintevent',
+            name='department_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='complaints.department'),
+        ),
+        migrations.RunPython(department_ids, department_names),
+        migrations.RemoveIndex(
+            model_name='complaintevent',
+            name='notificatio_departm_28a16f_idx',
+        ),
+        migrations.RemoveField(
+            model_name='complaintevent',
+            name='department',
+        ),
+        migrations.RenameField(
+            model_name='complaintevent',
+            old_name='department_ref',
+            new_name='department',
+        ),
+        migrations.AlterField(
+            model_name='complaintevent',
+            name='department',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='complaints.department'),
+        ),
+        migrations.AddIndex(
+            model_name='complaintevent',
+            index=models.Index(fields=['department', 'id'], name='notificatio_departm_8c8960_idx'),
+        ),
+    ]
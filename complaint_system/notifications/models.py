@@ -1,3 +1,58 @@
+from django.conf import settings
 from django.db import models
+from django.db.models.signals import post_save
+from django.dispatch import receiver
 
-# Create your models here.
+from complaints.models import Department, StatusHistory
+
+
+class ComplaintEvent(models.Model):
+    """Bounded buffer of complaint changes, replayed to live dashboards by id"""
+    EVENT_TYPES = [
+        ('created', 'Created'),
+        ('status_changed', 'Status Changed'),
+    ]
+    
+    event_type = models.CharField(max_length=20, choices=EVENT_TYPES)
+    complaint_id = models.BigIntegerField()
+    department = models.ForeignKey(
+        Department, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['department', 'id']),
+        ]
+    
+    def __str__(self):
+        return f"#{self.id} {self.event_type} complaint {self.complaint_id}"
+
+
+@receiver(post_save, sender=StatusHistory)
+def record_complaint_event(sender, instance, created, **kwargs):
+    """Every status history row is either a new complaint or a status change"""
+    if not created:
+        return
+    complaint = instance.complaint
+    event = ComplaintEvent.objects.create(
+        event_type='status_changed' if instance.old_status else 'created',
+        complaint_id=complaint.pk,
+        department_id=complaint.department_id,
+        payload={
+            'id': complaint.pk,
+            'reference_number': complaint.reference_number,
+            'title': complaint.title,
+            'category_name': complaint.category.name,
+            'status': instance.new_status,
+            'old_status': instance.old_status,
+            'priority': complaint.priority,
+            'created_at': complaint.created_at.isoformat() if complaint.created_at else None,
+        },
+    )
+    
+    # Trim the buffer now and then rather than on every insert
+    if event.pk % 100 == 0:
+        ComplaintEvent.objects.filter(pk__lte=event.pk - settings.EVENT_BUFFER_SIZE).delete()
@@ -1,3 +1,132 @@
-from django.test import TestCase
+import itertools
+import json
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db.models import Max
+from django.test import TestCase, override_settings
+
+from complaints.models import Category, Complaint, Department, StatusHistory
+from .models import ComplaintEvent
+
+
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'notifications-default'},
+    'throttle': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'notifications-throttle'},
+    'versions': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'notifications-versions'},
+    'tokens': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'notifications-tokens'},
+}
+
+_references = itertools.count(1)
+
+
+def parse_stream(body):
+    """[(event id, event type, data)] of the events in an SSE body, skipping retry and comments"""
+    events = []
+    for block in body.decode().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':'))
+        if 'event' in fields:
+            event_id = int(fields['id']) if 'id' in fields else None
+            events.append((event_id, fields['event'], json.loads(fields['data'])))
+    return events
+
+
+@override_settings(CACHES=CACHES)
+class ComplaintEventStreamTests(TestCase):
+    def setUp(self):
+        self.roads = Department.objects.create(name='Roads')
+        self.water = Department.objects.create(name='Water')
+        self.potholes = Category.objects.create(name='Potholes', department=self.roads)
+        self.leaks = Category.objects.create(name='Leaks', department=self.water)
+
+    def department_user(self, username, department):
+        user = User.objects.create_user(username, password='s3cret-pass')
+        user.profile.is_department_user = True
+        user.profile.department = department
+        user.profile.save()
+        return user
+
+    def report(self, category, status='pending', old_status=''):
+        complaint = Complaint.objects.create(
+            title='Pothole on Main Street',
+            description='A deep pothole near the bus stop',
+            category=category,
+            department_id=category.department_id,
+            citizen_name='Citizen',
+            citizen_email='citizen@example.com',
+            reference_number=f'EVT{next(_references):07d}',
+            status=status,
+        )
+        StatusHistory.objects.create(complaint=complaint, old_status=old_status, new_status=status)
+        return complaint
+
+    def latest_event_id(self):
+        return ComplaintEvent.objects.aggregate(last=Max('pk'))['last'] or 0
+
+    def stream(self, user, **headers):
+        self.client.force_login(user)
+        response = self.client.get('/api/events/complaints/', **headers)
+        self.assertEqual(response.status_code, 200)
+        return parse_stream(b''.join(response.streaming_content))
+
+    def test_events_keep_the_department_id_and_show_its_current_name(self):
+        watcher = self.department_user('roads', self.roads)
+        last_id = self.latest_event_id()
+        complaint = self.report(self.potholes)
+        self.assertEqual(ComplaintEvent.objects.get(complaint_id=complaint.pk).department_id, self.roads.pk)
+
+        self.roads.name = 'Highways'
+        self.roads.save()
+
+        [(_, event_type, data)] = self.stream(watcher, HTTP_LAST_EVENT_ID=str(last_id))
+        self.assertEqual(event_type, 'created')
+        self.assertEqual(data['id'], complaint.pk)
+        self.assertEqual(data['department'], 'Highways')
+
+    def test_department_staff_only_see_their_department(self):
+        staff = User.objects.create_user('supervisor', password='s3cret-pass', is_staff=True)
+        watcher = self.department_user('roads', self.roads)
+        last_id = self.latest_event_id()
+        pothole = self.report(self.potholes)
+        leak = self.report(self.leaks)
+
+        for user, expected in ((watcher, [pothole.pk]), (staff, [pothole.pk, leak.pk])):
+            events = self.stream(user, HTTP_LAST_EVENT_ID=str(last_id))
+            self.assertEqual([data['id'] for _, _, data in events], expected)
+
+    def test_citizens_and_anonymous_users_are_refused(self):
+        self.assertEqual(self.client.get('/api/events/complaints/').status_code, 403)
+        self.client.force_login(User.objects.create_user('citizen', password='s3cret-pass'))
+        self.assertEqual(self.client.get('/api/events/complaints/').status_code, 403)
+
+    def test_reconnecting_resumes_after_the_last_event_id(self):
+        watcher = self.department_user('roads', self.roads)
+        complaint = self.report(self.potholes)
+        [(seen, _, _)] = self.stream(watcher, HTTP_LAST_EVENT_ID=str(self.latest_event_id() - 1))
+        complaint.status = 'acknowledged'
+        complaint.save()
+        StatusHistory.objects.create(complaint=complaint, old_status='pending', new_status='acknowledged')
+
+        [(_, event_type, data)] = self.stream(watcher, HTTP_LAST_EVENT_ID=str(seen))
+        self.assertEqual((event_type, data['status'], data['old_status']), ('status_changed', 'acknowledged', 'pending'))
+        # The query parameter does the same for clients that can't set headers
+        self.client.force_login(watcher)
+        response = self.client.get('/api/events/complaints/', {'last_event_id': seen})
+        self.assertEqual(len(parse_stream(b''.join(response.streaming_content))), 1)
+
+    def test_a_new_connection_starts_after_the_latest_event(self):
+        watcher = self.department_user('roads', self.roads)
+        self.report(self.potholes)
+        self.assertEqual(self.stream(watcher), [])
+
+    def test_a_client_behind_the_buffer_is_told_to_reload(self):
+        watcher = self.department_user('roads', self.roads)
+        last_id = self.latest_event_id()
+        first = self.report(self.potholes)
+        second = self.report(self.potholes)
+        third = self.report(self.potholes)
+        # Pruned from the buffer while the client was away
+        ComplaintEvent.objects.filter(complaint_id__in=[first.pk, second.pk]).delete()
+
+        events = self.stream(watcher, HTTP_LAST_EVENT_ID=str(last_id))
+        self.assertEqual([event_type for _, event_type, _ in events], ['reset', 'created'])
+        self.assertEqual(events[1][2]['id'], third.pk)
@@ -0,0 +1,6 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('complaints/', views.complaint_event_stream, name='complaint-events'),
+]
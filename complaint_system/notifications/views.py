@@ -1,3 +1,109 @@
-from django.shortcuts import render
+import asyncio
+import json
 
-# Create your views here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Max, Min
+from django.http import JsonResponse, StreamingHttpResponse
+
+from complaints.departments import department_name
+
+from .models import ComplaintEvent
+
+
+def stream_department(user):
+    """Department whose events the user may see: '' for all, None if not allowed"""
+    if not user.is_authenticated:
+        return None
+    if user.is_staff:
+        return ''
+    profile = getattr(user, 'profile', None)
+    if profile is not None and profile.is_department_user and profile.department_id:
+        return profile.department_id
+    return None
+
+
+def format_event(event):
+    # Events carry the department id; the name is whatever it is called now
+    data = {**event.payload, 'department': department_name(event.department_id)}
+    return f"id: {event.pk}\nevent: {event.event_type}\ndata: {json.dumps(data)}\n\n"
+
+
+def scoped_events(department, last_id):
+    events = ComplaintEvent.objects.filter(pk__gt=last_id)
+    if department:
+        events = events.filter(department=department)
+    return events.order_by('pk')[:settings.EVENT_STREAM_BATCH_SIZE]
+
+
+def pending_events(department, last_id):
+    """[(id, formatted event)] of the next batch after last_id"""
+    return [(event.pk, format_event(event)) for event in scoped_events(department, last_id)]
+
+
+async def replay_start(last_id):
+    """
+    Where to resume from, and whether the client missed events that have
+    already been pruned from the buffer (it should then reload in full)
+    """
+    bounds = await ComplaintEvent.objects.aaggregate(first=Min('pk'), last=Max('pk'))
+    if last_id is None:
+        return bounds['last'] or 0, False
+    missed = bounds['first'] is not None and last_id < bounds['first'] - 1
+    return last_id, missed
+
+
+async def complaint_event_stream(request):
+    """
+    Server-Sent Events stream of complaint creations and status changes.
+
+    Staff receive every event, department staff only their department's.
+    Reconnecting clients resume after the Last-Event-ID header (or the
+    last_event_id query param). Under WSGI the pending events are sent once
+    and the client reconnects after the retry delay.
+    """
+    department = await sync_to_async(stream_department)(request.user)
+    if department is None:
+        return JsonResponse({'detail': 'Only staff and department users can follow complaint events.'}, status=403)
+    
+    try:
+        last_id = int(request.headers.get('Last-Event-ID') or request.GET['last_event_id'])
+    except (KeyError, ValueError):
+        last_id = None
+    last_id, missed = await replay_start(last_id)
+    
+    retry = f"retry: {settings.EVENT_STREAM_RETRY_MS}\n\n"
+    reset = "event: reset\ndata: {}\n\n" if missed else ""
+    
+    if 'wsgi.input' in request.META:
+        events = await sync_to_async(pending_events)(department, last_id)
+        body = retry + reset + ''.join(text for _, text in events)
+        response = StreamingHttpResponse(iter([body]), content_type='text/event-stream')
+    else:
+        response = StreamingHttpResponse(
+            live_events(department, last_id, retry + reset),
+            content_type='text/event-stream',
+        )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def live_events(department, last_id, preamble):
+    """Poll the event buffer until the connection has been open for EVENT_STREAM_MAX_SECONDS"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.EVENT_STREAM_MAX_SECONDS
+    idle = 0.0
+    yield preamble
+    while loop.time() < deadline:
+        events = await sync_to_async(pending_events)(department, last_id)
+        for last_id, text in events:
+            yield text
+        if events:
+            idle = 0.0
+        else:
+            idle += settings.EVENT_STREAM_POLL_SECONDS
+            if idle >= 15:
+                idle = 0.0
+                yield ": keepalive\n\n"
+        await asyncio.sleep(settings.EVENT_STREAM_POLL_SECONDS)